@@ -0,0 +1,92 @@
+"""
+Compare memory and attribute lookup time of the contact records of the
+RDFStore with reading the attributes from the rdflib graph.
+
+Usage: python benchmarks/contact_model.py [contacts] [attributes per contact]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from rdflib import BNode, Graph, Literal, URIRef
+
+from ctui.model.attribute import Attribute
+from ctui.repository.rdf import GIVEN_NAME_REF, RDFStore
+
+NAMESPACE = 'http://TBD/contact#'
+KEYS = ['email', 'phone', 'mobile', 'address', 'birthday', 'website']
+
+
+def create_n3_file(path, contact_count, attribute_count):
+    g = Graph()
+    g.bind('c', URIRef('http://hiea.de/contact#'))
+    for i in range(contact_count):
+        s = BNode()
+        g.add((s, GIVEN_NAME_REF, Literal(f'Contact {i}')))
+        for j in range(attribute_count):
+            key = KEYS[j % len(KEYS)]
+            g.add((s, URIRef(NAMESPACE + key), Literal(f'{key} value {i}')))
+    g.serialize(format='n3', destination=path)
+
+
+def get_attributes_from_graph(g, name):
+    """
+    Attribute lookup as done before the contact records were introduced.
+    """
+    s = next(g.subjects(GIVEN_NAME_REF, Literal(name)))
+    attributes = []
+    for p, o in g.predicate_objects(s):
+        predicate = p.split('#', 1)[1]
+        if predicate in ('givenName', 'giftIdea'):
+            continue
+        attributes.append(Attribute(predicate, str(o)))
+    return sorted(attributes)
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def measure_time(lookup, names):
+    start = time.perf_counter()
+    for name in names:
+        lookup(name)
+    return (time.perf_counter() - start) / len(names)
+
+
+def main():
+    contact_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    attribute_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'contacts.n3')
+        create_n3_file(path, contact_count, attribute_count)
+        store = RDFStore(path, NAMESPACE)
+
+        _, graph_size = measure_memory(
+            lambda: Graph().parse(path, format='n3'))
+        _, record_size = measure_memory(store.build_index)
+
+    names = random.sample(store.get_contact_names(),
+                          min(1000, contact_count))
+    graph_time = measure_time(lambda n: get_attributes_from_graph(store.g, n),
+                              names)
+    record_time = measure_time(
+        lambda n: store.get_attributes(n.replace(' ', '_')), names)
+
+    print(f'{contact_count} contacts, {attribute_count} attributes each')
+    print(f'memory per contact: graph {graph_size / contact_count:.0f} B, '
+          f'records {record_size / contact_count:.0f} B')
+    print(f'get_attributes: graph {graph_time * 1e6:.1f} µs, '
+          f'records {record_time * 1e6:.1f} µs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare loading and dumping gifts with pure Python yaml with the gift codec.
+
+Usage: python benchmarks/gift_codec.py [gifts]
+"""
+import random
+import sys
+import time
+
+import yaml
+
+from ctui.model import gift_codec
+from ctui.model.gift import Gift
+
+DESCRIPTIONS = ['with chocolate', 'size M, dark blue', 'the one from Paris',
+                'signed copy: first edition', 'Yes', 'multi\nline']
+OCCASIONS = ['birthday', 'christmas', 'wedding anniversary']
+
+
+def create_dumps(count):
+    dumps = []
+    for i in range(count):
+        data = {'desc': random.choice(DESCRIPTIONS)}
+        if i % 2:
+            data['gifted'] = True
+        if i % 3:
+            data['occasions'] = random.sample(OCCASIONS, 2)
+        if i % 5 == 0:
+            data['permanent'] = True
+        dumps.append(yaml.dump(data, default_flow_style=False,
+                               allow_unicode=True).strip())
+    return dumps
+
+
+def measure(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - start) / len(items)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    dumps = create_dumps(count)
+    data = [yaml.safe_load(dump) for dump in dumps]
+    fast = sum(gift_codec.load_flat(dump) is not None for dump in dumps)
+
+    yaml_load = measure(yaml.safe_load, dumps)
+    codec_load = measure(gift_codec.load, dumps)
+    gift_load = measure(lambda dump: Gift.from_dump('Gift', dump), dumps)
+    yaml_dump = measure(lambda d: yaml.dump(d, default_flow_style=False,
+                                            allow_unicode=True), data)
+    codec_dump = measure(gift_codec.dump, data)
+
+    print(f'{count} gifts, {fast / count:.0%} on the fast path, '
+          f'libyaml: {gift_codec.SafeLoader is not yaml.SafeLoader}')
+    print(f'load: yaml {yaml_load * 1e6:.1f} µs, '
+          f'codec {codec_load * 1e6:.1f} µs '
+          f'({yaml_load / codec_load:.1f}x), '
+          f'Gift.from_dump {gift_load * 1e6:.1f} µs')
+    print(f'dump: yaml {yaml_dump * 1e6:.1f} µs, '
+          f'codec {codec_dump * 1e6:.1f} µs ({yaml_dump / codec_dump:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Compare parsing an N3 file in one process with the parallel parser.
+
+Usage: python benchmarks/parallel_parse.py [workers] [contacts ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from rdflib import Graph
+
+from ctui.repository.parallel_parser import parse_n3
+from contact_model import create_n3_file
+
+
+def measure(parse):
+    start = time.perf_counter()
+    g = parse()
+    return g, time.perf_counter() - start
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    contact_counts = [int(c) for c in sys.argv[2:]] or [10000, 100000]
+
+    for contact_count in contact_counts:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'contacts.n3')
+            create_n3_file(path, contact_count, 5)
+            size = os.path.getsize(path)
+
+            serial, serial_time = measure(
+                lambda: Graph().parse(path, format='n3'))
+            parallel, parallel_time = measure(
+                lambda: parse_n3(path, workers, min_size=0))
+
+        assert len(serial) == len(parallel)
+
+        print(f'{contact_count} contacts ({size / 1024 / 1024:.1f} MB), '
+              f'{workers} workers')
+        print(f'serial {serial_time:.2f} s, parallel {parallel_time:.2f} s, '
+              f'speedup {serial_time / parallel_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,7 @@ import os.path
 from argparse import ArgumentParser
 
 import ctui.util as util
-from ctui.core import Core
-from ctui.ui import UI
-from ctui.model.contact import Contact
+from ctui.repository.names import scan_contact_names
 
 
 def main():
@@ -24,6 +22,17 @@ def main():
                         metavar="<contact_name>",
                         help="select a contact by name")
 
+    parser.add_argument("--import-n3",
+                        metavar="<n3_file>",
+                        help="import an N3 file into the SQLite database and "
+                             "exit")
+
+    parser.add_argument("--convert-rdf-layout",
+                        choices=["single", "sharded"],
+                        help="convert the RDF contacts between the single file "
+                             "(rdf_file) and the sharded layout (rdf_dir) and "
+                             "exit")
+
     args = parser.parse_args()
 
     config_path = os.path.expanduser(args.config)
@@ -34,20 +43,64 @@ def main():
 
     config = util.load_config(config_path)
 
-    core = Core(config)
-
     if args.names:
-        for name in core.contact_handler.load_contact_names():
+        for name in scan_contact_names(config):
             print(name)
         exit(0)
 
+    if args.import_n3:
+        import_n3(config, os.path.expanduser(args.import_n3))
+        exit(0)
+
+    if args.convert_rdf_layout:
+        convert_rdf_layout(config, args.convert_rdf_layout)
+        exit(0)
+
+    # imported here as printing the names must not load rdflib, gnupg or urwid
+    from ctui.core import Core
+    from ctui.model.contact import Contact
+    from ctui.ui import UI
+
+    core = Core(config)
+
     ui = UI(core, config)
 
     if args.select:
         contact_id = Contact.name_to_id(args.select)
         core.select_contact(contact_id)
 
-    ui.run()
+    try:
+        ui.run()
+    finally:
+        core.close()
+
+
+def import_n3(config, n3_file):
+    from ctui.repository.rdf import RDFStore
+    from ctui.repository.sqlite import SQLiteStore
+
+    sqlite_file = os.path.expanduser(config['path']['sqlite_file'])
+    rdfstore = RDFStore(n3_file, config['rdf']['namespace'])
+    sqlitestore = SQLiteStore(sqlite_file)
+    count = sqlitestore.import_rdfstore(rdfstore)
+    sqlitestore.close()
+    print(f'Imported {count} contacts into "{sqlite_file}"')
+
+
+def convert_rdf_layout(config, layout):
+    from ctui.repository.rdf import RDFStore
+    from ctui.repository.rdf_sharded import ShardedRDFStore
+
+    rdf_file = os.path.expanduser(config['path']['rdf_file'])
+    rdf_dir = os.path.expanduser(config['path']['rdf_dir'])
+    namespace = config['rdf']['namespace']
+
+    if layout == 'sharded':
+        ShardedRDFStore.from_rdfstore(RDFStore(rdf_file, namespace), rdf_dir)
+        print(f'Converted "{rdf_file}" to "{rdf_dir}"')
+    else:
+        ShardedRDFStore(rdf_dir, namespace).to_file(rdf_file)
+        print(f'Converted "{rdf_dir}" to "{rdf_file}"')
 
 
 if __name__ == "__main__":
@@ -1,3 +1,5 @@
+from functools import partial
+
 from ctui.handler.redraw import \
     ContactDeletedRedraw, \
     DetailDeletedRedraw, \
@@ -26,18 +28,35 @@ class Command:
 
         self.msg = ""
 
+    @classmethod
+    def find(cls, name):
+        for command_class in cls.__subclasses__():
+            if name in command_class.names:
+                return command_class
+            found = command_class.find(name)
+            if found:
+                return found
+        return None
+
     def execute(self, args):
+        arg = self._begin(args)
+
+        try:
+            self._execute(arg)
+        except Exception as e:
+            self.msg = str(e)
+        self._end()
+
+    def _begin(self, args):
         self.focused_contact = self.core.ui.get_focused_contact()
         self.focused_detail = self.core.ui.get_focused_detail()
 
         arg = " ".join(args)
         if self._is_custom_input_handling():
             arg = args
+        return arg
 
-        try:
-            self._execute(arg)
-        except Exception as e:
-            self.msg = str(e)
+    def _end(self):
         self._update()
         self.core.ui.console.show_message(self.msg)
 
@@ -51,6 +70,44 @@ class Command:
         pass
 
 
+class GpgCommand(Command):
+    """
+    Command of which the gpg part runs in the worker pool of the core, so
+    that gpg-agent and pinentry don't block the UI. _execute returns a
+    GpgJob, or None if there is nothing to run. The result of the job is
+    passed to _finish in the main loop.
+    """
+    pending_msg = 'Waiting for gpg …'
+
+    def execute(self, args):
+        arg = self._begin(args)
+
+        try:
+            job = self._execute(arg)
+        except Exception as e:
+            self.msg = str(e)
+            job = None
+
+        if job is None:
+            self._end()
+            return
+
+        self.core.ui.console.show_message(self.pending_msg)
+        self.core.submit_gpg_job(job.run, partial(self.finish, job))
+
+    def finish(self, job, status, error):
+        try:
+            if error is not None:
+                raise error
+            self._finish(job.apply(status))
+        except Exception as e:
+            self.msg = str(e)
+        self._end()
+
+    def _finish(self, result):
+        self.msg = result
+
+
 class AddContact(Command):
     name = 'add-contact'
     names = ['add-contact']
@@ -69,24 +126,28 @@ class RenameContact(Command):
     names = ['rename-contact']
 
     def _execute(self, new_name):
-        self.msg = self.core.rename_contact(self.focused_contact.get_id(),
-                                            new_name)
+        with self.core.transaction():
+            self.msg = self.core.rename_contact(self.focused_contact.get_id(),
+                                                new_name)
         self.to_focus_contact = Contact(new_name)
 
     def _update(self):
-        ContactAddedOrEditedRedraw(self.core, self.to_focus_contact).redraw()
+        ContactAddedOrEditedRedraw(self.core, self.to_focus_contact,
+                                   self.focused_contact.get_id()).redraw()
 
 
 class DeleteContact(Command):
     name = 'delete-contact'
     names = ['delete-contact']
+    contact_id = None
 
     def _execute(self, name):
-        contact_id = Contact.name_to_id(name)
-        self.msg = self.core.delete_contact(contact_id)
+        self.contact_id = Contact.name_to_id(name)
+        with self.core.transaction():
+            self.msg = self.core.delete_contact(self.contact_id)
 
     def _update(self):
-        ContactDeletedRedraw(self.core).redraw()
+        ContactDeletedRedraw(self.core, self.contact_id).redraw()
 
 
 class AddAttribute(Command):
@@ -101,9 +162,10 @@ class AddAttribute(Command):
         value = " ".join(args[1:])
         attribute = Attribute(key, value)
         self.to_focus_detail = attribute
-        self.msg = self.core.rdfstore.add_attribute(
-            self.focused_contact.get_id(),
-            attribute)
+        with self.core.transaction():
+            self.msg = self.core.rdfstore.add_attribute(
+                self.focused_contact.get_id(),
+                attribute)
 
     def _update(self):
         DetailAddedOrEditedRedraw(self.core, self.to_focus_detail,
@@ -124,13 +186,15 @@ class EditAttribute(Command):
         old_attr = self.focused_detail
         self.to_focus_detail = new_attr
 
-        if old_attr.key == "givenName":  # special case: rename
-            self.msg = self.core.rename_contact(self.focused_contact.get_id(),
-                                                new_attr.value)
-        else:
-            self.msg = self.core.rdfstore.edit_attribute(
-                self.focused_contact.get_id(),
-                old_attr, new_attr)
+        with self.core.transaction():
+            if old_attr.key == "givenName":  # special case: rename
+                self.msg = self.core.rename_contact(
+                    self.focused_contact.get_id(),
+                    new_attr.value)
+            else:
+                self.msg = self.core.rdfstore.edit_attribute(
+                    self.focused_contact.get_id(),
+                    old_attr, new_attr)
 
     def _update(self):
         DetailAddedOrEditedRedraw(self.core, self.to_focus_detail,
@@ -156,6 +220,66 @@ class DeleteAttribute(Command):
         DetailDeletedRedraw(self.core).redraw()
 
 
+class FindContact(Command):
+    name = 'find'
+    names = ['find']
+
+    def _is_custom_input_handling(self):
+        return True
+
+    def _execute(self, args):
+        if len(args) < 2:
+            raise ValueError('Usage: find <key> <value>')
+
+        key = args[0]
+        value = " ".join(args[1:])
+        names = self.core.rdfstore.find_contacts(Attribute(key, value))
+
+        if not names:
+            self.msg = f'No contact with {key}={value}'
+            return
+
+        self.to_focus_contact = Contact(names[0])
+        self.msg = ", ".join(names)
+
+    def _update(self):
+        if self.to_focus_contact:
+            self.core.select_contact(self.to_focus_contact.get_id())
+
+
+class SearchNotes(Command):
+    name = 'search-notes'
+    names = ['search-notes']
+
+    def _execute(self, query):
+        if not query:
+            raise ValueError('Usage: search-notes <query>')
+
+        hits = self.core.textfilestore.search_notes(query)
+
+        if not hits:
+            self.msg = f'No notes found for "{query}"'
+            return
+
+        contact_id, self.tab_id, detail_id = hits[0]
+        self.to_focus_contact = Contact(Contact.id_to_name(contact_id))
+        if self.tab_id == 'notes':
+            self.to_focus_detail = Note(detail_id, None)
+        else:
+            self.to_focus_detail = self.core.textfilestore.get_gift(
+                contact_id, detail_id)
+
+        self.msg = f'{len(hits)} hits: ' + ", ".join(
+            f'{Contact.id_to_name(contact_id)} ({detail_id})'
+            for contact_id, tab_id, detail_id in hits)
+
+    def _update(self):
+        if self.to_focus_contact:
+            self.core.select_contact(self.to_focus_contact.get_id())
+            DetailAddedOrEditedRedraw(self.core, self.to_focus_detail,
+                                      self.tab_id).redraw()
+
+
 class AddNote(Command):
     name = 'add-note'
     names = ['add-note']
@@ -184,7 +308,7 @@ class AddNote(Command):
                                   "notes").redraw()
 
 
-class AddEncryptedNote(Command):
+class AddEncryptedNote(GpgCommand):
     name = 'add-encrypted-note'
     names = ['add-encrypted-note']
 
@@ -205,11 +329,11 @@ class AddEncryptedNote(Command):
 
         content = self.core.editor.add(filepath)
         note = EncryptedNote.from_dump(note_id, content)
-        self.msg = self.core.textfilestore.add_encrypted_note(
-            contact_id, note)
-
         self.to_focus_detail = note
 
+        return self.core.textfilestore.prepare_add_encrypted_note(
+            contact_id, note)
+
     def _update(self):
         DetailAddedOrEditedRedraw(self.core, self.to_focus_detail,
                                   "notes").redraw()
@@ -265,7 +389,9 @@ class EditNote(Command):
         # TODO use random temp path instead?
         self.core.textfilestore.create_note_dir(contact_id)
 
-        new_content = self.core.editor.edit(filepath)
+        old_content = self.core.textfilestore.get_note(contact_id,
+                                                       note_id).to_dump()
+        new_content = self.core.editor.edit(filepath, old_content)
         note = Note.from_dump(note_id, new_content)
         self.msg = self.core.textfilestore.edit_note(contact_id, note_id, note)
         self.to_focus_detail = note
@@ -298,7 +424,7 @@ class DeleteNote(Command):
         DetailDeletedRedraw(self.core).redraw()
 
 
-class EncryptNote(Command):
+class EncryptNote(GpgCommand):
     name = 'encrypt-note'
     names = ['encrypt-note']
 
@@ -315,14 +441,15 @@ class EncryptNote(Command):
         if not self.core.textfilestore.has_note(contact_id, note_id):
             raise ValueError(f'Note "{note_id}" not existing')
 
-        self.msg = self.core.textfilestore.encrypt_note(contact_id, note_id)
+        return self.core.textfilestore.prepare_encrypt_note(contact_id,
+                                                            note_id)
 
     def _update(self):
         DetailAddedOrEditedRedraw(self.core, self.to_focus_detail,
                                   "notes").redraw()
 
 
-class DecryptNote(Command):
+class DecryptNote(GpgCommand):
     name = 'decrypt-note'
     names = ['decrypt-note']
 
@@ -339,14 +466,15 @@ class DecryptNote(Command):
         if not self.core.textfilestore.has_note(contact_id, note_id):
             raise ValueError(f'Note "{note_id}" not existing')
 
-        self.msg = self.core.textfilestore.decrypt_note(contact_id, note_id)
+        return self.core.textfilestore.prepare_decrypt_note(contact_id,
+                                                            note_id)
 
     def _update(self):
         DetailAddedOrEditedRedraw(self.core, self.to_focus_detail,
                                   "notes").redraw()
 
 
-class ToggleNoteEncryption(Command):
+class ToggleNoteEncryption(GpgCommand):
     name = 'toggle-note-encryption'
     names = ['toggle-note-encryption']
 
@@ -367,14 +495,18 @@ class ToggleNoteEncryption(Command):
             self.core.memorystore.delete_note(contact_id, note_id)
             self.msg = "Hide encrypted note content"
         else:  # show
-            content = self.core.textfilestore.get_encrypted_note_text(
+            self.contact_id = contact_id
+            self.note_id = note_id
+            return self.core.textfilestore.prepare_get_encrypted_note_text(
                 contact_id,
                 note_id)
-            encrypted_note = EncryptedNote(note_id, content)
-            if self.core.memorystore.add_note(contact_id, encrypted_note):
-                self.msg = "Show encrypted note content"
-            else:
-                raise Exception("Failed to show encrypted note content")
+
+    def _finish(self, content):
+        encrypted_note = EncryptedNote(self.note_id, content)
+        if self.core.memorystore.add_note(self.contact_id, encrypted_note):
+            self.msg = "Show encrypted note content"
+        else:
+            raise Exception("Failed to show encrypted note content")
 
     def _update(self):
         DetailAddedOrEditedRedraw(self.core, self.to_focus_detail,
@@ -391,15 +523,17 @@ class ShowAllEncryptedNotes(Command):
         if not self.core.textfilestore.has_encrypted_notes(contact_id):
             raise Exception("No encrypted notes found")
 
-        for note in self.core.textfilestore.get_encrypted_notes(
-                contact_id):
-            content = self.core.textfilestore.get_encrypted_note_text(
-                contact_id,
-                note.note_id)
-            note = EncryptedNote(note.note_id, content)
-            self.core.memorystore.add_note(contact_id, note)
+        note_ids = [note.note_id for note in
+                    self.core.textfilestore.get_encrypted_notes(contact_id)
+                    if not self.core.memorystore.has_note(contact_id,
+                                                          note.note_id)]
+        if not note_ids:
+            self.msg = "Show content of all encrypted notes"
+            return
 
-        self.msg = "Show content of all encrypted notes"
+        # the notes are shown as they are decrypted
+        self.core.show_encrypted_notes(contact_id, note_ids)
+        self.msg = f'Decrypting {len(note_ids)} notes'
 
     def _update(self):
         # TODO
@@ -407,6 +541,16 @@ class ShowAllEncryptedNotes(Command):
                                   "notes").redraw()
 
 
+class CancelDecryption(Command):
+    name = 'cancel-decryption'
+    names = ['cancel-decryption']
+
+    def _execute(self, args=None):
+        if not self.core.cancel_decryption():
+            raise Exception("No decryption running")
+        self.msg = "Cancelling decryption"
+
+
 class HideAllEncryptedNotes(Command):
     name = 'hide-all-encrypted-notes'
     names = ['hide-all-encrypted-notes']
@@ -426,6 +570,24 @@ class HideAllEncryptedNotes(Command):
                                   "notes").redraw()
 
 
+class PackContact(Command):
+    name = 'pack'
+    names = ['pack']
+
+    def _execute(self, args=None):
+        contact_id = self.focused_contact.get_id()
+        self.msg = self.core.textfilestore.pack_contact(contact_id)
+
+
+class UnpackContact(Command):
+    name = 'unpack'
+    names = ['unpack']
+
+    def _execute(self, args=None):
+        contact_id = self.focused_contact.get_id()
+        self.msg = self.core.textfilestore.unpack_contact(contact_id)
+
+
 class AddGift(Command):
     name = 'add-gift'
     names = ['add-gift']
@@ -504,7 +666,9 @@ class EditGift(Command):
         # TODO use random temp path instead?
         self.core.textfilestore.create_gift_dir(contact_id)
 
-        new_content = self.core.editor.edit(filepath)
+        old_content = self.core.textfilestore.get_gift_dump(contact_id,
+                                                            gift_id)
+        new_content = self.core.editor.edit(filepath, old_content)
         gift = Gift.from_dump(gift_id, new_content)
         self.msg = self.core.textfilestore.edit_gift(contact_id, gift_id, gift)
         self.to_focus_detail = gift
@@ -38,12 +38,9 @@ class Console(urwid.Filler):
             self.body = urwid.AttrMap(urwid.Text(meta, 'right'), 'status_bar')
 
     def handle(self, args):
-        command = args[0]
-        for command_class in Command.__subclasses__():
-            if command in command_class.names:
-                command_instance = command_class(self.core)
-                command_instance.execute(args[1:])
-                break
+        command_class = Command.find(args[0])
+        if command_class:
+            command_class(self.core).execute(args[1:])
 
     def clear(self):
         self.body = urwid.Text('')
@@ -10,6 +10,7 @@ from ctui.component.detail_entry import DetailEntry, AttributeEntry, \
 from ctui.keybindings import KeybindingMixin, KeybindingCommand
 from ctui.component.list_box import CListBox
 from ctui.model.attribute import Attribute
+from ctui.model.encrypted_note import EncryptedNote
 from ctui.model.gift import Gift
 from ctui.model.note import Note
 
@@ -47,7 +48,7 @@ class ContactDetails(CListBox):
             # "'<' not supported between instances of 'NoneType' and 'int'"
             if len(self.contents) > 0:
                 self.focus_position = pos
-        except TypeError:
+        except (TypeError, IndexError):
             pass
 
     def get_count(self) -> int:
@@ -68,6 +69,13 @@ class ContactDetails(CListBox):
                     entry.detail, Gift):
                     if detail.value == entry.detail.name:
                         return pos
+                elif isinstance(detail, Note):
+                    # notes are shown as LazyNote, compare them by id
+                    if isinstance(entry.detail, Note) and \
+                            isinstance(entry.detail, EncryptedNote) == \
+                            isinstance(detail, EncryptedNote) and \
+                            entry.detail.note_id == detail.note_id:
+                        return pos
                 else:
                     if type(entry.detail) == type(detail):
                         if entry.detail == detail:
@@ -155,7 +163,7 @@ class NoteDetails(ContactDetails, KeybindingMixin):
         pos = 0
 
         for note in notes:
-            if type(note) is Note:  # plain note
+            if not isinstance(note, EncryptedNote):  # plain note
                 entries.append(
                     NoteEntry(contact_id, note, pos, self.core))
             else:  # encrypted note
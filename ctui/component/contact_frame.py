@@ -8,18 +8,29 @@ class CFrame(urwid.Frame, KeybindingMixin):
         super(CFrame, self).__init__(body=body, footer=footer)
         self.core = core
         self.name = 'frame'
+        self.quit_failed = False  # quitting again discards unsaved changes
 
     def keypress(self, size, key):
         return self.handle_keypress(size, key, None, True)
 
     @KeybindingCommand("quit")
     def quit_app(self, command_repeat, size):
+        try:
+            self.core.flush()
+        except Exception as e:
+            if not self.quit_failed:
+                # don't lose the changes without asking
+                self.quit_failed = True
+                self.core.ui.console.show_message(
+                    f'Error: saving contacts failed: {e}. '
+                    f'Quit again to discard the changes.')
+                return
         raise urwid.ExitMainLoop()
 
     @KeybindingCommand("reload")
     def reload(self, command_repeat, size):
         focused_contact = self.core.ui.get_focused_contact()
-        self.core.update_contact_list()
+        self.core.reload_contact_list()
         self.core.ui.set_focused_contact(focused_contact.get_id())
 
     @KeybindingCommand("open_console")
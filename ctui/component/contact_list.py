@@ -1,3 +1,5 @@
+import bisect
+
 import urwid
 
 from ctui.component.contact_entry import ContactEntry
@@ -43,6 +45,112 @@ class ContactList(CListBox, KeybindingMixin):
 
         self.listwalker.set_focus(0)
 
+    def update_data(self, contact_list):
+        """
+        Patch the entries to match the sorted contact_list, creating widgets
+        only for added contacts and keeping the focus on the same contact.
+        """
+        if not contact_list or not hasattr(self.focus, 'contact'):
+            self.set_data(contact_list)
+            return
+
+        focused_contact = self.get_focused_contact()
+        focused_pos = self.get_focused_contact_pos()
+        names = {contact.name for contact in contact_list}
+
+        urwid.disconnect_signal(self.listwalker, 'modified',
+                                self.select_contact)
+
+        for pos in reversed(range(len(self.listwalker))):
+            if self.listwalker[pos].contact.name not in names:
+                del self.listwalker[pos]
+
+        # the remaining entries are in the order of contact_list
+        shown_names = {entry.contact.name for entry in self.listwalker}
+        for pos, contact in enumerate(contact_list):
+            if contact.name not in shown_names:
+                self.listwalker.insert(pos, ContactEntry(contact, pos,
+                                                         self.core))
+
+        pos = self.get_contact_position(focused_contact.get_id())
+        if pos is not None:
+            self.listwalker.set_focus(pos)
+        else:
+            self.listwalker.set_focus(min(focused_pos,
+                                          len(self.listwalker) - 1))
+
+        urwid.connect_signal(self.listwalker, 'modified', self.select_contact)
+
+        if pos is None:
+            # the focused contact was deleted, show its successor
+            self.select_contact()
+
+    def insert_contact(self, contact):
+        """
+        Insert an entry for contact at its sorted position, unless it is
+        already shown. Returns the position of the entry.
+        """
+        pos = self.get_contact_position(contact.get_id())
+        if pos is not None:
+            return pos
+
+        if not self.has_contacts():
+            self.set_data([contact])
+            return 0
+
+        pos = self.bisect(contact.name)
+        urwid.disconnect_signal(self.listwalker, 'modified',
+                                self.select_contact)
+        self.listwalker.insert(pos, ContactEntry(contact, pos, self.core))
+        urwid.connect_signal(self.listwalker, 'modified', self.select_contact)
+        return pos
+
+    def remove_contact(self, contact_id):
+        """
+        Remove the entry of a contact if it is shown. Returns its former
+        position or None.
+        """
+        pos = self.get_contact_position(contact_id)
+        if pos is None:
+            return None
+
+        if len(self.listwalker) == 1:
+            self.set_data([])
+            return pos
+
+        urwid.disconnect_signal(self.listwalker, 'modified',
+                                self.select_contact)
+        del self.listwalker[pos]
+        urwid.connect_signal(self.listwalker, 'modified', self.select_contact)
+        return pos
+
+    def move_contact(self, contact_id, contact):
+        """
+        Move the entry of a renamed contact to the sorted position of its
+        new name, reusing the widget. Returns the new position.
+        """
+        pos = self.get_contact_position(contact_id)
+        if pos is None:
+            return self.insert_contact(contact)
+
+        urwid.disconnect_signal(self.listwalker, 'modified',
+                                self.select_contact)
+        entry = self.listwalker.pop(pos)
+        entry.contact = contact
+        entry.set_label(contact.name)
+        pos = self.bisect(contact.name)
+        self.listwalker.insert(pos, entry)
+        urwid.connect_signal(self.listwalker, 'modified', self.select_contact)
+        return pos
+
+    def has_contacts(self):
+        return len(self.listwalker) > 0 and \
+            hasattr(self.listwalker[0], 'contact')
+
+    def bisect(self, name):
+        return bisect.bisect_left(self.listwalker, name,
+                                  key=lambda entry: entry.contact.name)
+
     def select_contact(self):
         contact_id = None
 
@@ -69,11 +177,14 @@ class ContactList(CListBox, KeybindingMixin):
         return len(self.body)
 
     def get_contact_position(self, contact_id: str) -> int | None:
-        pos = 0
-        for entry in self.body:
-            if entry.contact.get_id() == contact_id:
-                return pos
-            pos = pos + 1
+        if not self.has_contacts():
+            return None
+
+        # the entries are sorted by name
+        pos = self.bisect(Contact.id_to_name(contact_id))
+        if pos < len(self.listwalker) and \
+                self.listwalker[pos].contact.get_id() == contact_id:
+            return pos
         return None
 
     def get_contact_position_startswith(self, name):
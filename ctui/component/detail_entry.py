@@ -84,10 +84,11 @@ class GiftEntry(DetailEntry):
 
 class NoteEntry(DetailEntry):
     def __init__(self, contact_id, note, pos, core):
-        super(NoteEntry, self).__init__(contact_id, note, note.content, pos,
-                                        core)
+        super(NoteEntry, self).__init__(contact_id, note, note.get_preview(),
+                                        pos, core)
         self.note = note
         self.name = 'note_entry'
+        self.expanded = False
 
     def keypress(self, size, key):
         if key == 'enter':  # TODO special treatment of enter (must be calling super())
@@ -111,6 +112,20 @@ class NoteEntry(DetailEntry):
         command = f'{DeleteNote.name} {self.note.note_id}'
         self.core.ui.console.show_console(command)
 
+    @KeybindingCommand("expand_note")
+    def expand_note(self, command_repeat, size):
+        self.expanded = not self.expanded
+        if self.expanded:
+            self.set_label(self.note.content)
+        else:
+            self.set_label(self.note.get_preview())
+
+    @KeybindingCommand("copy_note")
+    def copy_note(self, command_repeat, size):
+        pyclip.copy(self.note.content)
+        self.core.ui.console.show_message(
+            f'Copied note {self.note.note_id} to clipboard.')
+
     @KeybindingCommand("encrypt_note")
     def encrypt_note(self, command_repeat, size):
         EncryptNote(self.core).execute([self.note.note_id])
@@ -1,4 +1,7 @@
+import os
+import queue
 import socket
+from concurrent.futures import CancelledError
 
 from httplib2 import ServerNotFoundError
 
@@ -7,9 +10,16 @@ from ctui.handler.contact_handler import ContactHandler
 from ctui.keybindings import Keybindings
 from ctui.repository.memory import MemoryStore
 from ctui.model.contact import Contact
+from ctui.model.encrypted_note import EncryptedNote
 from ctui.model.google_contact import GoogleContact
 from ctui.repository.rdf import RDFStore
+from ctui.repository.rdf_sharded import ShardedRDFStore
+from ctui.repository.snapshot import get_cache_dir
+from ctui.repository.sqlite import SQLiteStore
+from ctui.service.contact_index import RDF
 from ctui.service.editor import Editor
+from ctui.service.watcher import FileWatcher
+from ctui.service.worker_pool import WorkerPool
 from ctui.repository.textfile import TextFileStore
 
 
@@ -21,10 +31,48 @@ class Core:
 
         self.contact_handler = ContactHandler(self)
 
-        self.rdfstore = RDFStore(config['path']['rdf_file'],
-                                 config['rdf']['namespace'])
-        self.textfilestore = TextFileStore(config['path']['textfile_dir'],
-                                           config['encryption']['keyid'])
+        if config['rdf'].get('backend', fallback='n3') == 'sqlite':
+            # the SQLiteStore provides the same interface as the RDFStore
+            self.rdfstore = SQLiteStore(
+                os.path.expanduser(config['path']['sqlite_file']))
+        elif config['rdf'].get('layout', fallback='single') == 'sharded':
+            self.rdfstore = ShardedRDFStore(
+                os.path.expanduser(config['path']['rdf_dir']),
+                config['rdf']['namespace'],
+                write_delay=config['rdf'].getfloat('write_delay',
+                                                   fallback=0.5),
+                uri_subjects=config['rdf'].getboolean('uri_subjects',
+                                                      fallback=False))
+        else:
+            self.rdfstore = RDFStore(
+                config['path']['rdf_file'],
+                config['rdf']['namespace'],
+                journal=config['rdf'].getboolean('journal', fallback=False),
+                journal_max_size=config['rdf'].getint('journal_max_size',
+                                                      fallback=1024 * 1024),
+                cache_dir=self.get_cache_dir(config),
+                write_delay=config['rdf'].getfloat('write_delay',
+                                                   fallback=0.5),
+                parse_workers=config['rdf'].getint('parse_workers',
+                                                   fallback=0),
+                parse_min_size=config['rdf'].getint('parse_min_size',
+                                                    fallback=4 * 1024 * 1024),
+                uri_subjects=config['rdf'].getboolean('uri_subjects',
+                                                      fallback=False))
+        self.textfilestore = TextFileStore(
+            config['path']['textfile_dir'],
+            config['encryption']['keyid'],
+            gift_cache_size=config.getint('textfile', 'gift_cache_size',
+                                          fallback=1024),
+            note_preview_bytes=config.getint('textfile', 'note_preview_bytes',
+                                             fallback=4096),
+            note_preview_lines=config.getint('textfile', 'note_preview_lines',
+                                             fallback=20),
+            note_mmap_size=config.getint('textfile', 'note_mmap_size',
+                                         fallback=1024 * 1024),
+            keyring_ttl=config['encryption'].getint('keyring_ttl',
+                                                    fallback=300),
+            fulltext_cache_dir=self.get_fulltext_cache_dir(config))
         self.memorystore = MemoryStore()
 
         if False and self.is_connected() and not test:  # TODO
@@ -42,9 +90,210 @@ class Core:
 
         self.filter_string = ''
 
+        self.watcher = None
+        self.watched_contact_id = None
+        self.decryption = None  # futures of the notes being decrypted
+        self.gpg_pool = None
+        self.write_errors = None  # errors of the writer thread
+        self.write_error_pipe = None
+        self.gpg_workers = config['encryption'].getint('gpg_workers',
+                                                       fallback=4)
+
+    @staticmethod
+    def get_cache_dir(config):
+        if not config['rdf'].getboolean('snapshot_cache', fallback=True):
+            return None
+        cache_dir = config['path'].get('cache_dir', fallback=get_cache_dir())
+        return os.path.expanduser(cache_dir)
+
+    @staticmethod
+    def get_fulltext_cache_dir(config):
+        if not config.getboolean('textfile', 'fulltext_cache', fallback=True):
+            return None
+        cache_dir = config['path'].get('cache_dir', fallback=get_cache_dir())
+        return os.path.expanduser(cache_dir)
+
     def register_ui(self, ui):
         self.ui = ui
 
+    def flush(self):
+        """
+        Write pending changes to disk.
+        """
+        self.rdfstore.flush()
+
+    def watch_write_errors(self):
+        """
+        Show errors of background writes of the contacts in the console. They
+        happen in the writer thread, a pipe hands them to the main loop.
+        """
+        self.write_errors = queue.SimpleQueue()
+        self.write_error_pipe = self.ui.main_loop.watch_pipe(
+            self.show_write_errors)
+        self.rdfstore.on_write_error = self.notify_write_error
+
+    def notify_write_error(self, error):
+        # called in the writer thread
+        self.write_errors.put(error)
+        os.write(self.write_error_pipe, b'.')
+
+    def show_write_errors(self, data=None):
+        while not self.write_errors.empty():
+            error = self.write_errors.get()
+            self.ui.console.show_message(
+                f'Error: saving contacts failed, retrying on next change: '
+                f'{error}')
+        return True
+
+    def close(self):
+        if self.watcher:
+            self.watcher.close()
+        if self.gpg_pool:
+            self.gpg_pool.shutdown()
+        if self.write_error_pipe is not None:
+            self.rdfstore.on_write_error = None
+            self.ui.main_loop.remove_watch_pipe(self.write_error_pipe)
+            os.close(self.write_error_pipe)
+            self.write_error_pipe = None
+        self.textfilestore.close()
+        self.rdfstore.close()
+
+    def watch_files(self, use_inotify=True):
+        """
+        Start watching the contact files for changes by other programs.
+        Returns the watcher, its file descriptor is None without inotify.
+        """
+        self.watcher = FileWatcher(use_inotify)
+        self.update_watched_paths()
+        return self.watcher
+
+    def update_watched_paths(self):
+        if not self.watcher:
+            return
+
+        paths = {path: False for path in self.rdfstore.get_watch_paths()}
+        paths[self.textfilestore.path] = False
+
+        # notes and gifts of the shown contact can be edited in place
+        if self.watched_contact_id:
+            for textfile_type in (TextFileStore.NOTES_DIR,
+                                  TextFileStore.GIFTS_DIR):
+                paths[self.textfilestore.get_textfile_path_by_type(
+                    self.watched_contact_id, textfile_type)] = True
+            paths[self.textfilestore.get_pack_filepath(
+                self.watched_contact_id)] = False
+
+        self.watcher.set_paths(paths)
+
+    def reload_changed_files(self):
+        """
+        Apply changes of the contact files by other programs: patch the
+        stores and the contact list and redraw the details of the focused
+        contact if they changed. Returns whether anything changed.
+        """
+        changed_paths = self.watcher.poll()
+        if not changed_paths:
+            return False
+
+        changed = set()
+        if changed_paths & set(self.rdfstore.get_watch_paths()):
+            changed = self.rdfstore.reload()
+            if changed:
+                self.contact_handler.sync_rdf_contacts()
+        if self.textfilestore.path in changed_paths:
+            self.contact_handler.sync_textfile_contacts()
+
+        contact_list = self.contact_handler.load_contacts()
+        contact_list = self.apply_filter(contact_list, self.filter_string)
+        self.ui.list_view.update_data(contact_list)
+
+        focused_contact = self.ui.get_focused_contact()
+        if focused_contact and (
+                focused_contact.name in changed or
+                changed_paths - set(self.rdfstore.get_watch_paths()) -
+                {self.textfilestore.path}):
+            detail_pos = self.ui.get_focused_detail_pos()
+            self.update_contact_details(focused_contact.get_id())
+            self.ui.set_focused_detail_pos(detail_pos)
+
+        return True
+
+    def submit_gpg_job(self, function, callback):
+        """
+        Run a gpg function in the background and pass its result to
+        callback(result, error) in the main loop. Returns the future.
+        """
+        if self.gpg_pool is None:
+            self.gpg_pool = WorkerPool(self.ui.main_loop, self.gpg_workers)
+        return self.gpg_pool.submit(function, callback)
+
+    def show_encrypted_notes(self, contact_id, note_ids):
+        """
+        Decrypt notes in the gpg worker pool and show each one as soon as it
+        is decrypted, reporting the progress in the console.
+        """
+        self.cancel_decryption()
+
+        total = len(note_ids)
+        progress = {'done': 0, 'failed': 0, 'cancelled': 0}
+
+        def on_result(note_id, text, error):
+            progress['done'] = progress['done'] + 1
+            if isinstance(error, CancelledError):
+                progress['cancelled'] = progress['cancelled'] + 1
+            elif text is None:
+                progress['failed'] = progress['failed'] + 1
+            else:
+                self.memorystore.add_note(contact_id,
+                                          EncryptedNote(note_id, text))
+                self.refresh_contact_details(contact_id)
+
+            if progress['done'] < total:
+                msg = f'Decrypted {progress["done"]}/{total} notes, ' \
+                      f'cancel with :cancel-decryption'
+            elif progress['cancelled']:
+                msg = f'Decryption cancelled after ' \
+                      f'{total - progress["cancelled"]}/{total} notes'
+            elif progress['failed']:
+                msg = f'Failed to decrypt {progress["failed"]} of {total} notes'
+            else:
+                msg = "Show content of all encrypted notes"
+            if progress['done'] == total and self.decryption is futures:
+                self.decryption = None
+            self.ui.console.show_message(msg)
+
+        futures = self.textfilestore.decrypt_notes(
+            contact_id, note_ids, self.submit_gpg_job, on_result)
+        self.decryption = futures
+
+    def cancel_decryption(self):
+        """
+        Cancel the notes of which the decryption didn't start yet.
+        """
+        if self.decryption is None:
+            return False
+        for future in self.decryption:
+            future.cancel()
+        return True
+
+    def refresh_contact_details(self, contact_id):
+        """
+        Redraw the details of a contact if it is focused, keeping the focused
+        detail.
+        """
+        focused_contact = self.ui.get_focused_contact()
+        if focused_contact and focused_contact.get_id() == contact_id:
+            detail_pos = self.ui.get_focused_detail_pos()
+            self.update_contact_details(contact_id)
+            self.ui.set_focused_detail_pos(detail_pos)
+
+    def transaction(self):
+        """
+        Group several contact store mutations so that they are persisted once
+        and rolled back together on error.
+        """
+        return self.rdfstore.transaction()
+
     def is_connected(self):
         """
         Check if connected to the internet
@@ -61,14 +310,45 @@ class Core:
             pass
         return False
 
+    def reload_contact_list(self, filter_string=None):
+        """
+        Re-read the contacts of the stores to pick up those other programs
+        added or removed and update the contact list.
+        """
+        self.contact_handler.sync_rdf_contacts()
+        self.contact_handler.sync_textfile_contacts()
+        self.update_contact_list(filter_string)
+
     def update_contact_list(self, filter_string=None):
         contact_list = self.contact_handler.load_contacts()
         contact_list = self.apply_filter(contact_list, filter_string)
         self.ui.set_contact_list(contact_list)
 
+    def patch_contact_list(self, contact_id, old_contact_id=None):
+        """
+        Update the entry of a contact after it was added, renamed from
+        old_contact_id or deleted, following the contact index instead of
+        reloading the list.
+        """
+        index = self.contact_handler.get_index()
+        list_view = self.ui.list_view
+        contact = index.get_contact(contact_id)
+
+        if old_contact_id is not None and old_contact_id not in index:
+            if contact is not None:
+                return list_view.move_contact(old_contact_id, contact)
+            list_view.remove_contact(old_contact_id)
+        if contact is None:
+            return list_view.remove_contact(contact_id)
+        return list_view.insert_contact(contact)
+
     def update_contact_details(self, contact_id):
         self.ui.set_contact_details(contact_id)
 
+        if contact_id != self.watched_contact_id:
+            self.watched_contact_id = contact_id
+            self.update_watched_paths()
+
     @staticmethod
     def apply_filter(contact_list, filter_string=None):
         if not filter_string:
@@ -101,6 +381,7 @@ class Core:
         if self.contains_contact(contact.get_id()):
             return "Error: {} already exists.".format(contact.name)
         self.rdfstore.add_contact(contact)
+        self.contact_handler.get_index().add(contact, RDF)
         return "{} added.".format(contact.name)
 
     def rename_contact(self, contact_id, new_name):
@@ -116,6 +397,7 @@ class Core:
             self.rdfstore.rename_contact(contact_id, new_name)
         if self.textfilestore.contains_contact(contact_id):
             self.textfilestore.rename_contact(contact_id, new_name)
+        self.contact_handler.get_index().rename(contact_id, new_name)
         return "{} renamed to {}.".format(name, new_name)
 
     def delete_contact(self, contact_id):
@@ -128,6 +410,7 @@ class Core:
             self.rdfstore.delete_contact(contact_id)
         if self.textfilestore.contains_contact(contact_id):
             self.textfilestore.delete_contact(contact_id)
+        self.contact_handler.get_index().remove(contact_id)
         return "{} deleted.".format(name)
 
     def add_google_contact(self, name):
@@ -4,47 +4,52 @@ from ctui.model.attribute import Attribute
 from ctui.model.contact import Contact
 from ctui.model.gift import Gift
 from ctui.model.note import Note
+from ctui.service.contact_index import ContactIndex, RDF, TEXTFILE, GOOGLE
 
 
 class ContactHandler:
     def __init__(self, core):
         self.core = core
+        self.index = None
+
+    def get_index(self) -> ContactIndex:
+        """
+        @return: index of the contacts of all stores, built on first use and
+                 updated by the core afterwards
+        """
+        if self.index is None:
+            self.index = ContactIndex()
+            # keep the index up to date with the contact directories the
+            # store creates, e.g. for the first note of a contact
+            self.core.textfilestore.on_contact_dir_created = \
+                self.add_textfile_contact
+            self.sync_rdf_contacts()
+            self.sync_textfile_contacts()
+            if self.core.googlestore is not None:
+                self.index.sync(GOOGLE, self.core.googlestore.load_contacts())
+        return self.index
+
+    def sync_textfile_contacts(self):
+        return self.get_index().sync(
+            TEXTFILE, [Contact(c) for c in
+                       self.core.textfilestore.get_contact_names()])
+
+    def add_textfile_contact(self, contact_id):
+        self.get_index().add(Contact(Contact.id_to_name(contact_id)), TEXTFILE)
+
+    def sync_rdf_contacts(self):
+        return self.get_index().sync(
+            RDF, [Contact(c) for c in self.core.rdfstore.get_contact_names()])
 
     def load_contacts(self) -> List[Contact]:
         """
-        @return: list of contacts *without* contact details
+        @return: sorted list of contacts *without* contact details, shared
+                 until the contacts change
         """
-        contacts = []
-        for c in self.core.rdfstore.get_contact_names():
-            contacts.append(Contact(c))
-        for c in self.core.textfilestore.get_contact_names():
-            # check if contact already in list
-            try:
-                existing_contact = next(x for x in contacts if c == x.name)
-            except StopIteration:
-                contacts.append(Contact(c))
-        if self.core.googlestore is not None:
-            for contact in self.core.googlestore.load_contacts():
-                # check if contact already in list
-                try:
-                    existing_contact = next(
-                        x for x in contacts if contact.name == x.name)
-                    contacts.remove(existing_contact)
-                    contact.merge(existing_contact)
-                except StopIteration:
-                    pass
-                contacts.append(contact)
-        contacts.sort(key=lambda x: x.name)
-        return contacts
+        return self.get_index().get_contacts()
 
     def load_contact_names(self) -> List[str]:
-        contact_names = self.core.rdfstore.get_contact_names() \
-                        + self.core.textfilestore.get_contact_names()
-
-        if self.core.googlestore is not None:
-            contact_names + self.core.googlestore.load_contact_names()
-
-        return sorted(set(contact_names))
+        return self.get_index().get_names()
 
     def has_details(self, contact_id: str) -> List[Union[Attribute, Note, Gift]]:
         return self.core.rdfstore.has_attributes(contact_id) or \
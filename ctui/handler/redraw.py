@@ -4,12 +4,14 @@ class Redraw:
 
 
 class ContactAddedOrEditedRedraw(Redraw):
-    def __init__(self, core, contact):
+    def __init__(self, core, contact, old_contact_id=None):
         self.contact = contact
+        self.old_contact_id = old_contact_id
         self.core = core
 
     def redraw(self):
-        self.core.update_contact_list()
+        self.core.patch_contact_list(self.contact.get_id(),
+                                     self.old_contact_id)
         self.core.ui.focus_list_view()
 
         self.core.ui.set_focused_contact(self.contact.get_id())
@@ -17,13 +19,15 @@ class ContactAddedOrEditedRedraw(Redraw):
 
 
 class ContactDeletedRedraw(Redraw):
-    def __init__(self, core):
+    def __init__(self, core, contact_id):
+        self.contact_id = contact_id
         self.core = core
 
     def redraw(self):
         deleted_contact_pos = self.core.ui.get_focused_contact_pos()
 
-        self.core.update_contact_list()
+        if self.contact_id is not None:
+            self.core.patch_contact_list(self.contact_id)
         self.core.ui.focus_list_view()
 
         pos = min(deleted_contact_pos, self.core.ui.list_view.get_count() - 1)
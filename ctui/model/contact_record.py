@@ -0,0 +1,31 @@
+class ContactRecord:
+    """
+    Compact, read-only representation of a contact's attributes as sorted
+    (key, value) string tuples. Records are replaced, not modified, when the
+    attributes change.
+    """
+
+    __slots__ = ('name', 'attributes')
+
+    def __init__(self, name, attributes=()):
+        self.name = name
+        self.attributes = attributes
+
+    def __eq__(self, other):
+        return self.name == other.name and self.attributes == other.attributes
+
+    def __str__(self):
+        return f'ContactRecord({self.name}, {len(self.attributes)})'
+
+    def renamed(self, name):
+        return ContactRecord(name, self.attributes)
+
+    def with_attribute(self, key, value):
+        if (key, value) in self.attributes:
+            return self
+        return ContactRecord(self.name,
+                             tuple(sorted(self.attributes + ((key, value),))))
+
+    def without_attribute(self, key, value):
+        return ContactRecord(self.name, tuple(
+            a for a in self.attributes if a != (key, value)))
@@ -1,8 +1,7 @@
 import re
 
-import yaml
-
 from ctui import util
+from ctui.model import gift_codec
 
 
 class Gift:
@@ -33,6 +32,12 @@ class Gift:
     def get_id(self):
         return Gift.name_to_id(self.name)
 
+    def copy(self):
+        occasions = list(self.occasions) if self.occasions is not None \
+            else None
+        return Gift(self.name, self.desc, self.permanent, self.gifted,
+                    occasions)
+
     def to_dict(self):
         data = {}
 
@@ -55,11 +60,9 @@ class Gift:
 
         gift_dict = self.to_dict()
         if gift_dict:
-            dump = yaml.dump(gift_dict,
-                             default_flow_style=False,
-                             allow_unicode=True)
+            dump = gift_codec.dump(gift_dict)
 
-        return dump.strip()
+        return dump
 
     @classmethod
     def from_dict(cls, data):
@@ -76,7 +79,7 @@ class Gift:
         data = {}
 
         if dump:
-            data = yaml.safe_load(dump)
+            data = gift_codec.load(dump)
 
         if not isinstance(data, dict):
             raise ValueError(f'Invalid gift file content "{gift_id}"')
@@ -0,0 +1,112 @@
+"""
+Reading and writing of gift files. Gift files are flat YAML documents with
+the keys desc, gifted, occasions and permanent. The common case of plain
+strings and booleans is handled without YAML, anything else goes through
+libyaml if available, otherwise through the pure Python implementation.
+"""
+import re
+
+import yaml
+
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+SafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+STRING_KEYS = ('desc',)
+BOOL_KEYS = ('gifted', 'permanent')
+LIST_KEYS = ('occasions',)
+BOOLS = {'true': True, 'false': False}
+
+# strings that YAML reads as strings and writes without quotes: starting with
+# a letter, no indicators, no leading, trailing or double spaces, no line
+# wrapping
+PLAIN_PATTERN = re.compile(r"[^\W\d_][\w,.!?()'/+-]*(?: [\w,.!?()'/+-]+)*")
+PLAIN_MAX_LENGTH = 64
+
+# words resolved as booleans or null by YAML 1.1
+RESERVED_WORDS = {'yes', 'no', 'true', 'false', 'on', 'off', 'null', 'y',
+                  'n'}
+
+
+def is_plain(value):
+    return isinstance(value, str) \
+        and len(value) <= PLAIN_MAX_LENGTH \
+        and PLAIN_PATTERN.fullmatch(value) is not None \
+        and value.lower() not in RESERVED_WORDS
+
+
+def load_flat(dump):
+    """
+    Parse a gift file written by dump_flat (or yaml.dump). Returns None if
+    the document uses anything beyond plain strings and booleans.
+    """
+    data = {}
+    items = None  # list of the current list key
+
+    for line in dump.splitlines():
+        if not line:
+            continue
+
+        if line.startswith('- '):
+            if items is None or not is_plain(line[2:]):
+                return None
+            items.append(line[2:])
+            continue
+
+        key, separator, value = line.partition(':')
+        if not separator or key in data:
+            return None
+
+        items = None
+        if key in LIST_KEYS and not value:
+            items = data[key] = []
+        elif not value.startswith(' '):
+            return None
+        elif key in STRING_KEYS and is_plain(value[1:]):
+            data[key] = value[1:]
+        elif key in BOOL_KEYS and value[1:] in BOOLS:
+            data[key] = BOOLS[value[1:]]
+        else:
+            return None
+
+    # an empty list is written as "[]" by YAML
+    if any(isinstance(value, list) and not value for value in data.values()):
+        return None
+    return data
+
+
+def dump_flat(data):
+    """
+    Write a gift dict like yaml.dump with sorted keys. Returns None if a
+    value needs quoting or isn't a plain string or boolean.
+    """
+    lines = []
+
+    for key in sorted(data):
+        value = data[key]
+        if key in STRING_KEYS and is_plain(value):
+            lines.append(f'{key}: {value}')
+        elif key in BOOL_KEYS and isinstance(value, bool):
+            lines.append(f'{key}: {"true" if value else "false"}')
+        elif key in LIST_KEYS and isinstance(value, list) and value \
+                and all(is_plain(item) for item in value):
+            lines.append(f'{key}:')
+            lines.extend(f'- {item}' for item in value)
+        else:
+            return None
+
+    return '\n'.join(lines)
+
+
+def load(dump):
+    data = load_flat(dump)
+    if data is None:
+        data = yaml.load(dump, Loader=SafeLoader)
+    return data
+
+
+def dump(data):
+    content = dump_flat(data)
+    if content is None:
+        content = yaml.dump(data, Dumper=SafeDumper, default_flow_style=False,
+                            allow_unicode=True)
+    return content.strip()
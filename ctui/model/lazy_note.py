@@ -0,0 +1,33 @@
+from ctui.model.note import Note
+
+
+class LazyNote(Note):
+    """
+    Plain note of which only a preview was read. The full content is loaded
+    by calling load the first time it is accessed.
+    """
+
+    def __init__(self, note_id, preview, complete, load):
+        super().__init__(note_id, preview if complete else None)
+        self.preview = preview
+        self.complete = complete
+        self.load = load
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.load()
+            self.complete = True
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+
+    def is_loaded(self):
+        return self._content is not None
+
+    def get_preview(self):
+        if self.complete:
+            return self.content
+        return self.preview + ' …'
@@ -15,6 +15,9 @@ class Note:
     def __str__(self):
         return f'Note({self.note_id})'
 
+    def get_preview(self):
+        return self.content
+
     def to_dump(self):
         return self.content
 
@@ -0,0 +1,61 @@
+import re
+
+PHONE_KEYS = {'tel', 'telephone', 'phone', 'mobile', 'cell', 'cellphone',
+              'fax'}
+EMAIL_KEYS = {'email', 'e-mail', 'mail'}
+
+PHONE_PATTERN = re.compile(r'[^\d+]')
+
+
+def normalize_phone(value):
+    """
+    Drop spaces, dashes, slashes and parentheses, a leading 00 is written as
+    +, so that "0049 (170) 123-45" and "+4917012345" are equal.
+    """
+    value = PHONE_PATTERN.sub('', value)
+    if value.startswith('00'):
+        value = '+' + value[2:]
+    return value
+
+
+def normalize_value(key, value):
+    key = key.lower()
+    if key in PHONE_KEYS:
+        # values without digits are compared as written
+        return normalize_phone(value) or value.strip()
+    if key in EMAIL_KEYS:
+        return value.strip().lower()
+    return value.strip()
+
+
+class AttributeIndex:
+    """
+    Reverse index from attribute key and normalized value to the owners of
+    the attribute, e.g. the subjects of the contacts. Owners are counted, as
+    an owner can have several values with the same normalized form.
+    """
+
+    def __init__(self):
+        self.owners = {}  # (key, normalized value) -> {owner: count}
+
+    def add(self, key, value, owner):
+        owners = self.owners.setdefault((key, normalize_value(key, value)), {})
+        owners[owner] = owners.get(owner, 0) + 1
+
+    def remove(self, key, value, owner):
+        index_key = (key, normalize_value(key, value))
+        owners = self.owners.get(index_key)
+        if not owners or owner not in owners:
+            return
+
+        owners[owner] -= 1
+        if owners[owner] == 0:
+            del owners[owner]
+        if not owners:
+            del self.owners[index_key]
+
+    def get(self, key, value):
+        return list(self.owners.get((key, normalize_value(key, value)), ()))
+
+    def clear(self):
+        self.owners = {}
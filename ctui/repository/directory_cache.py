@@ -0,0 +1,124 @@
+import os
+import stat
+import time
+
+
+class FileInfo:
+    """
+    Metadata of a directory entry as read by os.scandir.
+    """
+
+    __slots__ = ('is_dir', 'size', 'mtime_ns')
+
+    def __init__(self, is_dir, size, mtime_ns):
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @classmethod
+    def from_stat(cls, st):
+        return cls(stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime_ns)
+
+
+class DirectoryListing:
+
+    __slots__ = ('mtime_ns', 'entries', 'racy')
+
+    def __init__(self, mtime_ns, entries, racy):
+        self.mtime_ns = mtime_ns
+        self.entries = entries  # name -> FileInfo
+        self.racy = racy
+
+
+class DirectoryCache:
+    """
+    Cache of directory listings with the metadata of their entries. A listing
+    stays valid as long as the mtime of its directory is unchanged, so that
+    a question about a directory costs one stat instead of a directory read.
+
+    Listings of directories modified less than racy_interval_ns before they
+    were read are not trusted, as further changes within the timestamp
+    granularity of the file system would not change the mtime.
+    """
+
+    racy_interval_ns = 1_000_000_000
+
+    def __init__(self):
+        self.listings = {}  # directory path -> DirectoryListing
+
+    def is_racy(self, mtime_ns):
+        return time.time_ns() - mtime_ns < self.racy_interval_ns
+
+    def scan(self, path, st):
+        entries = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    entries[entry.name] = FileInfo.from_stat(entry.stat())
+                except FileNotFoundError:
+                    pass  # deleted in the meantime
+        listing = DirectoryListing(st.st_mtime_ns, entries,
+                                   self.is_racy(st.st_mtime_ns))
+        self.listings[path] = listing
+        return listing
+
+    def list(self, path):
+        """
+        Return the entries of a directory as dict of name -> FileInfo, or None
+        if it doesn't exist.
+        """
+        path = os.path.normpath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate_tree(path)
+            return None
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+
+        listing = self.listings.get(path)
+        if listing is None or listing.racy or \
+                listing.mtime_ns != st.st_mtime_ns:
+            listing = self.scan(path, st)
+        return listing.entries
+
+    def get(self, path):
+        """
+        Return the FileInfo of a path from the listing of its directory.
+        """
+        dirname, name = os.path.split(os.path.normpath(path))
+        entries = self.list(dirname)
+        if entries is None:
+            return None
+        return entries.get(name)
+
+    def update(self, path):
+        """
+        Update the entry of a path after it was written, created or deleted
+        by the store, without reading its directory again.
+        """
+        dirname, name = os.path.split(os.path.normpath(path))
+        listing = self.listings.get(dirname)
+
+        if listing is None:
+            return
+
+        try:
+            listing.entries[name] = FileInfo.from_stat(os.stat(path))
+        except FileNotFoundError:
+            listing.entries.pop(name, None)
+            self.invalidate_tree(path)
+
+        try:
+            mtime_ns = os.stat(dirname).st_mtime_ns
+        except FileNotFoundError:
+            self.invalidate_tree(dirname)
+            return
+        listing.mtime_ns = mtime_ns
+
+    def invalidate_tree(self, path):
+        path = os.path.normpath(path)
+        prefix = path + os.sep
+        for cached_path in list(self.listings):
+            if cached_path == path or cached_path.startswith(prefix):
+                del self.listings[cached_path]
@@ -0,0 +1,141 @@
+import hashlib
+import math
+import os
+import pickle
+import re
+
+from ctui.service.writer import write_atomic
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class FullTextIndex:
+    """
+    Inverted index of the words of plain notes and gifts. Documents are
+    identified by a key and carry a stamp of the file they were read from,
+    so that only changed files have to be read again.
+
+    The index is kept in memory and written to a file in the cache
+    directory by save. It is only loaded if it was made for the same
+    textfile directory and index version.
+    """
+
+    VERSION = 1
+
+    def __init__(self, root, cache_dir=None):
+        self.root = os.path.abspath(root)
+        self.documents = {}  # key -> (stamp, token count, tokens)
+        self.postings = {}  # token -> {key: positions}
+        self.dirty = False
+        self.index_path = None
+
+        if cache_dir:
+            digest = hashlib.sha1(self.root.encode()).hexdigest()
+            self.index_path = os.path.join(cache_dir, f'{digest}.fulltext')
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                if pickle.load(f) != (self.VERSION, self.root):
+                    return
+                self.documents = pickle.load(f)
+                self.postings = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            self.documents = {}
+            self.postings = {}
+
+    def save(self):
+        if not self.dirty or not self.index_path:
+            return
+
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        write_atomic(self.index_path,
+                     pickle.dumps((self.VERSION, self.root)) +
+                     pickle.dumps(self.documents) +
+                     pickle.dumps(self.postings))
+        self.dirty = False
+
+    def get_stamp(self, key):
+        document = self.documents.get(key)
+        return document[0] if document else None
+
+    def keys(self):
+        return self.documents.keys()
+
+    def update(self, key, stamp, text):
+        self.remove(key)
+
+        positions = {}
+        tokens = tokenize(text)
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+
+        for token, token_positions in positions.items():
+            self.postings.setdefault(token, {})[key] = token_positions
+        self.documents[key] = (stamp, len(tokens), tuple(positions))
+        self.dirty = True
+
+    def remove(self, key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+
+        for token in document[2]:
+            postings = self.postings[token]
+            del postings[key]
+            if not postings:
+                del self.postings[token]
+        self.dirty = True
+
+    def rename(self, key, new_key, stamp):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+
+        for token in document[2]:
+            postings = self.postings[token]
+            postings[new_key] = postings.pop(key)
+        self.documents[new_key] = (stamp,) + document[1:]
+        self.dirty = True
+
+    def search(self, query):
+        """
+        Return the keys of the documents containing all words of the query
+        as list of (score, key), best first. Scores are tf-idf sums,
+        doubled if the words appear as a phrase.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        postings = {}
+        for token in tokens:
+            postings[token] = self.postings.get(token, {})
+        keys = set.intersection(*(set(p) for p in postings.values()))
+
+        hits = []
+        for key in keys:
+            score = 0
+            for token, token_postings in postings.items():
+                idf = math.log(len(self.documents) / len(token_postings)) + 1
+                score = score + len(token_postings[key]) * idf
+            score = score / math.sqrt(self.documents[key][1])
+
+            if len(tokens) > 1 and self.contains_phrase(key, tokens):
+                score = score * 2
+            hits.append((score, key))
+
+        return sorted(hits, key=lambda hit: (-hit[0], hit[1]))
+
+    def contains_phrase(self, key, tokens):
+        following = [set(self.postings[token][key]) for token in tokens[1:]]
+        for start in self.postings[tokens[0]][key]:
+            if all(start + i + 1 in positions
+                   for i, positions in enumerate(following)):
+                return True
+        return False
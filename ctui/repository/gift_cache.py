@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+
+class GiftCache:
+    """
+    LRU cache of parsed gifts by file path. An entry is only valid for the
+    mtime and size of the file it was parsed from. Gifts are copied on the
+    way in and out, as callers modify them.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # path -> (mtime_ns, size, gift)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, mtime_ns, size):
+        entry = self.entries.get(path)
+
+        if entry is None or entry[0] != mtime_ns or entry[1] != size:
+            self.misses = self.misses + 1
+            return None
+
+        self.hits = self.hits + 1
+        self.entries.move_to_end(path)
+        return entry[2].copy()
+
+    def put(self, path, mtime_ns, size, gift):
+        if self.max_entries <= 0:
+            return
+
+        self.entries[path] = (mtime_ns, size, gift.copy())
+        self.entries.move_to_end(path)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, path):
+        self.entries.pop(path, None)
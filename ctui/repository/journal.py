@@ -0,0 +1,67 @@
+import json
+import os
+
+
+class Journal:
+    """
+    Append-only log of mutations of the RDF contact graph. Each record is a
+    JSON list on its own line, e.g. ["+", "Max Mustermann", "<predicate>",
+    "<value>"]. Records address contacts by name as blank nodes are not stable
+    across parsing the N3 file.
+    """
+
+    CREATE = 'c'
+    RENAME = 'r'
+    DELETE = 'd'
+    ADD = '+'
+    REMOVE = '-'
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+
+    def append(self, records):
+        terminated = self.is_terminated()
+        with open(self.path, 'a') as f:
+            if not terminated:
+                # don't continue the incomplete record of an interrupted write
+                f.write('\n')
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_terminated(self):
+        """
+        Return whether the journal is empty or ends with a complete line.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) == b'\n'
+        except OSError:
+            return True  # missing or empty
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            return
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # incomplete record of an interrupted write
+                    continue
+                yield record
+
+    def exists(self):
+        return os.path.isfile(self.path) and os.path.getsize(self.path) > 0
+
+    def is_full(self):
+        return os.path.isfile(self.path) and \
+            os.path.getsize(self.path) >= self.max_size
+
+    def clear(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
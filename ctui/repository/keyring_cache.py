@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+
+# files and directories gpg changes when keys are imported or deleted
+KEYRING_FILES = ('pubring.kbx', 'pubring.gpg', 'secring.gpg',
+                 'private-keys-v1.d')
+
+
+def get_gnupg_home(gpg):
+    return gpg.gnupghome or os.environ.get('GNUPGHOME') or \
+        os.path.expanduser('~/.gnupg')
+
+
+class KeyringCache:
+    """
+    Cache of whether a key is in the keyring, as listing the keys runs gpg
+    twice and parses the whole keyring. The result is looked up again when
+    the mtime of a keyring file changed or after ttl seconds.
+    """
+
+    def __init__(self, lookup, get_home, ttl=300):
+        self.lookup = lookup
+        self.get_home = get_home
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.result = None
+        self.signature = None
+        self.expires = 0
+
+    def get_signature(self):
+        home = self.get_home()
+        signature = []
+        for filename in KEYRING_FILES:
+            try:
+                signature.append(
+                    os.stat(os.path.join(home, filename)).st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return home, tuple(signature)
+
+    def get(self):
+        with self.lock:
+            signature = self.get_signature()
+            if self.result is None or signature != self.signature or \
+                    time.monotonic() >= self.expires:
+                self.result = self.lookup()
+                self.signature = signature
+                self.expires = time.monotonic() + self.ttl
+            return self.result
+
+    def invalidate(self):
+        with self.lock:
+            self.result = None
+
+    def warm(self):
+        """
+        Look up the key in a background thread, so that the first get
+        doesn't wait for gpg.
+        """
+        thread = threading.Thread(target=self.get, daemon=True)
+        thread.start()
+        return thread
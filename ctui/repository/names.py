@@ -0,0 +1,94 @@
+"""
+Fast path to list contact names without parsing the RDF graph. Neither rdflib
+nor gnupg or urwid are imported here, so that `ctui --names` starts instantly.
+"""
+import json
+import os
+import re
+import sqlite3
+
+from ctui.repository.journal import Journal
+
+CONTACT_NAMESPACE = 'http://hiea.de/contact#'
+
+PREFIX_PATTERN = re.compile(r'@prefix\s+([\w-]*):\s*<([^>]*)>\s*\.')
+GIVEN_NAME_PATTERN = re.compile(
+    r'(?:([\w-]*:)givenName|<' + re.escape(CONTACT_NAMESPACE) +
+    r'givenName>)\s+"((?:[^"\\]|\\.)*)"')
+ESCAPE_PATTERN = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f'}
+
+
+def unescape(value):
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] in 'uU' and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return ESCAPES.get(escape, escape)
+
+    return ESCAPE_PATTERN.sub(replace, value)
+
+
+def scan_rdf_names(path):
+    """
+    Stream the N3 file line by line and collect the contact:givenName literals.
+    Pending records of the write journal are applied on top.
+    """
+    names = set()
+    prefixes = {}
+
+    with open(path, 'r') as f:
+        for line in f:
+            if '@prefix' in line:
+                for prefix, namespace in PREFIX_PATTERN.findall(line):
+                    prefixes[prefix] = namespace
+            if 'givenName' not in line:
+                continue
+            for prefix, value in GIVEN_NAME_PATTERN.findall(line):
+                if prefix and prefixes.get(prefix[:-1]) != CONTACT_NAMESPACE:
+                    continue
+                names.add(unescape(value))
+
+    for op, name, *args in Journal(f'{path}.journal', 0).read():
+        if op == Journal.CREATE:
+            names.add(name)
+        elif op == Journal.RENAME and name in names:
+            names.remove(name)
+            names.add(args[0])
+        elif op == Journal.DELETE:
+            names.discard(name)
+
+    return names
+
+
+def scan_manifest_names(path):
+    with open(os.path.join(path, 'manifest.json'), 'r') as f:
+        return set(json.load(f)['contacts'])
+
+
+def scan_sqlite_names(path):
+    connection = sqlite3.connect(path)
+    try:
+        return {name for name, in
+                connection.execute('SELECT name FROM contacts')}
+    finally:
+        connection.close()
+
+
+def scan_textfile_names(path):
+    with os.scandir(path) as entries:
+        return {entry.name.replace('_', ' ') for entry in entries
+                if not entry.name.endswith('.txt')}
+
+
+def scan_contact_names(config):
+    if config['rdf'].get('backend', fallback='n3') == 'sqlite':
+        names = scan_sqlite_names(
+            os.path.expanduser(config['path']['sqlite_file']))
+    elif config['rdf'].get('layout', fallback='single') == 'sharded':
+        names = scan_manifest_names(
+            os.path.expanduser(config['path']['rdf_dir']))
+    else:
+        names = scan_rdf_names(config['path']['rdf_file'])
+
+    return sorted(names | scan_textfile_names(config['path']['textfile_dir']))
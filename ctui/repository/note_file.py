@@ -0,0 +1,33 @@
+import mmap
+import os
+
+
+def make_preview(data, max_bytes, max_lines):
+    """
+    Make the preview of a note from its first max_bytes + 1 bytes.
+    """
+    complete = len(data) <= max_bytes
+    data = data[:max_bytes]
+
+    lines = data.split(b'\n', max_lines)
+    if len(lines) > max_lines and lines[max_lines].strip():
+        complete = False
+        data = b'\n'.join(lines[:max_lines])
+
+    # a multibyte character may be cut off at the end
+    preview = data.decode('utf-8', errors='strict' if complete else 'ignore')
+    return preview.strip(), complete
+
+
+def read_content(path, mmap_min_size):
+    """
+    Read a note file, through mmap if it has at least mmap_min_size bytes.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or size < mmap_min_size:
+            return f.read().decode('utf-8').strip()
+
+        # decode straight from the mapped pages without reading into a buffer
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return str(m, 'utf-8').strip()
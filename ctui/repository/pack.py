@@ -0,0 +1,204 @@
+import itertools
+import os
+from urllib.parse import quote, unquote
+
+from ctui.service.writer import write_atomic
+
+MAGIC = b'CTUIPACK 1\n'
+
+PUT = b'+'
+DELETE = b'-'
+
+# rewrite a pack when more than half of it is overwritten or deleted entries
+COMPACT_MIN_GARBAGE = 64 * 1024
+
+# offsets are only unique within one generation of a pack file
+generations = itertools.count()
+
+
+class PackFile:
+    """
+    Append-only archive of the notes and gifts of one contact. Each record
+    consists of a header line "<op> <type>/<name> <length>" followed by the
+    payload and a newline. A put record (+) stores the content of a file,
+    a delete record (-) removes it; later records win.
+
+    The offset index of the live entries is built from the record headers
+    when the pack is opened, without reading the payloads. A record cut off
+    by a crash is ignored and overwritten by the next append.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}  # (type, name) -> (offset, length)
+        self.end = len(MAGIC)  # end of the last complete record
+        self.garbage = 0  # bytes of overwritten and deleted records
+        self.signature = None  # (mtime_ns, size) of the indexed file
+        self.generation = None
+        self.inode = None
+        self.load()
+
+    @staticmethod
+    def make_header(op, textfile_type, name, length):
+        key = f'{textfile_type}/{quote(name, safe="")}'
+        return b'%s %s %d\n' % (op, key.encode(), length)
+
+    def load(self):
+        self.index = {}
+        self.end = len(MAGIC)
+        self.garbage = 0
+        self.signature = None
+        self.generation = next(generations)
+        self.inode = None
+
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+
+        with f:
+            st = os.fstat(f.fileno())
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'Not a pack file: "{self.path}"')
+
+            while True:
+                header = f.readline()
+                try:
+                    op, key, length = header.rstrip(b'\n').split(b' ')
+                    textfile_type, name = key.decode().split('/')
+                    length = int(length)
+                except ValueError:
+                    break  # end of file or incomplete record
+
+                offset = self.end + len(header)
+                if offset + length + 1 > st.st_size:
+                    break
+                f.seek(offset + length)
+                if f.read(1) != b'\n':
+                    break
+
+                self.apply(op, (textfile_type, unquote(name)), offset, length,
+                           len(header) + length + 1)
+                self.end = offset + length + 1
+
+            self.signature = (st.st_mtime_ns, st.st_size)
+            self.inode = st.st_ino
+
+    def apply(self, op, key, offset, length, record_size):
+        old = self.index.pop(key, None)
+        if old is not None:
+            self.garbage = self.garbage + old[1]
+        if op == PUT:
+            self.index[key] = (offset, length)
+        else:
+            self.garbage = self.garbage + record_size
+
+    def exists(self):
+        return self.signature is not None
+
+    def is_stale(self):
+        """
+        Whether the file was changed by someone else since it was indexed.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return self.signature is not None
+        return self.signature != (st.st_mtime_ns, st.st_size)
+
+    def names(self, textfile_type):
+        return sorted(name for t, name in self.index if t == textfile_type)
+
+    def contains(self, textfile_type, name):
+        return (textfile_type, name) in self.index
+
+    def get_location(self, textfile_type, name):
+        return self.index.get((textfile_type, name))
+
+    def read(self, textfile_type, name, limit=None):
+        """
+        Read the content of an entry, at most limit bytes if given.
+        """
+        location = self.index.get((textfile_type, name))
+        if location is None:
+            raise KeyError(f'{textfile_type}/{name}')
+
+        offset, length = location
+        if limit is not None:
+            length = min(length, limit)
+
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def append(self, records):
+        """
+        Append records of (op, type, name, content) and update the index.
+        """
+        mode = 'r+b' if self.exists() else 'wb'
+        with open(self.path, mode) as f:
+            if mode == 'wb':
+                f.write(MAGIC)
+                self.end = len(MAGIC)
+
+            # drop an incomplete record
+            f.seek(self.end)
+            f.truncate()
+
+            for op, textfile_type, name, content in records:
+                header = self.make_header(op, textfile_type, name,
+                                          len(content))
+                f.write(header)
+                f.write(content)
+                f.write(b'\n')
+
+                offset = self.end + len(header)
+                self.apply(op, (textfile_type, name), offset, len(content),
+                           len(header) + len(content) + 1)
+                self.end = offset + len(content) + 1
+
+            f.flush()
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+
+        self.signature = (st.st_mtime_ns, st.st_size)
+        self.inode = st.st_ino
+        self.compact_if_needed()
+
+    def put(self, textfile_type, name, content):
+        self.append([(PUT, textfile_type, name, content)])
+
+    def delete(self, textfile_type, name):
+        self.append([(DELETE, textfile_type, name, b'')])
+
+    def rename(self, textfile_type, name, new_name):
+        content = self.read(textfile_type, name)
+        self.append([(PUT, textfile_type, new_name, content),
+                     (DELETE, textfile_type, name, b'')])
+
+    def is_empty(self):
+        return not self.index
+
+    def compact_if_needed(self):
+        if self.garbage > COMPACT_MIN_GARBAGE and \
+                self.garbage > self.end - self.garbage:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the pack with only the live entries.
+        """
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        parts = [MAGIC]
+        for (textfile_type, name), (offset, length) in sorted(
+                self.index.items()):
+            content = data[offset:offset + length]
+            parts.append(self.make_header(PUT, textfile_type, name,
+                                          len(content)))
+            parts.append(content)
+            parts.append(b'\n')
+
+        write_atomic(self.path, b''.join(parts))
+        self.load()
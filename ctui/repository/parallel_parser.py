@@ -0,0 +1,117 @@
+"""
+Parse large N3 files in several processes. The document is split after the
+prefix header at the blank lines between subject blocks, as written by the
+rdflib serializer, and every chunk is parsed with the header prepended.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from rdflib import BNode, Graph
+
+HEADER_PREFIXES = ('@prefix', '@base', 'PREFIX', 'BASE')
+
+
+def split_header(lines):
+    """
+    Return the number of lines of the prefix header.
+    """
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped and not stripped.startswith(HEADER_PREFIXES + ('#',)):
+            return i
+    return len(lines)
+
+
+def is_splittable(text):
+    # named blank nodes can be shared between blocks, long strings can
+    # contain blank lines
+    return '_:' not in text and '"""' not in text and "'''" not in text
+
+
+def split_n3(text, chunk_count):
+    """
+    Split an N3 document into the prefix header and at most chunk_count
+    chunks of whole subject blocks. Returns None if the document can't be
+    split safely.
+    """
+    if not is_splittable(text):
+        return None
+
+    lines = text.splitlines(keepends=True)
+    header_end = split_header(lines)
+    header = ''.join(lines[:header_end])
+
+    blocks = []
+    block = []
+    for i in range(header_end, len(lines)):
+        line = lines[i]
+        stripped = line.strip()
+        if stripped.startswith(HEADER_PREFIXES):
+            return None  # prefixes declared in between
+        block.append(line)
+        # a statement ending at a blank line ends the subject block
+        next_line = lines[i + 1] if i + 1 < len(lines) else ''
+        if stripped.endswith('.') and not stripped.startswith('#') and \
+                not next_line.strip():
+            blocks.append(''.join(block))
+            block = []
+    if ''.join(block).strip():
+        blocks.append(''.join(block))
+
+    chunk_size = max(1, -(-len(blocks) // chunk_count))
+    chunks = [''.join(blocks[i:i + chunk_size])
+              for i in range(0, len(blocks), chunk_size)]
+    return header, chunks
+
+
+def parse_chunk(header, chunk):
+    g = Graph()
+    g.parse(data=header + chunk, format='n3')
+    return list(g)
+
+
+def rename_blank_nodes(triples):
+    """
+    Replace the blank nodes of a chunk by fresh ones. The parser names them
+    after their position in the text, so the same names occur in every
+    chunk for different subjects.
+    """
+    bnodes = {}
+
+    def rename(node):
+        if isinstance(node, BNode):
+            if node not in bnodes:
+                bnodes[node] = BNode()
+            return bnodes[node]
+        return node
+
+    for s, p, o in triples:
+        yield rename(s), p, rename(o)
+
+
+def parse_n3(path, workers=None, min_size=4 * 1024 * 1024):
+    """
+    Parse an N3 file into a graph, in parallel if it is at least min_size
+    bytes large and can be split.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if workers > 1 and os.path.getsize(path) >= min_size:
+        with open(path, 'r', encoding='utf-8') as f:
+            parts = split_n3(f.read(), workers)
+
+        if parts and len(parts[1]) > 1:
+            header, chunks = parts
+            g = Graph()
+            g.parse(data=header, format='n3')  # namespace bindings
+
+            with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+                for triples in executor.map(parse_chunk,
+                                            [header] * len(chunks), chunks):
+                    g.addN((s, p, o, g) for s, p, o in
+                           rename_blank_nodes(triples))
+            return g
+
+    g = Graph()
+    g.parse(path, format='n3')
+    return g
@@ -1,44 +1,378 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
 from rdflib import *
 from rdflib.resource import *
 
 from ctui.model.attribute import Attribute
 from ctui.model.contact import Contact
+from ctui.model.contact_record import ContactRecord
+from ctui.repository.attribute_index import AttributeIndex
+from ctui.repository.journal import Journal
+from ctui.repository.parallel_parser import parse_n3
+from ctui.repository.snapshot import GraphSnapshot
+from ctui.service.writer import DebouncedWriter, write_atomic
 
 GIVEN_NAME_REF = URIRef('http://hiea.de/contact#givenName')
 GIFTIDEA_REF = URIRef('http://hiea.de/contact#giftIdea')
 
+# keys stored alongside the attributes but not shown as such
+HIDDEN_KEYS = ('givenName', 'giftIdea')
+
 
 class RDFStore:
 
-    def __init__(self, path, namespace):
+    def __init__(self, path, namespace, journal=False,
+                 journal_max_size=1024 * 1024, cache_dir=None, write_delay=0,
+                 parse_workers=1, parse_min_size=4 * 1024 * 1024,
+                 uri_subjects=False):
         self.path = path
-        self.g = self.load_file(path)
         self.namespace = namespace
+        self.uri_subjects = uri_subjects  # contact URIs instead of blank nodes
+        self.parse_workers = parse_workers  # 0: one per CPU
+        self.parse_min_size = parse_min_size
+        self.journal = Journal(f'{path}.journal', journal_max_size)
+        self.snapshot = GraphSnapshot(path, cache_dir) if cache_dir else None
+        self.journal_enabled = journal
+        self.subjects = {}  # contact name -> subject
+        self.contacts = {}  # subject -> ContactRecord
+        self.attribute_index = AttributeIndex()  # attribute -> subjects
+        self.predicate_keys = {}  # predicate -> interned attribute key
+        self.transaction_depth = 0
+        self.pending_records = []  # records to persist on commit
+        self.undo_log = []  # (added, triple) to roll back on exception
+        self.lock = threading.RLock()  # guards the graph against the writer
+        self.file_key = None  # stat of the file as last read or written
+        self.g = self.load_file(path)
+        self.build_index()
+
+        if self.uri_subjects and self.migrate_subjects():
+            self.compact()
+
+        self.on_write_error = None  # called in the writer thread
+        self.writer = None
+        if write_delay > 0:
+            self.writer = DebouncedWriter(lambda: self.save_file(self.path),
+                                          write_delay, self.report_write_error)
+
+        # fold records of a previous session back if journaling was disabled
+        if not self.journal_enabled and self.journal.exists():
+            self.compact()
+
+    def get_file_key(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def get_watch_paths(self):
+        return [self.path]
 
     def load_file(self, path):
-        g = Graph()
-        g.parse(path, format="n3")
+        g = None
+        self.file_key = self.get_file_key()
+
+        if self.snapshot:
+            key = self.snapshot.get_key()
+            g = self.snapshot.load(key)
+
+        if g is None:
+            g = parse_n3(path, self.parse_workers, self.parse_min_size)
+            if self.snapshot:
+                self.snapshot.save_in_background(key, g)
+
+        for record in self.journal.read():
+            self.apply_record(g, record)
         return g
 
     def save_file(self, path):
-        self.g.serialize(format='n3', indent=True, destination=path)
+        with self.lock:
+            content = self.g.serialize(format='n3', indent=True,
+                                       encoding='utf-8')
+        write_atomic(path, content)
+        if path == self.path:
+            self.file_key = self.get_file_key()
+
+    def report_write_error(self, error):
+        if self.on_write_error:
+            self.on_write_error(error)
+
+    def reload(self):
+        """
+        Re-read the N3 file after it was changed by another program and patch
+        the graph only for the contacts that differ. Returns the names of the
+        added, removed and changed contacts. Pending own changes win, they
+        are written over the file.
+        """
+        if self.transaction_depth > 0 or \
+                (self.writer and self.writer.is_pending()):
+            return set()
+        if self.get_file_key() in (None, self.file_key):
+            return set()
+
+        g = self.load_file(self.path)
+        subjects = {str(o): s for s, o in g.subject_objects(GIVEN_NAME_REF)}
+        changed = set()
+
+        for name in self.subjects.keys() | subjects.keys():
+            s = self.subjects.get(name)
+            new_s = subjects.get(name)
+            old = set(self.g.predicate_objects(s)) if s is not None else set()
+            new = set(g.predicate_objects(new_s)) if new_s is not None \
+                else set()
+            if old == new:
+                continue
+
+            changed.add(name)
+            if s is None:
+                s = new_s
+            for p, o in old - new:
+                self._remove_triple((s, p, o))
+            for p, o in new - old:
+                self._add_triple((s, p, o))
+
+        return changed
+
+    def persist(self, *records):
+        """
+        Persist mutations either by appending them to the journal or by
+        rewriting the whole N3 file. Within a transaction, the records are
+        buffered until commit.
+        """
+        if self.transaction_depth > 0:
+            self.pending_records.extend(records)
+            return
+
+        if not self.journal_enabled:
+            if self.writer:
+                self.writer.notify()
+            else:
+                self.save_file(self.path)
+            return
+
+        self.journal.append(records)
+        if self.journal.is_full():
+            self.compact()
+
+    def compact(self):
+        """
+        Fold the journal back into the N3 file.
+        """
+        self.save_file(self.path)
+        self.journal.clear()
+
+    def flush(self):
+        if self.writer:
+            self.writer.flush()
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        if self.journal.exists():
+            self.compact()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Buffer mutations and persist them once when the outermost transaction
+        is left. On exception, the in-memory graph is rolled back to the state
+        at the beginning of the (possibly nested) transaction.
+        """
+        undo_mark = len(self.undo_log)
+        records_mark = len(self.pending_records)
+        self.transaction_depth += 1
+
+        try:
+            yield self
+        except BaseException:
+            self.rollback(undo_mark)
+            del self.pending_records[records_mark:]
+            raise
+        finally:
+            self.transaction_depth -= 1
+
+        if self.transaction_depth == 0:
+            self.commit()
+
+    def commit(self):
+        records = self.pending_records
+        self.pending_records = []
+        self.undo_log = []
+        if records:
+            self.persist(*records)
+
+    def rollback(self, undo_mark=0):
+        while len(self.undo_log) > undo_mark:
+            added, triple = self.undo_log.pop()
+            if added:
+                self._remove_triple(triple)
+            else:
+                self._add_triple(triple)
+
+    def build_index(self):
+        self.subjects = {}
+        self.attribute_index.clear()
+        names = {}
+        attributes = {}
+
+        for s, p, o in self.g:
+            if p == GIVEN_NAME_REF:
+                self.subjects[str(o)] = s
+                names[s] = str(o)
+            else:
+                key = self.get_predicate_key(p)
+                attributes.setdefault(s, []).append((key, str(o)))
+                self.attribute_index.add(key, str(o), s)
+
+        self.contacts = {
+            s: ContactRecord(names.get(s), tuple(sorted(attributes.get(s, ()))))
+            for s in names.keys() | attributes.keys()}
+
+    def add_triple(self, triple):
+        if self.transaction_depth > 0 and triple not in self.g:
+            self.undo_log.append((True, triple))
+        self._add_triple(triple)
+
+    def remove_triple(self, triple):
+        if self.transaction_depth > 0 and triple in self.g:
+            self.undo_log.append((False, triple))
+        self._remove_triple(triple)
+
+    def remove_subject(self, s):
+        for triple in list(self.g.triples((s, None, None))):
+            self.remove_triple(triple)
+
+    def _add_triple(self, triple):
+        s, p, o = triple
+        with self.lock:
+            self.g.add(triple)
+
+        contact = self.contacts.get(s) or ContactRecord(None)
+        if p == GIVEN_NAME_REF:
+            self.subjects[str(o)] = s
+            self.contacts[s] = contact.renamed(str(o))
+        else:
+            key = self.get_predicate_key(p)
+            if (key, str(o)) not in contact.attributes:
+                self.attribute_index.add(key, str(o), s)
+            self.contacts[s] = contact.with_attribute(key, str(o))
+
+    def _remove_triple(self, triple):
+        s, p, o = triple
+        with self.lock:
+            self.g.remove(triple)
+
+        contact = self.contacts.get(s)
+        if p == GIVEN_NAME_REF:
+            self.subjects.pop(str(o), None)
+            if contact:
+                contact = contact.renamed(None)
+        elif contact:
+            key = self.get_predicate_key(p)
+            if (key, str(o)) in contact.attributes:
+                self.attribute_index.remove(key, str(o), s)
+            contact = contact.without_attribute(key, str(o))
+
+        if contact and (contact.name or contact.attributes):
+            self.contacts[s] = contact
+        else:
+            self.contacts.pop(s, None)
+
+    def get_contact_uri(self, contact_id):
+        return URIRef(f'{self.namespace}contact/{quote(contact_id, safe="")}')
+
+    def new_subject(self, name):
+        if self.uri_subjects:
+            return self.get_contact_uri(Contact.name_to_id(name))
+        return BNode()
+
+    def get_subject(self, contact_id):
+        if not contact_id:
+            return None
+
+        if self.uri_subjects:
+            s = self.get_contact_uri(contact_id)
+            contact = self.contacts.get(s)
+            if contact and contact.name == Contact.id_to_name(contact_id):
+                return s
+
+        # blank nodes or contacts not migrated yet
+        return self.subjects.get(Contact.id_to_name(contact_id))
+
+    def replace_subject(self, s, new_s):
+        for p, o in list(self.g.predicate_objects(s)):
+            self.remove_triple((s, p, o))
+            self.add_triple((new_s, p, o))
+
+    def migrate_subjects(self, subjects=None):
+        """
+        Replace the blank nodes of the given (default: all) contacts by their
+        contact URI. Returns the number of migrated contacts.
+        """
+        if subjects is None:
+            subjects = list(self.subjects.items())
+
+        count = 0
+        for name, s in subjects:
+            new_s = self.get_contact_uri(Contact.name_to_id(name))
+            if s != new_s and new_s not in self.contacts:
+                self.replace_subject(s, new_s)
+                count = count + 1
+        return count
+
+    def get_contact_record(self, contact_id):
+        s = self.get_subject(contact_id)
+        if s is None:
+            return None
+        return self.contacts.get(s)
+
+    def apply_record(self, g, record):
+        op, name, *args = record
+        s = next(g.subjects(GIVEN_NAME_REF, Literal(name)), None)
+
+        if op == Journal.CREATE:
+            if s is None:
+                g.add((self.new_subject(name), GIVEN_NAME_REF, Literal(name)))
+        elif s is None:
+            return  # contact vanished from the N3 file in the meantime
+        elif op == Journal.RENAME:
+            if self.uri_subjects:
+                new_s = self.new_subject(args[0])
+                for p, o in list(g.predicate_objects(s)):
+                    g.remove((s, p, o))
+                    g.add((new_s, p, o))
+                s = new_s
+            g.set((s, GIVEN_NAME_REF, Literal(args[0])))
+        elif op == Journal.DELETE:
+            g.remove((s, None, None))
+        elif op == Journal.ADD:
+            g.add((s, URIRef(args[0]), Literal(args[1])))
+        elif op == Journal.REMOVE:
+            g.remove((s, URIRef(args[0]), Literal(args[1])))
 
     def get_contact_names(self):
-        contact_names = []
-        for o in self.g.objects(None, GIVEN_NAME_REF):
-            contact_names.append(str(o))
-        return sorted(contact_names)
+        return sorted(self.subjects.keys())
 
     def contains_contact(self, contact_id):
-        if contact_id:
-            name = Contact.id_to_name(contact_id)
-            return (None, GIVEN_NAME_REF, Literal(name)) in self.g
-
-        return False
+        return self.get_subject(contact_id) is not None
 
     def contains_attribute(self, attr):
-        attribute_ref = URIRef(self.namespace + attr.key)
-        return (None, attribute_ref, Literal(attr.value)) in self.g
+        return any((attr.key, attr.value) in self.contacts[s].attributes
+                   for s in self.attribute_index.get(attr.key, attr.value))
+
+    def find_contacts(self, attr):
+        """
+        Return the sorted names of the contacts owning the attribute, phone
+        numbers and email addresses are compared normalized.
+        """
+        names = (self.contacts[s].name
+                 for s in self.attribute_index.get(attr.key, attr.value))
+        return sorted(name for name in names if name)
 
     def get_contact(self, name):
         pass
@@ -49,8 +383,9 @@ class RDFStore:
         name = Contact.id_to_name(contact_id)
 
         try:
-            self.g.add((BNode(), GIVEN_NAME_REF, Literal(name)))
-            self.save_file(self.path)
+            self.add_triple((self.new_subject(name), GIVEN_NAME_REF,
+                             Literal(name)))
+            self.persist((Journal.CREATE, name))
             return True
         except Exception:
             raise Exception  # TODO
@@ -67,10 +402,15 @@ class RDFStore:
         assert not self.contains_contact(Contact.name_to_id(new_name))
 
         try:
-            s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-            person = Resource(self.g, s)
-            person.set(GIVEN_NAME_REF, Literal(new_name))
-            self.save_file(self.path)
+            with self.transaction():
+                s = self.get_subject(contact_id)
+                if self.uri_subjects:
+                    new_s = self.new_subject(new_name)
+                    self.replace_subject(s, new_s)
+                    s = new_s
+                self.remove_triple((s, GIVEN_NAME_REF, Literal(name)))
+                self.add_triple((s, GIVEN_NAME_REF, Literal(new_name)))
+                self.persist((Journal.RENAME, name, new_name))
             return True
         except Exception:
             raise Exception  # TODO
@@ -80,9 +420,9 @@ class RDFStore:
 
         try:
             name = Contact.id_to_name(contact_id)
-            s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-            self.g.remove((s, None, None))
-            self.save_file(self.path)
+            with self.transaction():
+                self.remove_subject(self.get_subject(contact_id))
+                self.persist((Journal.DELETE, name))
             return True
         except Exception:
             raise Exception  # TODO
@@ -91,61 +431,41 @@ class RDFStore:
         pass
 
     def has_attributes(self, contact_id):
-        if contact_id:
-            name = Contact.id_to_name(contact_id)
-
-            try:
-                s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-            except StopIteration:
-                return False
-            triples = [po for po in self.g.predicate_objects(s)]
-            return len(triples) > 1
-
-        return False
+        contact = self.get_contact_record(contact_id)
+        if contact is None:
+            return False
+        return len(contact.attributes) > 0
 
     def get_attributes(self, contact_id: str) -> list[Attribute]:
-        attributes = []
-
-        if contact_id:
-            name = Contact.id_to_name(contact_id)
-            try:
-                s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-            except StopIteration:
-                return attributes
+        contact = self.get_contact_record(contact_id)
+        if contact is None:
+            return []
 
-            for p, o in self.g.predicate_objects(s):
-                predicate = self.get_predicate_name(p)
-                if predicate == 'givenName': continue
-                if predicate == 'giftIdea': continue
-                attribute = Attribute(predicate, str(o))
-                attributes.append(attribute)
-
-        return sorted(attributes)
+        # records are sorted by (key, value) already
+        return [Attribute(key, value) for key, value in contact.attributes
+                if key not in HIDDEN_KEYS]
 
     def has_attribute(self, contact_id, attribute):
-        name = Contact.id_to_name(contact_id)
+        contact = self.get_contact_record(contact_id)
 
-        if contact_id and attribute:
-            attribute_ref = URIRef(self.namespace + attribute.key)
-            try:
-                s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-                return (s, attribute_ref, Literal(attribute.value)) in self.g
-            except StopIteration:
-                return False
+        if contact is not None and attribute:
+            return (attribute.key, attribute.value) in contact.attributes
 
         return False
 
     def add_attribute(self, contact_id, attribute):
         name = Contact.id_to_name(contact_id)
 
-        if not self.contains_contact(contact_id):
-            self.create_contact_node(contact_id)
-
         try:
-            attribute_ref = URIRef(self.namespace + attribute.key)
-            s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-            self.g.add((s, attribute_ref, Literal(attribute.value)))
-            self.save_file(self.path)
+            with self.transaction():
+                if not self.contains_contact(contact_id):
+                    self.create_contact_node(contact_id)
+
+                attribute_ref = URIRef(self.namespace + attribute.key)
+                s = self.get_subject(contact_id)
+                self.add_triple((s, attribute_ref, Literal(attribute.value)))
+                self.persist((Journal.ADD, name, str(attribute_ref),
+                              attribute.value))
             return "Attribute {}={} added.".format(attribute.key,
                                                    attribute.value)
         except Exception as e:
@@ -161,13 +481,13 @@ class RDFStore:
         if old_attr.key == new_attr.key and old_attr.value == new_attr.value:
             return "Warning: Attribute unchanged."
 
-        old_attr_ref = URIRef(self.namespace + old_attr.key)
-        s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-        self.g.remove((s, old_attr_ref, Literal(old_attr.value)))
-        self.save_file(self.path)
-        new_attr_ref = URIRef(self.namespace + new_attr.key)
-        self.g.add((s, new_attr_ref, Literal(new_attr.value)))
-        self.save_file(self.path)
+        with self.transaction():
+            s = self.get_subject(contact_id)
+            self.remove_attribute_triples(name, s, old_attr)
+            new_attr_ref = URIRef(self.namespace + new_attr.key)
+            self.add_triple((s, new_attr_ref, Literal(new_attr.value)))
+            self.persist(
+                (Journal.ADD, name, str(new_attr_ref), new_attr.value))
         return f'{new_attr.key} changed to {new_attr.value}'
 
     def delete_attribute(self, contact_id, attribute):
@@ -177,11 +497,32 @@ class RDFStore:
             raise ValueError(
                 f'{name} doesn\'t own attribute {attribute.key}={attribute.value}')
 
-        attribute_ref = URIRef(self.namespace + attribute.key)
-        s = next(self.g.subjects(GIVEN_NAME_REF, Literal(name)))
-        self.g.remove((s, attribute_ref, Literal(attribute.value)))
-        self.save_file(self.path)
+        with self.transaction():
+            s = self.get_subject(contact_id)
+            self.remove_attribute_triples(name, s, attribute)
         return "{}={} deleted".format(attribute.key, attribute.value)
 
+    def get_attribute_predicates(self, s, attribute):
+        """
+        Return the predicates of the triples of an attribute. The records only
+        hold the key, the file may use another namespace than the configured
+        one.
+        """
+        return [p for p in self.g.predicates(s, Literal(attribute.value))
+                if p != GIVEN_NAME_REF and
+                self.get_predicate_key(p) == attribute.key]
+
+    def remove_attribute_triples(self, name, s, attribute):
+        for p in self.get_attribute_predicates(s, attribute):
+            self.remove_triple((s, p, Literal(attribute.value)))
+            self.persist((Journal.REMOVE, name, str(p), attribute.value))
+
     def get_predicate_name(self, p):
         return p.split('#', 1)[1]
+
+    def get_predicate_key(self, p):
+        key = self.predicate_keys.get(p)
+        if key is None:
+            key = sys.intern(str(p).split('#', 1)[-1])
+            self.predicate_keys[p] = key
+        return key
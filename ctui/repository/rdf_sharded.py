@@ -0,0 +1,246 @@
+import json
+import os
+import zlib
+
+from rdflib import Graph
+
+from ctui.model.contact import Contact
+from ctui.repository.rdf import RDFStore, GIVEN_NAME_REF
+from ctui.service.writer import write_atomic
+
+DEFAULT_BUCKETS = 64
+
+
+class ShardedRDFStore(RDFStore):
+    """
+    RDFStore keeping the contacts in a directory of N-Triples shards, one per
+    hash bucket of the contact name, and a manifest listing all contact names.
+    Shards are parsed on first access and only changed shards are written.
+    """
+
+    MANIFEST = 'manifest.json'
+    VERSION = 1
+
+    def __init__(self, path, namespace, write_delay=0,
+                 buckets=DEFAULT_BUCKETS, uri_subjects=False):
+        self.buckets = buckets
+        self.namespaces = {}  # prefix -> namespace, used when joining shards
+        self.manifest = {}  # contact name -> bucket
+        self.loaded = set()  # buckets parsed into the graph
+        self.dirty = set()  # buckets to write
+        self.subject_buckets = {}  # subject -> bucket
+        self.bucket_subjects = {}  # bucket -> {subject}
+        super().__init__(path, namespace, write_delay=write_delay,
+                         uri_subjects=uri_subjects)
+
+    def get_manifest_path(self, path=None):
+        return os.path.join(path or self.path, self.MANIFEST)
+
+    def get_shard_path(self, bucket, path=None):
+        return os.path.join(path or self.path, f'shard-{bucket:03d}.nt')
+
+    def get_bucket(self, name):
+        return zlib.crc32(name.encode('utf-8')) % self.buckets
+
+    def get_file_key(self):
+        try:
+            stat = os.stat(self.get_manifest_path())
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def get_watch_paths(self):
+        return [self.get_manifest_path()]
+
+    def load_file(self, path):
+        manifest_path = self.get_manifest_path(path)
+        if path == self.path:
+            self.file_key = self.get_file_key()
+
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, 'r') as f:
+                data = json.load(f)
+            self.buckets = data['buckets']
+            self.namespaces = data['namespaces']
+            self.manifest = data['contacts']
+
+        g = Graph()
+        for prefix, namespace in self.namespaces.items():
+            g.bind(prefix, namespace, replace=True)
+        return g
+
+    def load_shard(self, bucket):
+        if bucket in self.loaded:
+            return
+        self.loaded.add(bucket)
+
+        shard_path = self.get_shard_path(bucket)
+        if not os.path.isfile(shard_path):
+            return
+
+        shard = Graph()
+        shard.parse(shard_path, format='nt')
+        for triple in shard:
+            self.move_subject(triple[0], bucket)
+            super()._add_triple(triple)
+
+        if self.uri_subjects:
+            self.migrate_subjects([
+                (self.contacts[s].name, s)
+                for s in list(self.bucket_subjects.get(bucket, ()))
+                if s in self.contacts and self.contacts[s].name])
+
+    def load_all_shards(self):
+        for bucket in range(self.buckets):
+            self.load_shard(bucket)
+
+    def move_subject(self, s, bucket):
+        old_bucket = self.subject_buckets.get(s)
+        if old_bucket == bucket:
+            return
+        if old_bucket is not None:
+            self.bucket_subjects[old_bucket].discard(s)
+            self.mark_dirty(old_bucket)
+        self.subject_buckets[s] = bucket
+        self.bucket_subjects.setdefault(bucket, set()).add(s)
+
+    def mark_dirty(self, bucket):
+        with self.lock:
+            self.dirty.add(bucket)
+
+    def _add_triple(self, triple):
+        s, p, o = triple
+
+        if p == GIVEN_NAME_REF:
+            bucket = self.get_bucket(str(o))
+            self.manifest[str(o)] = bucket
+        else:
+            # subjects without name are put into the bucket of their label
+            bucket = self.subject_buckets.get(s, self.get_bucket(str(s)))
+
+        # don't overwrite contacts of the bucket that are not loaded yet
+        self.load_shard(bucket)
+        self.move_subject(s, bucket)
+        super()._add_triple(triple)
+        self.mark_dirty(bucket)
+
+    def _remove_triple(self, triple):
+        s, p, o = triple
+        super()._remove_triple(triple)
+
+        if p == GIVEN_NAME_REF:
+            self.manifest.pop(str(o), None)
+        if s in self.subject_buckets:
+            self.mark_dirty(self.subject_buckets[s])
+
+    def get_subject(self, contact_id):
+        if contact_id:
+            name = Contact.id_to_name(contact_id)
+            if name in self.manifest:
+                self.load_shard(self.manifest[name])
+        return super().get_subject(contact_id)
+
+    def get_contact_names(self):
+        return sorted(self.manifest.keys())
+
+    def contains_attribute(self, attr):
+        self.load_all_shards()
+        return super().contains_attribute(attr)
+
+    def find_contacts(self, attr):
+        self.load_all_shards()
+        return super().find_contacts(attr)
+
+    def dump_manifest(self):
+        data = {
+            'version': self.VERSION,
+            'buckets': self.buckets,
+            'namespaces': self.namespaces,
+            'contacts': self.manifest,
+        }
+        return json.dumps(data, ensure_ascii=False, indent=1,
+                          sort_keys=True).encode('utf-8')
+
+    def save_file(self, path):
+        """
+        Write the changed shards and the manifest.
+        """
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            shards = {}
+            for bucket in dirty:
+                shard = Graph()
+                for s in self.bucket_subjects.get(bucket, ()):
+                    for triple in self.g.triples((s, None, None)):
+                        shard.add(triple)
+                shards[bucket] = shard.serialize(format='nt', encoding='utf-8')
+            manifest = self.dump_manifest()
+
+        try:
+            os.makedirs(path, exist_ok=True)
+            for bucket, content in shards.items():
+                write_atomic(self.get_shard_path(bucket, path), content)
+            write_atomic(self.get_manifest_path(path), manifest)
+        except BaseException:
+            with self.lock:
+                self.dirty |= dirty
+            raise
+
+        if path == self.path:
+            self.file_key = self.get_file_key()
+
+    def reload(self):
+        """
+        Re-read the manifest after another program changed the shards. The
+        loaded shards are dropped and parsed again on next access, their
+        contacts are reported as changed.
+        """
+        if self.transaction_depth > 0 or self.dirty or \
+                (self.writer and self.writer.is_pending()):
+            return set()
+        if self.get_file_key() in (None, self.file_key):
+            return set()
+
+        old_manifest = self.manifest
+        changed = {name for name, bucket in old_manifest.items()
+                   if bucket in self.loaded}
+
+        for bucket in self.loaded:
+            for s in self.bucket_subjects.get(bucket, ()):
+                for triple in list(self.g.triples((s, None, None))):
+                    RDFStore._remove_triple(self, triple)
+        self.loaded = set()
+        self.subject_buckets = {}
+        self.bucket_subjects = {}
+
+        self.load_file(self.path)
+        changed |= old_manifest.keys() ^ self.manifest.keys()
+        return changed
+
+    @classmethod
+    def from_rdfstore(cls, rdfstore, path, buckets=DEFAULT_BUCKETS):
+        """
+        Write the contacts of a single file RDFStore as sharded layout.
+        """
+        if os.path.exists(os.path.join(path, cls.MANIFEST)):
+            raise ValueError(f'"{path}" already contains sharded contacts')
+
+        store = cls(path, rdfstore.namespace, buckets=buckets)
+        store.namespaces = {prefix: str(namespace) for prefix, namespace
+                            in rdfstore.g.namespaces()}
+
+        # contact names first, they determine the bucket of the subject
+        for triple in sorted(rdfstore.g, key=lambda t: t[1] != GIVEN_NAME_REF):
+            store._add_triple(triple)
+        store.save_file(path)
+        return store
+
+    def to_file(self, path):
+        """
+        Write all shards into a single N3 file.
+        """
+        self.load_all_shards()
+        with self.lock:
+            content = self.g.serialize(format='n3', indent=True,
+                                       encoding='utf-8')
+        write_atomic(path, content)
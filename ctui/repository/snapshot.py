@@ -0,0 +1,126 @@
+import hashlib
+import os
+import pickle
+import threading
+
+from rdflib import BNode, Graph, Literal, URIRef
+
+
+def get_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME',
+                                os.path.expanduser('~/.cache'))
+    return os.path.join(cache_home, 'ctui')
+
+
+class GraphSnapshot:
+    """
+    Binary cache of the triples of a parsed N3 file. A snapshot is only valid
+    as long as mtime, size and hash of the N3 file are unchanged. Snapshots
+    start with the path of their N3 file, so that those of deleted files can
+    be pruned.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path, cache_dir):
+        self.path = os.path.abspath(path)
+        self.cache_dir = cache_dir
+        digest = hashlib.sha1(self.path.encode()).hexdigest()
+        self.snapshot_path = os.path.join(cache_dir, f'{digest}.snapshot')
+        self.thread = None
+
+    def get_key(self):
+        stat = os.stat(self.path)
+        sha = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        return self.VERSION, stat.st_mtime_ns, stat.st_size, sha.hexdigest()
+
+    def load(self, key):
+        """
+        Return the cached graph or None if there is no valid snapshot.
+        """
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                if pickle.load(f) != self.path or pickle.load(f) != key:
+                    return None
+                namespaces = pickle.load(f)
+                triples = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+
+        g = Graph()
+        for prefix, namespace in namespaces:
+            g.bind(prefix, namespace, replace=True)
+        g.addN((self.decode(s), self.decode(p), self.decode(o), g)
+               for s, p, o in triples)
+        return g
+
+    def save(self, key, namespaces, triples):
+        triples = [(self.encode(s), self.encode(p), self.encode(o))
+                   for s, p, o in triples]
+        temp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            pickle.dump(self.path, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(namespaces, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(triples, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.snapshot_path)
+
+    def save_in_background(self, key, g):
+        # copy, the graph may change while saving
+        namespaces = [(p, str(ns)) for p, ns in g.namespaces()]
+        triples = list(g)
+        self.thread = threading.Thread(target=self._save_quietly,
+                                       args=(key, namespaces, triples),
+                                       daemon=True)
+        self.thread.start()
+
+    def _save_quietly(self, key, namespaces, triples):
+        try:
+            self.save(key, namespaces, triples)
+            self.prune()
+        except OSError:
+            pass  # the snapshot is only a cache
+
+    def prune(self):
+        """
+        Remove the snapshots of N3 files that no longer exist and those of
+        older versions.
+        """
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.snapshot'):
+                continue
+            snapshot_path = os.path.join(self.cache_dir, filename)
+            try:
+                with open(snapshot_path, 'rb') as f:
+                    path = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+                path = None
+            if not isinstance(path, str) or not os.path.exists(path):
+                try:
+                    os.remove(snapshot_path)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def encode(term):
+        if isinstance(term, Literal):
+            datatype = str(term.datatype) if term.datatype else None
+            return 'l', str(term), datatype, term.language
+        if isinstance(term, BNode):
+            return 'b', str(term)
+        return 'u', str(term)
+
+    @staticmethod
+    def decode(term):
+        if term[0] == 'l':
+            _, value, datatype, language = term
+            datatype = URIRef(datatype) if datatype else None
+            return Literal(value, lang=language, datatype=datatype)
+        if term[0] == 'b':
+            return BNode(term[1])
+        return URIRef(term[1])
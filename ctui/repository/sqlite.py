@@ -0,0 +1,292 @@
+import sqlite3
+from contextlib import contextmanager
+
+from ctui.model.attribute import Attribute
+from ctui.model.contact import Contact
+from ctui.repository.attribute_index import normalize_value
+from ctui.repository.rdf import HIDDEN_KEYS
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS attributes (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    normalized TEXT NOT NULL DEFAULT '',
+    UNIQUE (contact_id, key, value)
+);
+CREATE INDEX IF NOT EXISTS attributes_key_value ON attributes(key, value);
+'''
+
+# stored in user_version, increased when normalize_value changes
+NORMALIZATION_VERSION = 1
+
+NORMALIZED_INDEX = '''
+CREATE INDEX IF NOT EXISTS attributes_key_normalized
+    ON attributes(key, normalized);
+'''
+
+
+class SQLiteStore:
+    """
+    Store for contact attributes in an SQLite database. Alternative to the
+    RDFStore with the same interface, where every write is a row-level
+    transaction instead of a rewrite of the whole file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.transaction_depth = 0
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+        self.migrate()
+        self.data_version = self.get_data_version()
+
+    def flush(self):
+        pass  # every transaction is committed immediately
+
+    def get_watch_paths(self):
+        return [self.path, f'{self.path}-wal']
+
+    def migrate(self):
+        """
+        Add the normalized attribute values to databases created before and
+        normalize them again if the normalization changed.
+        """
+        columns = [row[1] for row in
+                   self.connection.execute('PRAGMA table_info(attributes)')]
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+
+        if 'normalized' not in columns or version < NORMALIZATION_VERSION:
+            with self.transaction():
+                if 'normalized' not in columns:
+                    self.connection.execute(
+                        "ALTER TABLE attributes "
+                        "ADD COLUMN normalized TEXT NOT NULL DEFAULT ''")
+                rows = self.connection.execute(
+                    'SELECT rowid, key, value FROM attributes').fetchall()
+                self.connection.executemany(
+                    'UPDATE attributes SET normalized = ? WHERE rowid = ?',
+                    [(normalize_value(key, value), rowid)
+                     for rowid, key, value in rows])
+                self.connection.execute(
+                    f'PRAGMA user_version = {NORMALIZATION_VERSION}')
+
+        self.connection.executescript(NORMALIZED_INDEX)
+
+    def get_data_version(self):
+        # only changes when other connections commit to the database
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def reload(self):
+        """
+        Every query reads the current state of the database, so nothing has to
+        be re-read. Returns all contact names if another program changed the
+        database, as the changed rows are unknown.
+        """
+        data_version = self.get_data_version()
+        if data_version == self.data_version:
+            return set()
+        self.data_version = data_version
+        return set(self.get_contact_names())
+
+    def close(self):
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed writes in one (nested) SQLite transaction that is
+        rolled back on exception.
+        """
+        savepoint = f'ctui_{self.transaction_depth}'
+        self.connection.execute(f'SAVEPOINT {savepoint}')
+        self.transaction_depth += 1
+
+        try:
+            yield self
+        except BaseException:
+            self.connection.execute(f'ROLLBACK TO {savepoint}')
+            raise
+        finally:
+            self.transaction_depth -= 1
+            self.connection.execute(f'RELEASE {savepoint}')
+
+    def get_contact_row_id(self, contact_id):
+        if not contact_id:
+            return None
+        name = Contact.id_to_name(contact_id)
+        row = self.connection.execute(
+            'SELECT id FROM contacts WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def get_contact_names(self):
+        rows = self.connection.execute('SELECT name FROM contacts ORDER BY name')
+        return [name for name, in rows]
+
+    def contains_contact(self, contact_id):
+        return self.get_contact_row_id(contact_id) is not None
+
+    def contains_attribute(self, attr):
+        row = self.connection.execute(
+            'SELECT 1 FROM attributes WHERE key = ? AND value = ? LIMIT 1',
+            (attr.key, attr.value)).fetchone()
+        return row is not None
+
+    def find_contacts(self, attr):
+        """
+        Return the sorted names of the contacts owning the attribute, phone
+        numbers and email addresses are compared normalized.
+        """
+        rows = self.connection.execute(
+            'SELECT DISTINCT contacts.name FROM attributes '
+            'JOIN contacts ON contacts.id = attributes.contact_id '
+            'WHERE attributes.key = ? AND attributes.normalized = ? '
+            'ORDER BY contacts.name',
+            (attr.key, normalize_value(attr.key, attr.value)))
+        return [name for name, in rows]
+
+    def create_contact_node(self, contact_id):
+        assert not self.contains_contact(contact_id)
+
+        name = Contact.id_to_name(contact_id)
+
+        with self.transaction():
+            self.connection.execute('INSERT INTO contacts (name) VALUES (?)',
+                                    (name,))
+        return True
+
+    def add_contact(self, contact):
+        self.create_contact_node(contact.get_id())
+
+    def rename_contact(self, contact_id, new_name):
+        assert self.contains_contact(contact_id)
+
+        name = Contact.id_to_name(contact_id)
+
+        assert name != new_name
+        assert not self.contains_contact(Contact.name_to_id(new_name))
+
+        with self.transaction():
+            self.connection.execute(
+                'UPDATE contacts SET name = ? WHERE name = ?', (new_name, name))
+        return True
+
+    def delete_contact(self, contact_id):
+        assert self.contains_contact(contact_id)
+
+        name = Contact.id_to_name(contact_id)
+
+        with self.transaction():
+            self.connection.execute('DELETE FROM contacts WHERE name = ?',
+                                    (name,))
+        return True
+
+    def has_attributes(self, contact_id):
+        row_id = self.get_contact_row_id(contact_id)
+        if row_id is None:
+            return False
+        row = self.connection.execute(
+            'SELECT 1 FROM attributes WHERE contact_id = ? LIMIT 1',
+            (row_id,)).fetchone()
+        return row is not None
+
+    def get_attributes(self, contact_id: str) -> list[Attribute]:
+        row_id = self.get_contact_row_id(contact_id)
+        if row_id is None:
+            return []
+        rows = self.connection.execute(
+            'SELECT key, value FROM attributes WHERE contact_id = ? '
+            f'AND key NOT IN ({", ".join("?" * len(HIDDEN_KEYS))}) '
+            'ORDER BY key, value', (row_id, *HIDDEN_KEYS))
+        return [Attribute(key, value) for key, value in rows]
+
+    def has_attribute(self, contact_id, attribute):
+        row_id = self.get_contact_row_id(contact_id)
+
+        if row_id is not None and attribute:
+            row = self.connection.execute(
+                'SELECT 1 FROM attributes '
+                'WHERE contact_id = ? AND key = ? AND value = ?',
+                (row_id, attribute.key, attribute.value)).fetchone()
+            return row is not None
+
+        return False
+
+    def add_attribute(self, contact_id, attribute):
+        with self.transaction():
+            if not self.contains_contact(contact_id):
+                self.create_contact_node(contact_id)
+
+            self.connection.execute(
+                'INSERT OR IGNORE INTO attributes '
+                '(contact_id, key, value, normalized) VALUES (?, ?, ?, ?)',
+                (self.get_contact_row_id(contact_id), attribute.key,
+                 attribute.value,
+                 normalize_value(attribute.key, attribute.value)))
+        return "Attribute {}={} added.".format(attribute.key, attribute.value)
+
+    def edit_attribute(self, contact_id, old_attr, new_attr):
+        if not self.has_attribute(contact_id, old_attr):
+            raise ValueError(
+                f'"{contact_id}" doesn\'t own attribute {old_attr.key}={old_attr.value}')
+
+        if old_attr.key == new_attr.key and old_attr.value == new_attr.value:
+            return "Warning: Attribute unchanged."
+
+        row_id = self.get_contact_row_id(contact_id)
+
+        with self.transaction():
+            self.connection.execute(
+                'DELETE FROM attributes '
+                'WHERE contact_id = ? AND key = ? AND value = ?',
+                (row_id, old_attr.key, old_attr.value))
+            self.connection.execute(
+                'INSERT OR IGNORE INTO attributes '
+                '(contact_id, key, value, normalized) VALUES (?, ?, ?, ?)',
+                (row_id, new_attr.key, new_attr.value,
+                 normalize_value(new_attr.key, new_attr.value)))
+        return f'{new_attr.key} changed to {new_attr.value}'
+
+    def delete_attribute(self, contact_id, attribute):
+        name = Contact.id_to_name(contact_id)
+
+        if not self.has_attribute(contact_id, attribute):
+            raise ValueError(
+                f'{name} doesn\'t own attribute {attribute.key}={attribute.value}')
+
+        with self.transaction():
+            self.connection.execute(
+                'DELETE FROM attributes '
+                'WHERE contact_id = ? AND key = ? AND value = ?',
+                (self.get_contact_row_id(contact_id), attribute.key,
+                 attribute.value))
+        return "{}={} deleted".format(attribute.key, attribute.value)
+
+    def import_rdfstore(self, rdfstore):
+        """
+        Copy all contacts and their attributes of an RDFStore. Contacts that
+        already exist are merged.
+        """
+        count = 0
+
+        with self.transaction():
+            for name, s in rdfstore.subjects.items():
+                self.connection.execute(
+                    'INSERT OR IGNORE INTO contacts (name) VALUES (?)', (name,))
+                row_id, = self.connection.execute(
+                    'SELECT id FROM contacts WHERE name = ?', (name,)).fetchone()
+                rows = [(row_id, key, value, normalize_value(key, value))
+                        for key, value in rdfstore.contacts[s].attributes]
+                self.connection.executemany(
+                    'INSERT OR IGNORE INTO attributes '
+                    '(contact_id, key, value, normalized) VALUES (?, ?, ?, ?)',
+                    rows)
+                count = count + 1
+
+        return count
@@ -1,5 +1,6 @@
 import os
 import shutil
+from functools import partial
 
 import gnupg
 
@@ -7,7 +8,28 @@ from ctui.model.contact import Contact
 from ctui.model.detail import Detail
 from ctui.model.encrypted_note import EncryptedNote
 from ctui.model.gift import Gift
+from ctui.model.lazy_note import LazyNote
 from ctui.model.note import Note
+from ctui.repository.directory_cache import DirectoryCache
+from ctui.repository.fulltext import FullTextIndex
+from ctui.repository.gift_cache import GiftCache
+from ctui.repository.keyring_cache import KeyringCache, get_gnupg_home
+from ctui.repository.note_file import make_preview, read_content
+from ctui.repository.pack import DELETE, PUT, PackFile
+
+
+class GpgJob:
+    """
+    Store operation split into the gpg call, which may run in a worker
+    thread, and applying its result to the store, which must not.
+    """
+
+    def __init__(self, run, apply):
+        self.run = run
+        self.apply = apply
+
+    def execute(self):
+        return self.apply(self.run())
 
 
 class TextFileStore:
@@ -17,11 +39,26 @@ class TextFileStore:
 
     NOTES_DIR = 'notes'
     GIFTS_DIR = 'gifts'
+    PACK_FILE = 'textfiles.pack'
 
-    def __init__(self, path, gpg_keyid):
+    def __init__(self, path, gpg_keyid, gift_cache_size=1024,
+                 note_preview_bytes=4096, note_preview_lines=20,
+                 note_mmap_size=1024 * 1024,
+                 keyring_ttl=300, fulltext_cache_dir=None):
         self.path = path
         self.gpg = gnupg.GPG()
         self.gpg_keyid = gpg_keyid
+        self.cache = DirectoryCache()
+        self.gift_cache = GiftCache(gift_cache_size)
+        self.note_preview_bytes = note_preview_bytes
+        self.note_preview_lines = note_preview_lines
+        self.note_mmap_size = note_mmap_size
+        self.packs = {}  # pack file path -> PackFile
+        self.keyring_cache = KeyringCache(
+            self.find_key_in_keyring, lambda: get_gnupg_home(self.gpg),
+            keyring_ttl)
+        self.fulltext_index = FullTextIndex(path, fulltext_cache_dir)
+        self.on_contact_dir_created = None
 
     def get_textfile_path(self, contact_id):
         return os.path.join(self.path, contact_id)
@@ -40,12 +77,29 @@ class TextFileStore:
         filename = Gift.id_to_filename(gift_id)
         return os.path.join(dirname, filename)
 
+    def list_dir(self, path):
+        return self.cache.list(path) or {}
+
+    def is_file(self, path):
+        info = self.cache.get(path)
+        return info is not None and not info.is_dir
+
+    def is_dir(self, path):
+        info = self.cache.get(path)
+        return info is not None and info.is_dir
+
     def create_contact_dir(self, contact_id):
         dirname = self.get_textfile_path(contact_id)
         try:
             os.makedirs(dirname)
+            self.cache.update(dirname)
         except OSError:
             return "Couldn't create directory \"{}\".".format(dirname)
+        self.report_contact_dir_created(contact_id)
+
+    def report_contact_dir_created(self, contact_id):
+        if self.on_contact_dir_created is not None:
+            self.on_contact_dir_created(contact_id)
 
     def create_note_dir(self, contact_id):
         return self.create_textfile_dir(contact_id, self.NOTES_DIR)
@@ -59,28 +113,31 @@ class TextFileStore:
 
         path = self.get_textfile_path_by_type(contact_id, textfile_type)
 
-        if not os.path.exists(path):
-            os.makedirs(path)
+        if not self.is_dir(path):
+            os.makedirs(path, exist_ok=True)
+            self.cache.update(path)
 
         return path
 
     def get_contact_names(self):
         contact_names = []
-        for dirname in os.listdir(self.path):
+        for dirname in self.list_dir(self.path):
             if dirname.endswith('.txt'): continue
             contact_names.append(dirname.replace('_', ' '))
         return sorted(contact_names)
 
     def contains_contact(self, contact_id):
         dirname = self.path + contact_id
-        return os.path.isdir(dirname)
+        return self.is_dir(dirname)
 
     def add_contact(self, contact):
         dirname = self.get_textfile_path(contact.get_id())
         try:
             os.makedirs(dirname)
+            self.cache.update(dirname)
         except OSError:
             return "Couldn't create directory \"{}\".".format(dirname)
+        self.report_contact_dir_created(contact.get_id())
 
     def rename_contact(self, contact_id, new_name):
         name = Contact.id_to_name(contact_id)
@@ -93,6 +150,8 @@ class TextFileStore:
             dirname = self.get_textfile_path(contact_id)
             new_dirname = self.path + new_name.replace(' ', '_')
             os.rename(dirname, new_dirname)
+            self.cache.update(dirname)
+            self.cache.update(new_dirname)
         except OSError:
             return "Couldn't rename directory \"{}\" to \"{}\"." \
                 .format(dirname, new_dirname)
@@ -103,69 +162,358 @@ class TextFileStore:
         try:
             dirname = self.get_textfile_path(contact_id)
             shutil.rmtree(dirname, ignore_errors=False)
+            self.cache.update(dirname)
             return True
         except Exception:
             return "Couldn't delete directory \"{}\".".format(dirname)
 
     def has_entries(self, contact_id, detail_type):
-        has_entries = False
+        return len(self.list_entries(contact_id, detail_type)) > 0
+
+    # entries are the files of notes and gifts, either in the directories of
+    # their type or in the pack file of the contact
+
+    def get_pack_filepath(self, contact_id):
+        return os.path.join(self.get_textfile_path(contact_id), self.PACK_FILE)
+
+    def is_packed(self, contact_id):
+        return self.is_file(self.get_pack_filepath(contact_id))
+
+    def get_pack(self, contact_id):
+        path = self.get_pack_filepath(contact_id)
+        pack = self.packs.get(path)
+        if pack is None or pack.is_stale():
+            pack = self.packs[path] = PackFile(path)
+        return pack
+
+    def get_entry_filepath(self, contact_id, textfile_type, filename):
+        return os.path.join(
+            self.get_textfile_path_by_type(contact_id, textfile_type), filename)
 
-        if contact_id:
-            dir_path = self.get_textfile_path_by_type(contact_id, detail_type)
-            has_entries = os.path.isdir(dir_path) \
-                          and len(os.listdir(dir_path)) > 0
+    def list_entries(self, contact_id, textfile_type):
+        """
+        Return the sorted file names of the notes or gifts of a contact.
+        """
+        if not contact_id:
+            return []
+        if self.is_packed(contact_id):
+            return self.get_pack(contact_id).names(textfile_type)
+        dirname = self.get_textfile_path_by_type(contact_id, textfile_type)
+        return sorted(self.list_dir(dirname))
+
+    def has_entry(self, contact_id, textfile_type, filename):
+        if self.is_packed(contact_id):
+            return self.get_pack(contact_id).contains(textfile_type, filename)
+        return self.is_file(
+            self.get_entry_filepath(contact_id, textfile_type, filename))
+
+    def read_entry(self, contact_id, textfile_type, filename, limit=None):
+        if self.is_packed(contact_id):
+            return self.get_pack(contact_id).read(textfile_type, filename,
+                                                  limit)
+        filepath = self.get_entry_filepath(contact_id, textfile_type, filename)
+        with open(filepath, 'rb') as f:
+            return f.read(-1 if limit is None else limit)
+
+    def write_entry(self, contact_id, textfile_type, filename, content):
+        if self.is_packed(contact_id):
+            self.get_pack(contact_id).put(textfile_type, filename, content)
+            # the directory might have been created for the editor
+            self.remove_empty_dir(contact_id, textfile_type)
+        else:
+            self.create_textfile_dir(contact_id, textfile_type)
+            filepath = self.get_entry_filepath(contact_id, textfile_type,
+                                               filename)
+            with open(filepath, 'wb') as f:
+                f.write(content)
+            self.cache.update(filepath)
+
+        self.index_entry(contact_id, textfile_type, filename, content)
+
+    def rename_entry(self, contact_id, textfile_type, filename, new_filename):
+        if self.is_packed(contact_id):
+            self.get_pack(contact_id).rename(textfile_type, filename,
+                                             new_filename)
+        else:
+            old_filepath = self.get_entry_filepath(contact_id, textfile_type,
+                                                   filename)
+            new_filepath = self.get_entry_filepath(contact_id, textfile_type,
+                                                   new_filename)
+            os.rename(old_filepath, new_filepath)
+            self.cache.update(old_filepath)
+            self.cache.update(new_filepath)
+
+        self.fulltext_index.rename(
+            self.get_document_key(contact_id, textfile_type, filename),
+            self.get_document_key(contact_id, textfile_type, new_filename),
+            self.get_entry_stamp(contact_id, textfile_type, new_filename))
+
+    def remove_entry(self, contact_id, textfile_type, filename):
+        if self.is_packed(contact_id):
+            self.get_pack(contact_id).delete(textfile_type, filename)
+        else:
+            filepath = self.get_entry_filepath(contact_id, textfile_type,
+                                               filename)
+            os.remove(filepath)
+            self.cache.update(filepath)
+            self.remove_empty_dir(contact_id, textfile_type)
+
+        self.unindex_entry(contact_id, textfile_type, filename)
 
-        return has_entries
+    def replace_entry(self, contact_id, textfile_type, filename, new_filename,
+                      content):
+        """
+        Write an entry under a new name and remove the old one, e.g. the
+        encrypted version of a note.
+        """
+        if not self.is_packed(contact_id):
+            self.write_entry(contact_id, textfile_type, new_filename, content)
+            self.remove_entry(contact_id, textfile_type, filename)
+            return
+
+        self.get_pack(contact_id).append([
+            (PUT, textfile_type, new_filename, content),
+            (DELETE, textfile_type, filename, b'')])
+        self.index_entry(contact_id, textfile_type, new_filename, content)
+        self.unindex_entry(contact_id, textfile_type, filename)
+
+    def remove_empty_dir(self, contact_id, textfile_type):
+        dirname = self.get_textfile_path_by_type(contact_id, textfile_type)
+        if self.is_dir(dirname) and len(self.list_dir(dirname)) == 0:
+            os.rmdir(dirname)
+            self.cache.update(dirname)
+
+    def get_entry_key(self, contact_id, textfile_type, filename):
+        if self.is_packed(contact_id):
+            return f'{self.get_pack_filepath(contact_id)}/{textfile_type}/' \
+                   f'{filename}'
+        return self.get_entry_filepath(contact_id, textfile_type, filename)
+
+    def get_entry_version(self, contact_id, textfile_type, filename):
+        """
+        Return a cache key of an entry and a version and size that change
+        whenever its content changes.
+        """
+        key = self.get_entry_key(contact_id, textfile_type, filename)
+        if self.is_packed(contact_id):
+            pack = self.get_pack(contact_id)
+            offset, length = pack.get_location(textfile_type, filename)
+            return key, (pack.generation, offset), length
+        stat = os.stat(key)
+        return key, stat.st_mtime_ns, stat.st_size
+
+    def get_entry_stamp(self, contact_id, textfile_type, filename):
+        """
+        Return a value that changes whenever the content of an entry changes,
+        unlike get_entry_version also across program runs.
+        """
+        if self.is_packed(contact_id):
+            pack = self.get_pack(contact_id)
+            return (pack.inode,) + pack.get_location(textfile_type, filename)
+        # not the directory cache, files edited in place don't change the
+        # mtime of their directory
+        stat = os.stat(
+            self.get_entry_filepath(contact_id, textfile_type, filename))
+        return stat.st_mtime_ns, stat.st_size
+
+    # full-text search over plain notes and gifts
+
+    @staticmethod
+    def get_document_key(contact_id, textfile_type, filename):
+        return f'{contact_id}/{textfile_type}/{filename}'
+
+    def is_searchable(self, textfile_type, filename):
+        if textfile_type == self.NOTES_DIR:
+            return filename.endswith('.txt')
+        return filename.endswith('.yaml')
+
+    def get_document_text(self, textfile_type, filename, content):
+        text = content.decode('utf-8', errors='replace')
+        if textfile_type == self.GIFTS_DIR:
+            try:
+                gift = Gift.from_dump(filename.replace('.yaml', ''), text)
+            except Exception:
+                return text  # search the file as it is
+            text = ' '.join([gift.name, gift.desc or ''] +
+                            list(gift.occasions or []))
+        return text
+
+    def index_entry(self, contact_id, textfile_type, filename, content):
+        key = self.get_document_key(contact_id, textfile_type, filename)
+        if not self.is_searchable(textfile_type, filename):
+            self.fulltext_index.remove(key)
+            return
+
+        self.fulltext_index.update(
+            key, self.get_entry_stamp(contact_id, textfile_type, filename),
+            self.get_document_text(textfile_type, filename, content))
+
+    def unindex_entry(self, contact_id, textfile_type, filename):
+        self.fulltext_index.remove(
+            self.get_document_key(contact_id, textfile_type, filename))
+
+    def update_fulltext_index(self):
+        """
+        Bring the full-text index up to date with the files changed by other
+        programs, reading only entries of which the stamp changed.
+        """
+        keys = set()
+
+        for contact_id, info in self.list_dir(self.path).items():
+            if not info.is_dir:
+                continue
+            for textfile_type in (self.NOTES_DIR, self.GIFTS_DIR):
+                for filename in self.list_entries(contact_id, textfile_type):
+                    if not self.is_searchable(textfile_type, filename):
+                        continue
+
+                    key = self.get_document_key(contact_id, textfile_type,
+                                                filename)
+                    keys.add(key)
+                    stamp = self.get_entry_stamp(contact_id, textfile_type,
+                                                 filename)
+                    if stamp != self.fulltext_index.get_stamp(key):
+                        content = self.read_entry(contact_id, textfile_type,
+                                                  filename)
+                        self.fulltext_index.update(key, stamp,
+                                                   self.get_document_text(
+                                                       textfile_type, filename,
+                                                       content))
+
+        for key in self.fulltext_index.keys() - keys:
+            self.fulltext_index.remove(key)
+
+        self.fulltext_index.save()
+
+    def search_notes(self, query):
+        """
+        Search plain notes and gifts of all contacts for the words of the
+        query. Returns a list of (contact_id, textfile_type, detail_id), best
+        hit first.
+        """
+        self.update_fulltext_index()
+
+        hits = []
+        for score, key in self.fulltext_index.search(query):
+            contact_id, textfile_type, filename = key.split('/')
+            detail_id = filename.rsplit('.', 1)[0]
+            hits.append((contact_id, textfile_type, detail_id))
+        return hits
+
+    def close(self):
+        self.fulltext_index.save()
+
+    def pack_contact(self, contact_id):
+        """
+        Move the note and gift files of a contact into its pack file.
+        """
+        if self.is_packed(contact_id):
+            raise ValueError(f'Contact "{contact_id}" is already packed')
+
+        records = []
+        for textfile_type in (self.NOTES_DIR, self.GIFTS_DIR):
+            for filename in self.list_entries(contact_id, textfile_type):
+                filepath = self.get_entry_filepath(contact_id, textfile_type,
+                                                   filename)
+                with open(filepath, 'rb') as f:
+                    records.append((PUT, textfile_type, filename, f.read()))
+
+        if not self.contains_contact(contact_id):
+            self.create_contact_dir(contact_id)
+
+        path = self.get_pack_filepath(contact_id)
+        pack = self.packs[path] = PackFile(path)
+        pack.append(records)
+        self.cache.update(path)
+
+        for textfile_type in (self.NOTES_DIR, self.GIFTS_DIR):
+            dirname = self.get_textfile_path_by_type(contact_id, textfile_type)
+            if self.is_dir(dirname):
+                shutil.rmtree(dirname)
+                self.cache.update(dirname)
+
+        return f'Packed {len(records)} files'
+
+    def unpack_contact(self, contact_id):
+        """
+        Write the entries of the pack file of a contact back to note and gift
+        files and delete the pack file.
+        """
+        if not self.is_packed(contact_id):
+            raise ValueError(f'Contact "{contact_id}" is not packed')
+
+        pack = self.get_pack(contact_id)
+        for textfile_type, filename in sorted(pack.index):
+            content = pack.read(textfile_type, filename)
+            self.create_textfile_dir(contact_id, textfile_type)
+            filepath = self.get_entry_filepath(contact_id, textfile_type,
+                                               filename)
+            with open(filepath, 'wb') as f:
+                f.write(content)
+            self.cache.update(filepath)
+
+        os.remove(pack.path)
+        self.cache.update(pack.path)
+        del self.packs[pack.path]
+
+        return f'Unpacked {len(pack.index)} files'
 
     def has_notes(self, contact_id):
         return self.has_entries(contact_id, self.NOTES_DIR)
 
     def has_encrypted_notes(self, contact_id):
-        dirname = self.get_textfile_path_by_type(contact_id, self.NOTES_DIR)
-        if not self.has_notes(contact_id):
-            return False
-        for file in os.listdir(dirname):
-            if file.endswith(".gpg"):
+        for filename in self.list_entries(contact_id, self.NOTES_DIR):
+            if filename.endswith(".gpg"):
                 return True
+        return False
 
     def get_notes(self, contact_id):
         """
         Read plain text and encrypted notes of a given contact and return a
-        list of both of them.
+        list of both of them. Of plain notes only a preview is read, the full
+        content is loaded when accessed.
         """
         notes = []
 
-        if self.has_notes(contact_id):
-            dirname = self.get_textfile_path_by_type(contact_id, self.NOTES_DIR)
+        for filename in self.list_entries(contact_id, self.NOTES_DIR):
 
-            for filename in sorted(os.listdir(dirname)):
+            # plain notes
+            if not filename.endswith(".gpg"):
+                note_id = filename.replace('.txt', '')
+                notes.append(self.read_lazy_note(contact_id, note_id))
 
-                # plain notes
-                if not filename.endswith(".gpg"):
-                    file_path = os.path.join(dirname, filename)
+            # encrypted notes
+            else:
+                note_id = filename.replace('.txt', '').replace('.gpg', '')
+                note = EncryptedNote(note_id)
+                notes.append(note)
 
-                    with open(file_path, "r") as f:
-                        content = f.read().strip()
-                        note_id = filename.replace('.txt', '')
-                        note = Note(note_id, content)
-                        notes.append(note)
+        return notes
 
-                # encrypted notes
-                else:
-                    note_id = filename.replace('.txt', '').replace('.gpg', '')
-                    note = EncryptedNote(note_id)
-                    notes.append(note)
+    def read_lazy_note(self, contact_id, note_id):
+        data = self.read_entry(contact_id, self.NOTES_DIR, f'{note_id}.txt',
+                               self.note_preview_bytes + 1)
+        preview, complete = make_preview(data, self.note_preview_bytes,
+                                         self.note_preview_lines)
+        return LazyNote(note_id, preview, complete,
+                        partial(self.read_note_content, contact_id, note_id))
 
-        return notes
+    def read_note_content(self, contact_id, note_id):
+        if self.is_packed(contact_id):
+            content = self.read_entry(contact_id, self.NOTES_DIR,
+                                      f'{note_id}.txt')
+            return content.decode('utf-8').strip()
+
+        filepath = self.get_note_filepath(contact_id, note_id)
+        return read_content(filepath, self.note_mmap_size)
 
     def get_encrypted_notes(self, contact_id):
         """
         Read encrypted notes of a given contact and return a list of them.
         """
-        dirname = self.get_textfile_path_by_type(contact_id, self.NOTES_DIR)
         notes = []
 
-        for filename in sorted(os.listdir(dirname)):
+        for filename in self.list_entries(contact_id, self.NOTES_DIR):
             if filename.endswith(".gpg"):
                 note_id = filename.replace('.txt', '').replace('.gpg', '')
                 note = EncryptedNote(note_id)
@@ -173,58 +521,46 @@ class TextFileStore:
         return notes
 
     def has_note(self, contact_id, note_id):
-        filepath = self.get_note_filepath(contact_id, note_id)
+        filename = f'{note_id}.txt'
         # plain or encrypted notes
-        return os.path.isfile(filepath) or os.path.isfile(filepath + ".gpg")
+        return self.has_entry(contact_id, self.NOTES_DIR, filename) or \
+            self.has_entry(contact_id, self.NOTES_DIR, filename + ".gpg")
 
     def note_is_encrypted(self, contact_id, note_id):
-        filepath = self.get_note_filepath(contact_id, note_id) + ".gpg"
-        return os.path.isfile(filepath)
+        return self.has_entry(contact_id, self.NOTES_DIR, f'{note_id}.txt.gpg')
 
     def get_note(self, contact_id, note_id):
         if not self.has_note(contact_id, note_id):
             raise ValueError(f'Note {note_id} doesn\'t exist')
 
-        filepath = self.get_note_filepath(contact_id, note_id)
-
-        with open(filepath, "r") as f:
-            content = f.read()
-            return Note.from_dump(note_id, content)
+        content = self.read_entry(contact_id, self.NOTES_DIR, f'{note_id}.txt')
+        return Note.from_dump(note_id, content.decode('utf-8'))
 
     def add_note(self, contact_id, note):
         if self.has_note(contact_id, note.note_id):
             raise ValueError(f'Note "{note.note_id}" already exists')
 
-        self.create_note_dir(contact_id)
-
-        filepath = self.get_note_filepath(contact_id, note.note_id)
-        content = note.to_dump()
-
-        with open(filepath, 'w') as f:
-            f.write(content)
+        self.write_entry(contact_id, self.NOTES_DIR, f'{note.note_id}.txt',
+                         note.to_dump().encode('utf-8'))
 
         return "Note added"
 
     def add_encrypted_note(self, contact_id, note):
+        return self.prepare_add_encrypted_note(contact_id, note).execute()
+
+    def prepare_add_encrypted_note(self, contact_id, note):
         if self.has_note(contact_id, note.note_id):
             raise ValueError(f'Note "{note.note_id}" already exists')
 
-        self.create_note_dir(contact_id)
-
-        filepath = self.get_note_filepath(contact_id, note.note_id)
+        def apply(status):
+            if status.ok:
+                self.write_entry(contact_id, self.NOTES_DIR,
+                                 f'{note.note_id}.txt.gpg', status.data)
+            return f'Note added (ok: {status.ok}).'
 
-        # write to (normal) file
-        with open(filepath, 'w') as f:
-            f.write(note.content)
-
-        # encrypt that file
-        with open(filepath, 'rb') as f:
-            status = self.gpg.encrypt_file(
-                f, recipients=[self.gpg_keyid], output=f'{filepath}.gpg')
-
-        # delete plain text file
-        os.remove(filepath)
-        return f'Note added (ok: {status.ok}).'
+        # encrypt in memory, the plain text never touches the disk
+        return GpgJob(partial(self.gpg.encrypt, note.content.encode('utf-8'),
+                              recipients=[self.gpg_keyid]), apply)
 
     def rename_note(self, contact_id, note_id, new_name):
         new_note_id = Note.name_to_id(new_name)
@@ -236,26 +572,22 @@ class TextFileStore:
             raise ValueError(
                 f'Can\'t rename note as "{new_note_id}" already exists')
 
-        old_filepath = self.get_note_filepath(contact_id, note_id)
-        new_filepath = self.get_note_filepath(contact_id, new_note_id)
+        filename = f'{note_id}.txt'
+        new_filename = f'{new_note_id}.txt'
 
         if self.note_is_encrypted(contact_id, note_id):
-            old_filepath = f'{old_filepath}.gpg'
-            new_filepath = f'{new_filepath}.gpg'
+            filename = f'{filename}.gpg'
+            new_filename = f'{new_filename}.gpg'
 
-        os.rename(old_filepath, new_filepath)
+        self.rename_entry(contact_id, self.NOTES_DIR, filename, new_filename)
         return "Note renamed"
 
     def edit_note(self, contact_id, note_id, note):
         if not self.has_note(contact_id, note_id):
             raise ValueError(f'Note "{note_id}" doesn\'t exist')
 
-        filepath = self.get_note_filepath(contact_id, note_id)
-
-        dump = note.to_dump()
-
-        with open(filepath, 'w') as f:
-            f.write(dump)
+        self.write_entry(contact_id, self.NOTES_DIR, f'{note_id}.txt',
+                         note.to_dump().encode('utf-8'))
 
         return "Note edited"
 
@@ -263,85 +595,122 @@ class TextFileStore:
         if not self.has_note(contact_id, note_id):
             raise ValueError(f'Note {note_id} doesn\'t exist')
 
-        filepath = self.get_note_filepath(contact_id, note_id)
+        filename = f'{note_id}.txt'
 
         if self.note_is_encrypted(contact_id, note_id):
-            filepath = f'{filepath}.gpg'
-
-        os.remove(filepath)
+            filename = f'{filename}.gpg'
 
-        # if this was the last note, delete the directory
-        dirname = self.get_textfile_path_by_type(contact_id, self.NOTES_DIR)
-        if len(os.listdir(dirname)) == 0:
-            os.rmdir(dirname)
+        # if this was the last note, the directory is deleted as well
+        self.remove_entry(contact_id, self.NOTES_DIR, filename)
 
         return "Note deleted"
 
     def encrypt_note(self, contact_id, note_id):
+        return self.prepare_encrypt_note(contact_id, note_id).execute()
+
+    def prepare_encrypt_note(self, contact_id, note_id):
         if not self.has_note(contact_id, note_id):
             raise ValueError(f'Note "{note_id}" doesn\'t exist')
 
-        filepath_plain = self.get_note_filepath(contact_id, note_id)
-        filepath_encrypt = f'{filepath_plain}.gpg'
-
-        if not self.is_key_in_keyring():
-            raise ValueError('GPG key not found in keyring')
-
-        # "rb" is important, "r" doesn't work
-        with open(filepath_plain, 'rb') as f:
-            status = self.gpg.encrypt_file(f, recipients=[self.gpg_keyid],
-                                           output=filepath_encrypt)
+        filename = f'{note_id}.txt'
+        content = self.read_entry(contact_id, self.NOTES_DIR, filename)
 
-        # delete plain file
-        if status.ok:
-            os.remove(filepath_plain)
+        def apply(status):
+            # replace the plain note
+            if status.ok:
+                self.replace_entry(contact_id, self.NOTES_DIR, filename,
+                                   f'{filename}.gpg', status.data)
+            return f'Note encrypted (ok: {status.ok})'
 
-        return f'Note encrypted (ok: {status.ok})'
+        return GpgJob(self.require_key(partial(self.gpg.encrypt, content,
+                                               recipients=[self.gpg_keyid])),
+                      apply)
 
     def decrypt_note(self, contact_id, note_id, passphrase=None):
+        return self.prepare_decrypt_note(contact_id, note_id,
+                                         passphrase).execute()
+
+    def prepare_decrypt_note(self, contact_id, note_id, passphrase=None):
         if not self.has_note(contact_id, note_id):
             raise ValueError(f'Note "{note_id}" doesn\'t exist')
 
-        filepath_plain = self.get_note_filepath(contact_id, note_id)
-        filepath_encrypt = f'{filepath_plain}.gpg'
+        def apply(status):
+            if status.ok:
+                # replace the encrypted note
+                filename = f'{note_id}.txt'
+                self.replace_entry(contact_id, self.NOTES_DIR,
+                                   f'{filename}.gpg', filename, status.data)
+                return "Note decrypted"
+            else:
+                return "Wrong passphrase"
 
-        if not self.is_key_in_keyring():
-            raise ValueError('GPG key not found in keyring')
-
-        with open(filepath_encrypt, 'rb') as f:
-            # passphrase is always None, the gpg-agent is taking care of it
-            status = self.gpg.decrypt_file(f, passphrase=passphrase,
-                                           output=filepath_plain)
-        if status.ok:
-            # delete encrypted file
-            os.remove(filepath_encrypt)
-            return "Note decrypted"
-        else:
-            return "Wrong passphrase"
+        return GpgJob(self.require_key(
+            self.prepare_decryption(contact_id, note_id, passphrase)), apply)
 
     def get_encrypted_note_text(self, contact_id, note_id, passphrase=None):
+        return self.prepare_get_encrypted_note_text(contact_id, note_id,
+                                                    passphrase).execute()
+
+    def prepare_get_encrypted_note_text(self, contact_id, note_id,
+                                        passphrase=None):
         if not self.has_note(contact_id, note_id):
             raise ValueError(f'Note "{note_id}" doesn\'t exist')
 
-        filepath_plain = self.get_note_filepath(contact_id, note_id)
-        filepath_encrypt = f'{filepath_plain}.gpg'
-
-        with open(filepath_encrypt, 'rb') as f:
-            # passphrase is always None, the gpg-agent is taking care of it
-            status = self.gpg.decrypt_file(f, passphrase=passphrase,
-                                           output=filepath_plain)
-        if status.ok:
-            # read decrypted file
-            with open(filepath_plain) as f:
-                content = f.read()
-            # delete decrypted file again
-            # TODO Is there a way to not even create the decrypted file?
-            os.remove(filepath_plain)
-            return content.strip()
-        else:
-            return "Wrong passphrase"
+        def apply(status):
+            if status.ok:
+                return status.data.decode('utf-8').strip()
+            else:
+                return "Wrong passphrase"
+
+        return GpgJob(self.prepare_decryption(contact_id, note_id, passphrase),
+                      apply)
+
+    def prepare_decryption(self, contact_id, note_id, passphrase=None):
+        """
+        Read an encrypted note and return a function decrypting it in memory,
+        without writing the plain text to disk.
+        """
+        content = self.read_entry(contact_id, self.NOTES_DIR,
+                                  f'{note_id}.txt.gpg')
+        # passphrase is always None, the gpg-agent is taking care of it
+        return partial(self.gpg.decrypt, content, passphrase=passphrase)
+
+    def decrypt_notes(self, contact_id, note_ids, submit, callback,
+                      passphrase=None):
+        """
+        Decrypt several encrypted notes in memory, one gpg call per note
+        passed to submit(function, done) of a bounded worker pool, e.g. the
+        gpg pool of the core. callback(note_id, text, error) is called by
+        done for every note, text is None if the decryption failed. Returns
+        the futures of the notes, cancelling them skips the notes not
+        started yet.
+        """
+        def done(note_id, status, error):
+            text = None
+            if error is None and status.ok:
+                text = status.data.decode('utf-8').strip()
+            callback(note_id, text, error)
+
+        return [submit(self.prepare_decryption(contact_id, note_id,
+                                               passphrase),
+                       partial(done, note_id))
+                for note_id in note_ids]
+
+    def require_key(self, function):
+        """
+        Wrap a gpg call of a GpgJob so that it fails if the key is not in the
+        keyring. The check may run gpg, so it is done by the job as well.
+        """
+        def run():
+            if not self.is_key_in_keyring():
+                raise ValueError('GPG key not found in keyring')
+            return function()
+        return run
 
     def is_key_in_keyring(self):
+        return self.keyring_cache.get()
+
+    def find_key_in_keyring(self):
         found_public_key = False
         found_private_key = False
 
@@ -364,53 +733,71 @@ class TextFileStore:
     def get_gifts(self, contact_id: str) -> list[Gift]:
         gifts = []
 
-        if self.has_gifts(contact_id):
-            dirname = self.get_textfile_path_by_type(contact_id, self.GIFTS_DIR)
-
-            for filename in sorted(os.listdir(dirname)):
-                gift_id = filename.replace('.yaml', '')
-                file_path = os.path.join(dirname, filename)
+        for filename in self.list_entries(contact_id, self.GIFTS_DIR):
+            gift_id = filename.replace('.yaml', '')
 
-                with open(file_path, "r") as f:
-                    lines = f.read()
+            try:
+                gift = self.read_gift(contact_id, gift_id)
+            except ValueError as error:
+                gift = Detail(f'⚠️ {error}')
 
-                    try:
-                        gift = Gift.from_dump(gift_id, lines)
-                    except ValueError as error:
-                        gift = Detail(f'⚠️ {error}')
-
-                    gifts.append(gift)
+            gifts.append(gift)
 
         return sorted(gifts, key=lambda g: (
             g.gifted and not g.permanent,
             g.name.lower()
         ))
 
+    def read_gift(self, contact_id, gift_id):
+        """
+        Parse a gift file, unless it is unchanged since it was parsed last.
+        """
+        filename = Gift.id_to_filename(gift_id)
+        key, version, size = self.get_entry_version(contact_id, self.GIFTS_DIR,
+                                                    filename)
+        gift = self.gift_cache.get(key, version, size)
+
+        if gift is None:
+            content = self.read_entry(contact_id, self.GIFTS_DIR, filename)
+            gift = Gift.from_dump(gift_id, content.decode('utf-8'))
+            self.gift_cache.put(key, version, size, gift)
+
+        return gift
+
+    def write_gift(self, contact_id, gift_id, gift):
+        filename = Gift.id_to_filename(gift_id)
+        self.write_entry(contact_id, self.GIFTS_DIR, filename,
+                         gift.to_dump().encode('utf-8'))
+
+        # as read back from the file, without parsing it
+        gift = Gift.from_dict(dict(gift.to_dict(), name=gift.name))
+        key, version, size = self.get_entry_version(contact_id, self.GIFTS_DIR,
+                                                    filename)
+        self.gift_cache.put(key, version, size, gift)
+
     def has_gift(self, contact_id, gift_id):
-        filepath = self.get_gift_filepath(contact_id, gift_id)
-        return os.path.isfile(filepath)
+        return self.has_entry(contact_id, self.GIFTS_DIR,
+                              Gift.id_to_filename(gift_id))
 
     def get_gift(self, contact_id, gift_id):
         if not self.has_gift(contact_id, gift_id):
             raise ValueError(f'Gift {gift_id} does not exist')
 
-        filepath = self.get_gift_filepath(contact_id, gift_id)
+        return self.read_gift(contact_id, gift_id)
+
+    def get_gift_dump(self, contact_id, gift_id):
+        if not self.has_gift(contact_id, gift_id):
+            raise ValueError(f'Gift {gift_id} does not exist')
 
-        with open(filepath, "r") as f:
-            content = f.read()
-            return Gift.from_dump(gift_id, content)
+        content = self.read_entry(contact_id, self.GIFTS_DIR,
+                                  Gift.id_to_filename(gift_id))
+        return content.decode('utf-8')
 
     def add_gift(self, contact_id, gift):
         if self.has_gift(contact_id, gift.get_id()):
             raise ValueError(f'Gift "{gift.get_id()}" already exists')
 
-        self.create_gift_dir(contact_id)
-
-        filepath = self.get_gift_filepath(contact_id, gift.get_id())
-        content = gift.to_dump()
-
-        with open(filepath, 'w') as f:
-            f.write(content)
+        self.write_gift(contact_id, gift.get_id(), gift)
 
         return "Gift added"
 
@@ -423,22 +810,18 @@ class TextFileStore:
         if self.has_gift(contact_id, new_gift_id):
             ValueError(f'Can\'t rename note as "{new_gift_id}" already exist')
 
-        old_filepath = self.get_gift_filepath(contact_id, gift_id)
-        new_filepath = self.get_gift_filepath(contact_id, new_gift_id)
-
-        os.rename(old_filepath, new_filepath)
+        filename = Gift.id_to_filename(gift_id)
+        self.gift_cache.discard(
+            self.get_entry_key(contact_id, self.GIFTS_DIR, filename))
+        self.rename_entry(contact_id, self.GIFTS_DIR, filename,
+                          Gift.id_to_filename(new_gift_id))
         return "Gift renamed"
 
     def edit_gift(self, contact_id, gift_id, gift):
         if not self.has_gift(contact_id, gift_id):
             raise ValueError(f'Gift {gift_id} doesn\'t exist')
 
-        filepath = self.get_gift_filepath(contact_id, gift_id)
-
-        dump = gift.to_dump()
-
-        with open(filepath, 'w') as f:
-            f.write(dump)
+        self.write_gift(contact_id, gift_id, gift)
 
         return "Gift edited"
 
@@ -446,14 +829,12 @@ class TextFileStore:
         if not self.has_gift(contact_id, gift_id):
             raise ValueError(f'Gift "{gift_id}" doesn\'t exist')
 
-        filepath = self.get_gift_filepath(contact_id, gift_id)
-
-        os.remove(filepath)
+        filename = Gift.id_to_filename(gift_id)
+        self.gift_cache.discard(
+            self.get_entry_key(contact_id, self.GIFTS_DIR, filename))
 
-        # if this was the last gift, delete the directory
-        dirname = self.get_textfile_path_by_type(contact_id, self.GIFTS_DIR)
-        if len(os.listdir(dirname)) == 0:
-            os.rmdir(dirname)
+        # if this was the last gift, the directory is deleted as well
+        self.remove_entry(contact_id, self.GIFTS_DIR, filename)
 
         return "Gift deleted"
 
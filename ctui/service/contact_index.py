@@ -0,0 +1,132 @@
+import bisect
+
+from ctui.model.contact import Contact
+
+# stores a contact can come from
+RDF = 1
+TEXTFILE = 2
+GOOGLE = 4
+ALL = RDF | TEXTFILE | GOOGLE
+
+
+class ContactIndex:
+    """
+    Merged view of the contacts of all stores, keyed by contact id. Every
+    contact has a bit for each store it comes from and is removed when no
+    store has it anymore. The ids are kept sorted by name, so that sorted
+    snapshots can be handed out without merging and sorting the stores
+    again.
+    """
+
+    def __init__(self):
+        self.contacts = {}  # contact id -> Contact
+        self.sources = {}  # contact id -> store bits
+        self.keys = []  # sorted (name, contact id)
+        self.snapshot = None
+
+    def __contains__(self, contact_id):
+        return contact_id in self.contacts
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def get_contact(self, contact_id):
+        return self.contacts.get(contact_id)
+
+    def get_sources(self, contact_id):
+        return self.sources.get(contact_id, 0)
+
+    def get_position(self, contact_id):
+        """
+        Position of the contact in the snapshot or None.
+        """
+        contact = self.contacts.get(contact_id)
+        if contact is None:
+            return None
+        return bisect.bisect_left(self.keys, (contact.name, contact_id))
+
+    def get_contacts(self):
+        """
+        Sorted list of the contacts. The list is shared until the index
+        changes and must not be modified.
+        """
+        if self.snapshot is None:
+            self.snapshot = [self.contacts[contact_id]
+                             for name, contact_id in self.keys]
+        return self.snapshot
+
+    def get_names(self):
+        return [name for name, contact_id in self.keys]
+
+    def add(self, contact, source):
+        """
+        Add contact from source. A Google contact replaces a contact of the
+        other stores and takes over its details. Returns whether the contact
+        is new.
+        """
+        contact_id = contact.get_id()
+        existing_contact = self.contacts.get(contact_id)
+        if existing_contact is not None:
+            self.sources[contact_id] = self.sources[contact_id] | source
+            if source == GOOGLE and existing_contact is not contact:
+                self.contacts[contact_id] = contact.merge(existing_contact)
+                self.snapshot = None
+            return False
+
+        self.contacts[contact_id] = contact
+        self.sources[contact_id] = source
+        bisect.insort(self.keys, (contact.name, contact_id))
+        self.snapshot = None
+        return True
+
+    def remove(self, contact_id, source=ALL):
+        """
+        Remove the contact from source. Returns whether the contact was
+        removed from the index, i.e. no store has it anymore.
+        """
+        if contact_id not in self.contacts:
+            return False
+
+        sources = self.sources[contact_id] & ~source
+        if sources:
+            self.sources[contact_id] = sources
+            if source & GOOGLE:
+                name = self.contacts[contact_id].name
+                self.contacts[contact_id] = Contact(name)
+                self.snapshot = None
+            return False
+
+        contact = self.contacts.pop(contact_id)
+        del self.sources[contact_id]
+        del self.keys[bisect.bisect_left(self.keys,
+                                         (contact.name, contact_id))]
+        self.snapshot = None
+        return True
+
+    def rename(self, contact_id, new_name):
+        """
+        Move the contact to new_name in all stores it comes from.
+        """
+        sources = self.sources.get(contact_id, 0)
+        self.remove(contact_id)
+        if sources:
+            self.add(Contact(new_name), sources)
+
+    def sync(self, source, contacts):
+        """
+        Replace the contacts of source by contacts, touching only those that
+        were added or removed. Returns the ids of both as (added, removed).
+        """
+        contact_ids = set()
+        added = []
+        for contact in contacts:
+            contact_ids.add(contact.get_id())
+            if self.add(contact, source):
+                added.append(contact.get_id())
+
+        removed = []
+        for contact_id, sources in list(self.sources.items()):
+            if sources & source and contact_id not in contact_ids:
+                if self.remove(contact_id, source):
+                    removed.append(contact_id)
+        return added, removed
@@ -25,12 +25,13 @@ class Editor:
 
         return content
 
-    def edit(self, filepath):
+    def edit(self, filepath, old_content=None):
         temp_filepath = filepath + '.tmp'
 
         try:
-            with open(filepath) as f:
-                old_content = f.read()
+            if old_content is None:
+                with open(filepath) as f:
+                    old_content = f.read()
 
             with open(temp_filepath, 'w') as tf:
                 tf.write(old_content)
@@ -0,0 +1,138 @@
+import ctypes
+import ctypes.util
+import os
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | \
+             IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+def load_inotify():
+    """
+    Return the C library if it provides inotify (Linux), None otherwise.
+    """
+    name = ctypes.util.find_library('c')
+    if not name:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FileWatcher:
+    """
+    Detects changes of files and directories made by other programs. The
+    signature of every watched path (its stat and, if requested, the stats of
+    its entries) is compared on poll. With inotify, the file descriptor
+    becomes readable on changes, so that polling is only needed then.
+    Otherwise, poll has to be called periodically.
+    """
+
+    def __init__(self, use_inotify=True):
+        self.paths = {}  # path -> include entries in signature
+        self.signatures = {}  # path -> last signature
+        self.watches = {}  # watched directory -> inotify watch descriptor
+        self.libc = load_inotify() if use_inotify else None
+        self.fd = None
+
+        if self.libc:
+            fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                self.libc = None
+            else:
+                self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def set_paths(self, paths):
+        """
+        Watch exactly the given paths, a dict of path -> whether changes of
+        files in a directory count as well.
+        """
+        for path in self.paths.keys() - paths.keys():
+            del self.signatures[path]
+        for path in paths.keys() - self.paths.keys():
+            self.signatures[path] = self.get_signature(path, paths[path])
+        self.paths = dict(paths)
+
+        if self.fd is not None:
+            self.update_watches()
+
+    def update_watches(self):
+        # files are usually replaced by a rename, so their directory is watched
+        directories = set()
+        for path in self.paths:
+            directories.add(os.path.dirname(os.path.abspath(path)))
+            if os.path.isdir(path):
+                directories.add(os.path.abspath(path))
+
+        for directory in self.watches.keys() - directories:
+            self.libc.inotify_rm_watch(self.fd, self.watches.pop(directory))
+        for directory in directories - self.watches.keys():
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory),
+                                             WATCH_MASK)
+            if wd >= 0:
+                self.watches[directory] = wd
+
+    @staticmethod
+    def get_signature(path, entries=False):
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if entries and os.path.isdir(path):
+                with os.scandir(path) as it:
+                    signature += tuple(sorted(
+                        (entry.name, entry.stat().st_mtime_ns) for entry in it))
+            return signature
+        except OSError:
+            return None
+
+    def drain(self):
+        """
+        Read all pending inotify events. They only tell that something might
+        have changed, the signatures tell what.
+        """
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            if not data:
+                return
+
+    def poll(self):
+        """
+        Return the watched paths that changed since the last poll.
+        """
+        if self.fd is not None:
+            self.drain()
+            self.update_watches()  # watched directories might be new
+
+        changed = set()
+        for path, entries in self.paths.items():
+            signature = self.get_signature(path, entries)
+            if signature != self.signatures[path]:
+                self.signatures[path] = signature
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.watches = {}
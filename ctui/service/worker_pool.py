@@ -0,0 +1,50 @@
+import collections
+import os
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+
+class WorkerPool:
+    """
+    Runs functions in worker threads and passes their results to callbacks
+    in the urwid main loop. Callbacks are called in the order the functions
+    were submitted, no matter which one finishes first, so that commands
+    complete in the same order as if they ran synchronously.
+    """
+
+    def __init__(self, main_loop, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.main_loop = main_loop
+        self.pipe_fd = main_loop.watch_pipe(self.deliver)
+        self.jobs = collections.deque()  # (future, callback), main loop only
+
+    def submit(self, function, callback):
+        """
+        Run function in a worker thread and call callback(result, error) in
+        the main loop, error being the exception raised by function or None.
+        Returns the future, cancelling it passes a CancelledError to
+        callback if function didn't start yet.
+        """
+        future = self.executor.submit(function)
+        self.jobs.append((future, callback))
+        future.add_done_callback(self.notify)
+        return future
+
+    def notify(self, future):
+        # called in the worker thread, wakes up the main loop
+        os.write(self.pipe_fd, b'.')
+
+    def deliver(self, data=None):
+        while self.jobs and self.jobs[0][0].done():
+            future, callback = self.jobs.popleft()
+            error = CancelledError() if future.cancelled() \
+                else future.exception()
+            callback(None if error else future.result(), error)
+        return True
+
+    def has_pending(self):
+        return len(self.jobs) > 0
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.main_loop.remove_watch_pipe(self.pipe_fd)
+        os.close(self.pipe_fd)
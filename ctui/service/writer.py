@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+
+
+def write_atomic(path, content):
+    """
+    Write content to a temporary file next to path, fsync it and rename it over
+    path, so that readers never see a partially written file.
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=dirname,
+                                     prefix=f'.{os.path.basename(path)}.',
+                                     suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class DebouncedWriter:
+    """
+    Runs a write function in a background thread. Notifications arriving
+    within the debounce delay of each other are coalesced into one write.
+    A failed write is passed to on_error in the writer thread and retried on
+    the next notification or flush.
+    """
+
+    def __init__(self, write, delay, on_error=None):
+        self.write = write
+        self.delay = delay
+        self.on_error = on_error
+        self.condition = threading.Condition()
+        self.pending = False  # a write is requested
+        self.notified = False  # a notification arrived in the current window
+        self.urgent = False  # skip the debounce delay
+        self.writing = False
+        self.closed = False
+        self.error = None  # error of the last write if it failed
+        self.thread = threading.Thread(target=self.run, name='ctui-writer',
+                                       daemon=True)
+        self.thread.start()
+
+    def notify(self):
+        with self.condition:
+            self.pending = True
+            self.notified = True
+            self.condition.notify_all()
+
+    def is_pending(self):
+        with self.condition:
+            return self.pending or self.writing or self.error is not None
+
+    def flush(self):
+        """
+        Block until all requested writes are done, retrying a failed one.
+        Raises the error if the changes couldn't be written.
+        """
+        with self.condition:
+            if self.error is not None:
+                self.pending = True
+            if self.pending:
+                self.urgent = True
+                self.condition.notify_all()
+            while (self.pending or self.writing) and self.thread.is_alive():
+                self.condition.wait()
+
+            error = self.error
+        if error:
+            raise error
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+            self.thread.join()
+
+    def run(self):
+        with self.condition:
+            while True:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+
+                while not self.urgent and not self.closed:
+                    self.notified = False
+                    self.condition.wait(self.delay)
+                    if not self.notified:
+                        break
+
+                self.pending = False
+                self.urgent = False
+                self.writing = True
+                self.condition.release()
+                try:
+                    self.write()
+                except Exception as e:
+                    error = e
+                    if self.on_error:
+                        self.on_error(e)
+                else:
+                    error = None
+                finally:
+                    self.condition.acquire()
+                    self.writing = False
+                self.error = error
+                self.condition.notify_all()
@@ -48,9 +48,37 @@ class UI:
 
         self.main_loop = urwid.MainLoop(self.frame, palette)
 
+        self.watch_files = config['display'].getboolean('watch_files',
+                                                        fallback=True)
+        self.watch_interval = config['display'].getfloat('watch_interval',
+                                                         fallback=2)
+
     def run(self) -> None:
+        if self.watch_files:
+            self.start_file_watcher()
+        self.core.watch_write_errors()
+        # encrypting the first note shouldn't wait for the keyring listing
+        self.core.textfilestore.keyring_cache.warm()
         self.main_loop.run()
 
+    def start_file_watcher(self) -> None:
+        """
+        Reload contact files changed by other programs: on inotify events if
+        available, by polling their mtimes otherwise.
+        """
+        watcher = self.core.watch_files()
+
+        if watcher.fileno() is not None:
+            self.main_loop.watch_file(watcher.fileno(),
+                                      self.core.reload_changed_files)
+        else:
+            self.main_loop.set_alarm_in(self.watch_interval,
+                                        self.poll_changed_files)
+
+    def poll_changed_files(self, main_loop, user_data=None) -> None:
+        self.core.reload_changed_files()
+        main_loop.set_alarm_in(self.watch_interval, self.poll_changed_files)
+
     def is_focus_on_details(self) -> bool:
         return self.frame.body.focus_position == 1
 
@@ -1,19 +1,76 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import gnupg
+import urwid
+import yaml
+from rdflib.compare import isomorphic
 
 import ctui.util as util
+from ctui.commands import Command, EncryptNote, FindContact
 from ctui.component.contact_entry import ContactEntry
 from ctui.component.contact_list import ContactList
 from ctui.component.detail_entry import AttributeEntry, GiftEntry, NoteEntry
 from ctui.core import *
+from ctui.model import gift_codec
 from ctui.model.attribute import Attribute
+from ctui.model.encrypted_note import EncryptedNote
 from ctui.model.gift import Gift
+from ctui.model.lazy_note import LazyNote
 from ctui.model.note import Note
+from ctui.repository.attribute_index import normalize_value
+from ctui.repository.directory_cache import DirectoryCache
+from ctui.repository.fulltext import FullTextIndex
+from ctui.repository.gift_cache import GiftCache
+from ctui.repository.journal import Journal
+from ctui.repository.pack import PackFile
+from ctui.repository.note_file import make_preview, read_content
+from ctui.repository.keyring_cache import KeyringCache
+from ctui.repository.names import scan_contact_names, scan_rdf_names
+from ctui.repository.parallel_parser import parse_n3, split_n3
+from ctui.repository.rdf import Graph, RDFStore, URIRef
+from ctui.repository.rdf_sharded import ShardedRDFStore
+from ctui.repository.sqlite import SQLiteStore
+from ctui.repository.textfile import TextFileStore
+from ctui.service.contact_index import ContactIndex, RDF, TEXTFILE, GOOGLE
+from ctui.service.watcher import FileWatcher
+from ctui.service.worker_pool import WorkerPool
+from ctui.service.writer import DebouncedWriter, write_atomic
 from ctui.ui import UI
 
 CONFIG_FILE = 'files/config.ini'
 config = util.load_config(CONFIG_FILE)
 
 
+class TempDirTestCase(unittest.TestCase):
+    """
+    Test case with a temporary directory for copies of the test files.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'contacts.n3')
+        self.textfile_dir = os.path.join(self.tmp_dir, 'contacts/')
+
+    def copy_rdf_file(self):
+        shutil.copy(config['path']['rdf_file'], self.path)
+        return self.path
+
+    def copy_textfile_dir(self):
+        shutil.copytree(config['path']['textfile_dir'], self.textfile_dir)
+        return self.textfile_dir
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
 class TestCore(unittest.TestCase):
 
     @classmethod
@@ -544,6 +601,1818 @@ class TestObjects(unittest.TestCase):
         pass
 
 
+class TestRDFJournal(TempDirTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.namespace = config['rdf']['namespace']
+        cls.contact = Contact("Test Contact")
+        cls.attr = Attribute("key", "value")
+
+    def setUp(self):
+        super().setUp()
+        self.copy_rdf_file()
+        with open(self.path) as f:
+            self.content = f.read()
+
+    def test_mutations_only_append_to_journal(self):
+        store = RDFStore(self.path, self.namespace, journal=True)
+        store.add_contact(self.contact)
+        store.add_attribute(self.contact.get_id(), self.attr)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertTrue(store.journal.exists())
+
+    def test_replay_on_load(self):
+        store = RDFStore(self.path, self.namespace, journal=True)
+        store.add_contact(self.contact)
+        store.add_attribute(self.contact.get_id(), self.attr)
+        store.rename_contact(self.contact.get_id(), "Renamed Contact")
+        store = RDFStore(self.path, self.namespace, journal=True)
+        self.assertFalse(store.contains_contact(self.contact.get_id()))
+        self.assertTrue(store.has_attribute("Renamed_Contact", self.attr))
+
+    def test_append_after_interrupted_write(self):
+        journal = Journal(os.path.join(self.tmp_dir, 'journal'), 1024)
+        with open(journal.path, 'w') as f:
+            f.write('["+", "A", "k", "v')
+        journal.append([['c', 'B']])
+        self.assertEqual(list(journal.read()), [['c', 'B']])
+        journal.append([['c', 'C']])
+        self.assertEqual(list(journal.read()), [['c', 'B'], ['c', 'C']])
+
+    def test_compact_on_close(self):
+        store = RDFStore(self.path, self.namespace, journal=True)
+        store.add_contact(self.contact)
+        store.close()
+        self.assertFalse(store.journal.exists())
+        store = RDFStore(self.path, self.namespace)
+        self.assertTrue(store.contains_contact(self.contact.get_id()))
+
+    def test_compact_when_full(self):
+        store = RDFStore(self.path, self.namespace, journal=True,
+                         journal_max_size=1)
+        store.add_contact(self.contact)
+        self.assertFalse(store.journal.exists())
+        with open(self.path) as f:
+            self.assertIn(self.contact.name, f.read())
+
+
+class TestRDFIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.copy_rdf_file()
+        self.store = RDFStore(self.path, config['rdf']['namespace'])
+        self.contact = Contact("Test Contact")
+        self.attr = Attribute("key", "value")
+
+    def assertIndexConsistent(self):
+        subjects = dict(self.store.subjects)
+        contacts = dict(self.store.contacts)
+        owners = dict(self.store.attribute_index.owners)
+        self.store.build_index()
+        self.assertEqual(subjects, self.store.subjects)
+        self.assertEqual(contacts, self.store.contacts)
+        self.assertEqual(owners, self.store.attribute_index.owners)
+
+    def test_index_after_load(self):
+        self.assertEqual(len(self.store.subjects), 4)
+        self.assertTrue(self.store.contains_contact("Max_Mustermann"))
+
+    def test_interned_keys(self):
+        self.store.add_attribute("Max_Mustermann", Attribute("email", "a"))
+        self.store.add_attribute("Mia_Mustermann", Attribute("email", "b"))
+        key_max, _ = self.store.get_contact_record("Max_Mustermann").attributes[0]
+        key_mia, _ = self.store.get_contact_record("Mia_Mustermann").attributes[0]
+        self.assertIs(key_max, key_mia)
+
+    def test_index_after_mutations(self):
+        self.store.add_attribute(self.contact.get_id(), self.attr)
+        self.assertIndexConsistent()
+        self.store.rename_contact(self.contact.get_id(), "Renamed Contact")
+        self.assertIndexConsistent()
+        self.assertEqual(self.store.get_attributes("Renamed_Contact"),
+                         [self.attr])
+        self.store.delete_attribute("Renamed_Contact", self.attr)
+        self.assertIndexConsistent()
+        self.store.delete_contact("Renamed_Contact")
+        self.assertIndexConsistent()
+        self.assertFalse(self.store.contains_contact("Renamed_Contact"))
+
+    def test_other_namespace(self):
+        # the file uses another namespace than the configured one
+        with open(self.path, 'a') as f:
+            f.write('[] c:givenName "Test Contact" ;\n'
+                    '    c:email "a@example.org" ;\n'
+                    '    c:tel "123" .\n')
+        store = RDFStore(self.path, config['rdf']['namespace'])
+        store.delete_attribute("Test_Contact",
+                               Attribute("email", "a@example.org"))
+        store.edit_attribute("Test_Contact", Attribute("tel", "123"),
+                             Attribute("tel", "456"))
+
+        store = RDFStore(self.path, config['rdf']['namespace'])
+        self.assertEqual(store.get_attributes("Test_Contact"),
+                         [Attribute("tel", "456")])
+
+
+class TestRDFTransaction(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.copy_rdf_file()
+        self.store = RDFStore(self.path, config['rdf']['namespace'])
+        self.contact = Contact("Test Contact")
+        self.attr1 = Attribute("key1", "value1")
+        self.attr2 = Attribute("key2", "value2")
+
+    def test_commit_writes_once(self):
+        saves = []
+        save_file = self.store.save_file
+        self.store.save_file = lambda path: saves.append(save_file(path))
+        with self.store.transaction():
+            self.store.add_attribute(self.contact.get_id(), self.attr1)
+            self.store.edit_attribute(self.contact.get_id(), self.attr1,
+                                      self.attr2)
+        self.assertEqual(len(saves), 1)
+        store = RDFStore(self.path, config['rdf']['namespace'])
+        self.assertEqual(store.get_attributes(self.contact.get_id()),
+                         [self.attr2])
+
+    def test_rollback_on_exception(self):
+        self.store.add_attribute(self.contact.get_id(), self.attr1)
+        triples = set(self.store.g)
+        with self.assertRaises(ValueError):
+            with self.store.transaction():
+                self.store.delete_contact(self.contact.get_id())
+                self.store.add_attribute("Other_Contact", self.attr2)
+                raise ValueError()
+        self.assertEqual(set(self.store.g), triples)
+        self.assertTrue(
+            self.store.has_attribute(self.contact.get_id(), self.attr1))
+        self.assertFalse(self.store.contains_contact("Other_Contact"))
+        store = RDFStore(self.path, config['rdf']['namespace'])
+        self.assertFalse(store.contains_contact("Other_Contact"))
+
+    def test_nested_rollback(self):
+        with self.store.transaction():
+            self.store.add_attribute(self.contact.get_id(), self.attr1)
+            try:
+                with self.store.transaction():
+                    self.store.add_attribute(self.contact.get_id(),
+                                             self.attr2)
+                    raise ValueError()
+            except ValueError:
+                pass
+        store = RDFStore(self.path, config['rdf']['namespace'])
+        self.assertEqual(store.get_attributes(self.contact.get_id()),
+                         [self.attr1])
+
+
+class TestRDFSnapshot(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.copy_rdf_file()
+        self.namespace = config['rdf']['namespace']
+
+    def load_store(self):
+        store = RDFStore(self.path, self.namespace, cache_dir=self.cache_dir)
+        if store.snapshot.thread:
+            store.snapshot.thread.join()
+        return store
+
+    def test_snapshot_created(self):
+        store = self.load_store()
+        key = store.snapshot.get_key()
+        g = store.snapshot.load(key)
+        self.assertIsNotNone(g)
+        self.assertEqual(set(g), set(store.g))
+        self.assertEqual(dict(g.namespaces())['c'],
+                         URIRef('http://hiea.de/contact#'))
+
+    def test_snapshot_used(self):
+        self.load_store()
+        store = self.load_store()
+        self.assertIsNone(store.snapshot.thread)
+        self.assertEqual(store.get_contact_names(),
+                         ["Maria Mustermann", "Martin Mustermann",
+                          "Max Mustermann", "Mia Mustermann"])
+
+    def test_prune(self):
+        other_path = os.path.join(self.tmp_dir, 'other.n3')
+        shutil.copy(self.path, other_path)
+        other = RDFStore(other_path, self.namespace, cache_dir=self.cache_dir)
+        other.snapshot.thread.join()
+        os.remove(other_path)
+        with open(os.path.join(self.cache_dir, 'old.snapshot'), 'wb') as f:
+            f.write(b'broken')
+
+        store = self.load_store()
+        self.assertEqual(os.listdir(self.cache_dir),
+                         [os.path.basename(store.snapshot.snapshot_path)])
+
+    def test_snapshot_stale(self):
+        store = self.load_store()
+        store.add_contact(Contact("Test Contact"))
+        self.assertIsNone(store.snapshot.load(store.snapshot.get_key()))
+        store = self.load_store()
+        self.assertTrue(store.contains_contact("Test_Contact"))
+
+
+class TestWriter(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.writes = []
+
+    def test_write_atomic(self):
+        path = os.path.join(self.tmp_dir, 'file.txt')
+        write_atomic(path, b'first')
+        write_atomic(path, b'second')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'second')
+        self.assertEqual(os.listdir(self.tmp_dir), ['file.txt'])
+
+    def test_coalesce_notifications(self):
+        writer = DebouncedWriter(lambda: self.writes.append(1), 10)
+        for i in range(5):
+            writer.notify()
+        writer.flush()
+        self.assertEqual(len(self.writes), 1)
+        writer.close()
+        self.assertEqual(len(self.writes), 1)
+
+    def test_flush_raises_write_error(self):
+        def write():
+            raise OSError("disk full")
+
+        writer = DebouncedWriter(write, 10)
+        writer.notify()
+        with self.assertRaises(OSError):
+            writer.flush()
+        with self.assertRaises(OSError):
+            writer.close()
+
+    def test_failed_write_retried(self):
+        errors = []
+
+        def write():
+            self.writes.append(1)
+            if len(self.writes) == 1:
+                raise OSError("disk full")
+
+        writer = DebouncedWriter(write, 0.01, errors.append)
+        writer.notify()
+        while not errors:
+            writer.thread.join(0.01)
+        self.assertEqual(str(errors[0]), "disk full")
+        self.assertTrue(writer.is_pending())
+
+        writer.flush()
+        self.assertEqual(len(self.writes), 2)
+        self.assertFalse(writer.is_pending())
+        writer.close()
+
+    def test_write_error_shown(self):
+        path = self.copy_rdf_file()
+        core = Core(config, True)
+        UI(core, config)
+        core.rdfstore = RDFStore(path, config['rdf']['namespace'],
+                                 write_delay=10)
+        core.watch_write_errors()
+
+        core.rdfstore.report_write_error(OSError("disk full"))
+        core.show_write_errors()
+        self.assertIn("disk full", core.ui.console.body.text)
+
+        # quitting asks once before discarding unsaved changes
+        def flush():
+            raise OSError("disk full")
+
+        core.flush = flush
+        core.ui.frame.quit_app(None, None)
+        self.assertIn("Quit again", core.ui.console.body.text)
+        with self.assertRaises(urwid.ExitMainLoop):
+            core.ui.frame.quit_app(None, None)
+        core.close()
+
+    def test_rdfstore_writes_in_background(self):
+        path = self.copy_rdf_file()
+        store = RDFStore(path, config['rdf']['namespace'], write_delay=10)
+        store.add_contact(Contact("Test Contact"))
+        with open(path) as f:
+            self.assertNotIn("Test Contact", f.read())
+        store.flush()
+        with open(path) as f:
+            self.assertIn("Test Contact", f.read())
+        store.close()
+
+
+class TestNameScanner(TempDirTestCase):
+
+    def test_same_names_as_core(self):
+        core = Core(config, True)
+        names = scan_contact_names(config)
+        self.assertEqual(names, core.contact_handler.load_contact_names())
+
+    def test_serialized_graph(self):
+        self.copy_rdf_file()
+        store = RDFStore(self.path, config['rdf']['namespace'])
+        store.add_attribute("Test_Contact", Attribute("key", "value"))
+        store.add_contact(Contact("Zoë Ärger"))
+        self.assertEqual(scan_rdf_names(self.path),
+                         set(store.get_contact_names()))
+
+    def test_full_iri_and_escapes(self):
+        with open(self.path, 'w') as f:
+            f.write('@prefix x: <http://example.org/#> .\n'
+                    '[] <http://hiea.de/contact#givenName> "A \\"B\\"" .\n'
+                    '[] x:givenName "Not A Contact" .\n')
+        self.assertEqual(scan_rdf_names(self.path), {'A "B"'})
+
+    def test_journal_applied(self):
+        self.copy_rdf_file()
+        store = RDFStore(self.path, config['rdf']['namespace'], journal=True)
+        store.add_contact(Contact("Test Contact"))
+        store.delete_contact("Max_Mustermann")
+        self.assertEqual(scan_rdf_names(self.path),
+                         set(store.get_contact_names()))
+
+    def test_no_heavy_imports(self):
+        code = ('import sys\n'
+                'from ctui.__main__ import main\n'
+                'sys.argv = ["ctui", "--names", "--config", "files/config.ini"]\n'
+                'try:\n'
+                '    main()\n'
+                'except SystemExit:\n'
+                '    pass\n'
+                'print(sorted(m for m in ("rdflib", "gnupg", "urwid")'
+                ' if m in sys.modules))\n')
+        env = dict(os.environ, PYTHONPATH=os.path.abspath('..'))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         env=env, text=True)
+        self.assertEqual(output.splitlines()[-1], '[]')
+        self.assertIn('Max Mustermann', output.splitlines())
+
+
+class TestSQLiteStore(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = SQLiteStore(os.path.join(self.tmp_dir, 'contacts.sqlite'))
+        self.contact = Contact("Test Contact")
+        self.attr1 = Attribute("key1", "value1")
+        self.attr2 = Attribute("key2", "value2")
+
+    def test_contacts(self):
+        self.store.add_contact(self.contact)
+        self.assertTrue(self.store.contains_contact(self.contact.get_id()))
+        self.store.rename_contact(self.contact.get_id(), "Renamed Contact")
+        self.assertEqual(self.store.get_contact_names(), ["Renamed Contact"])
+        self.store.delete_contact("Renamed_Contact")
+        self.assertEqual(self.store.get_contact_names(), [])
+
+    def test_attributes(self):
+        contact_id = self.contact.get_id()
+        self.store.add_attribute(contact_id, self.attr1)
+        self.assertTrue(self.store.has_attributes(contact_id))
+        self.assertTrue(self.store.contains_attribute(self.attr1))
+        self.store.edit_attribute(contact_id, self.attr1, self.attr2)
+        self.assertEqual(self.store.get_attributes(contact_id), [self.attr2])
+        self.store.delete_attribute(contact_id, self.attr2)
+        self.assertFalse(self.store.has_attributes(contact_id))
+        with self.assertRaises(ValueError):
+            self.store.delete_attribute(contact_id, self.attr2)
+
+    def test_delete_contact_with_attributes(self):
+        self.store.add_attribute(self.contact.get_id(), self.attr1)
+        self.store.delete_contact(self.contact.get_id())
+        self.assertFalse(self.store.contains_attribute(self.attr1))
+
+    def test_rollback_on_exception(self):
+        with self.assertRaises(ValueError):
+            with self.store.transaction():
+                self.store.add_attribute(self.contact.get_id(), self.attr1)
+                raise ValueError()
+        self.assertFalse(self.store.contains_contact(self.contact.get_id()))
+
+    def test_import_rdfstore(self):
+        path = self.copy_rdf_file()
+        rdfstore = RDFStore(path, config['rdf']['namespace'])
+        rdfstore.add_attribute("Max_Mustermann", self.attr1)
+        self.assertEqual(self.store.import_rdfstore(rdfstore), 4)
+        self.assertEqual(self.store.get_contact_names(),
+                         rdfstore.get_contact_names())
+        self.assertEqual(self.store.get_attributes("Max_Mustermann"),
+                         [self.attr1])
+
+    def tearDown(self):
+        self.store.close()
+        super().tearDown()
+
+
+class TestShardedRDFStore(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rdf_dir = os.path.join(self.tmp_dir, 'contacts')
+        self.copy_rdf_file()
+        self.namespace = config['rdf']['namespace']
+        self.rdfstore = RDFStore(self.path, self.namespace)
+        ShardedRDFStore.from_rdfstore(self.rdfstore, self.rdf_dir, buckets=8)
+        self.store = ShardedRDFStore(self.rdf_dir, self.namespace)
+        self.attr = Attribute("key1", "value1")
+
+    def get_mtimes(self):
+        return {name: os.stat(os.path.join(self.rdf_dir, name)).st_mtime_ns
+                for name in os.listdir(self.rdf_dir)}
+
+    def test_round_trip(self):
+        path = os.path.join(self.tmp_dir, 'joined.n3')
+        self.store.to_file(path)
+        store = RDFStore(path, self.namespace)
+        self.assertEqual(store.get_contact_names(),
+                         self.rdfstore.get_contact_names())
+        for name in store.get_contact_names():
+            self.assertEqual(store.get_contact_record(Contact.name_to_id(name)),
+                             self.rdfstore.get_contact_record(
+                                 Contact.name_to_id(name)))
+
+    def test_lazy_loading(self):
+        self.assertEqual(self.store.get_contact_names(),
+                         self.rdfstore.get_contact_names())
+        self.assertEqual(self.store.loaded, set())
+        self.assertEqual(self.store.get_attributes("Max_Mustermann"),
+                         self.rdfstore.get_attributes("Max_Mustermann"))
+        self.assertEqual(self.store.loaded,
+                         {self.store.manifest["Max Mustermann"]})
+
+    def test_only_changed_shard_written(self):
+        mtimes = self.get_mtimes()
+        self.store.add_attribute("Max_Mustermann", self.attr)
+        shard = os.path.basename(
+            self.store.get_shard_path(self.store.manifest["Max Mustermann"]))
+        changed = {name for name, mtime in self.get_mtimes().items()
+                   if mtimes.get(name) != mtime}
+        self.assertEqual(changed, {shard, ShardedRDFStore.MANIFEST})
+
+        store = ShardedRDFStore(self.rdf_dir, self.namespace)
+        self.assertTrue(store.has_attribute("Max_Mustermann", self.attr))
+
+    def test_rename_contact(self):
+        self.store.add_attribute("Max_Mustermann", self.attr)
+        self.store.rename_contact("Max_Mustermann", "Moritz Mustermann")
+
+        store = ShardedRDFStore(self.rdf_dir, self.namespace)
+        self.assertFalse(store.contains_contact("Max_Mustermann"))
+        self.assertTrue(store.has_attribute("Moritz_Mustermann", self.attr))
+        self.assertEqual(len(store.get_contact_names()), 4)
+
+    def test_create_and_delete_contact(self):
+        self.store.add_contact(Contact("Test Contact"))
+        self.store.delete_contact("Max_Mustermann")
+
+        store = ShardedRDFStore(self.rdf_dir, self.namespace)
+        self.assertTrue(store.contains_contact("Test_Contact"))
+        self.assertFalse(store.contains_contact("Max_Mustermann"))
+        store.load_all_shards()
+        self.assertEqual(sorted(store.subjects), store.get_contact_names())
+
+    def test_convert_existing(self):
+        with self.assertRaises(ValueError):
+            ShardedRDFStore.from_rdfstore(self.rdfstore, self.rdf_dir)
+
+    def test_scan_names(self):
+        sharded_config = util.load_config(CONFIG_FILE)
+        sharded_config['rdf']['layout'] = 'sharded'
+        sharded_config['path']['rdf_dir'] = self.rdf_dir
+        self.assertEqual(scan_contact_names(sharded_config),
+                         sorted(set(self.rdfstore.get_contact_names()) |
+                                set(scan_contact_names(config))))
+
+
+class TestFileWatcher(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.file = os.path.join(self.tmp_dir, 'contacts.n3')
+        self.dir = os.path.join(self.tmp_dir, 'contacts')
+        os.mkdir(self.dir)
+        write_atomic(self.file, b'a')
+
+    def check_watcher(self, watcher):
+        watcher.set_paths({self.file: False, self.dir: True})
+        self.assertEqual(watcher.poll(), set())
+
+        write_atomic(self.file, b'ab')
+        self.assertEqual(watcher.poll(), {self.file})
+        self.assertEqual(watcher.poll(), set())
+
+        with open(os.path.join(self.dir, 'note.txt'), 'w') as f:
+            f.write('note')
+        self.assertEqual(watcher.poll(), {self.dir})
+        watcher.close()
+
+    def test_polling(self):
+        watcher = FileWatcher(use_inotify=False)
+        self.assertIsNone(watcher.fileno())
+        self.check_watcher(watcher)
+
+    def test_inotify(self):
+        watcher = FileWatcher()
+        if watcher.fileno() is None:
+            self.skipTest('inotify not available')
+        self.check_watcher(watcher)
+
+    def test_missing_path(self):
+        watcher = FileWatcher(use_inotify=False)
+        path = os.path.join(self.dir, 'notes')
+        watcher.set_paths({path: True})
+        os.mkdir(path)
+        self.assertEqual(watcher.poll(), {path})
+
+
+class TestReload(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.config = util.load_config(CONFIG_FILE)
+        self.config['path']['rdf_file'] = self.copy_rdf_file()
+        self.config['path']['textfile_dir'] = self.copy_textfile_dir()
+        self.namespace = config['rdf']['namespace']
+        self.attr = Attribute("key1", "value1")
+
+    def open_store(self):
+        return RDFStore(self.config['path']['rdf_file'], self.namespace)
+
+    def test_rdf_reload(self):
+        store = self.open_store()
+        self.assertEqual(store.reload(), set())
+
+        other = self.open_store()
+        other.add_attribute("Max_Mustermann", self.attr)
+        other.rename_contact("Mia_Mustermann", "Mara Mustermann")
+        other.add_contact(Contact("Test Contact"))
+
+        self.assertEqual(store.reload(), {"Max Mustermann", "Mia Mustermann",
+                                          "Mara Mustermann", "Test Contact"})
+        self.assertTrue(store.has_attribute("Max_Mustermann", self.attr))
+        self.assertEqual(store.get_contact_names(), other.get_contact_names())
+        index = dict(store.contacts)
+        store.build_index()
+        self.assertEqual(index, store.contacts)
+
+    def test_own_changes_ignored(self):
+        store = self.open_store()
+        store.add_attribute("Max_Mustermann", self.attr)
+        self.assertEqual(store.reload(), set())
+
+    def test_sharded_reload(self):
+        rdf_dir = os.path.join(self.tmp_dir, 'sharded')
+        ShardedRDFStore.from_rdfstore(self.open_store(), rdf_dir, buckets=4)
+        store = ShardedRDFStore(rdf_dir, self.namespace)
+        store.get_attributes("Max_Mustermann")
+
+        other = ShardedRDFStore(rdf_dir, self.namespace)
+        other.add_attribute("Max_Mustermann", self.attr)
+        other.add_contact(Contact("Test Contact"))
+
+        self.assertIn("Max Mustermann", store.reload())
+        self.assertTrue(store.has_attribute("Max_Mustermann", self.attr))
+        self.assertTrue(store.contains_contact("Test_Contact"))
+
+    def test_sqlite_reload(self):
+        path = os.path.join(self.tmp_dir, 'contacts.sqlite')
+        store = SQLiteStore(path)
+        store.add_contact(Contact("Test Contact"))
+        self.assertEqual(store.reload(), set())
+
+        other = SQLiteStore(path)
+        other.add_attribute("Test_Contact", self.attr)
+        other.close()
+        self.assertEqual(store.reload(), {"Test Contact"})
+        store.close()
+
+    def test_contact_list_patched(self):
+        core = Core(self.config, True)
+        UI(core, self.config)
+        core.watch_files(use_inotify=False)
+        core.ui.set_focused_contact("Max_Mustermann")
+        entry = core.ui.list_view.focus
+
+        other = self.open_store()
+        other.add_contact(Contact("Aaron Mustermann"))
+        other.delete_contact("Mia_Mustermann")
+        os.mkdir(os.path.join(self.config['path']['textfile_dir'],
+                              'Test_Contact'))
+
+        self.assertTrue(core.reload_changed_files())
+        names = [e.contact.name for e in core.ui.list_view.body]
+        self.assertEqual(names, ["Aaron Mustermann", "Maria Mustermann",
+                                 "Martin Mustermann", "Max Mustermann",
+                                 "Test Contact"])
+        self.assertIs(core.ui.list_view.focus, entry)
+        self.assertFalse(core.reload_changed_files())
+        core.close()
+
+
+class TestAttributeIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.copy_rdf_file()
+        self.store = RDFStore(self.path, config['rdf']['namespace'])
+        self.tel = Attribute("tel", "+49 (170) 123-45")
+        self.email = Attribute("email", "Max@Example.org ")
+
+    def test_normalize_value(self):
+        self.assertEqual(normalize_value("tel", "0049 170 / 123-45"),
+                         "+4917012345")
+        self.assertEqual(normalize_value("mobile", "+49 170 12345"),
+                         "+4917012345")
+        self.assertEqual(normalize_value("email", " Max@Example.org"),
+                         "max@example.org")
+        self.assertEqual(normalize_value("city", " Berlin "), "Berlin")
+        self.assertEqual(normalize_value("tel", " call me "), "call me")
+        self.assertEqual(normalize_value("telegram", "@Alice"), "@Alice")
+        self.assertEqual(normalize_value("mailingAddress", " Main St "),
+                         "Main St")
+
+    def test_find_contacts(self):
+        self.store.add_attribute("Max_Mustermann", self.tel)
+        self.store.add_attribute("Mia_Mustermann", self.tel)
+        self.store.add_attribute("Max_Mustermann", self.email)
+        self.assertEqual(
+            self.store.find_contacts(Attribute("tel", "004917012345")),
+            ["Max Mustermann", "Mia Mustermann"])
+        self.assertEqual(
+            self.store.find_contacts(Attribute("email", "max@example.org")),
+            ["Max Mustermann"])
+        self.assertEqual(self.store.find_contacts(Attribute("tel", "1")), [])
+
+    def test_find_unrelated_keys(self):
+        self.store.add_attribute("Max_Mustermann",
+                                 Attribute("telegram", "@max"))
+        self.store.add_attribute("Mia_Mustermann",
+                                 Attribute("telegram", "@mia"))
+        self.assertEqual(
+            self.store.find_contacts(Attribute("telegram", "@max")),
+            ["Max Mustermann"])
+
+    def test_contains_attribute_exact(self):
+        self.store.add_attribute("Max_Mustermann", self.tel)
+        self.assertTrue(self.store.contains_attribute(self.tel))
+        self.assertFalse(
+            self.store.contains_attribute(Attribute("tel", "+4917012345")))
+
+    def test_index_maintained(self):
+        self.store.add_attribute("Max_Mustermann", self.tel)
+        self.store.add_attribute("Max_Mustermann",
+                                 Attribute("tel", "+4917012345"))
+        self.store.delete_attribute("Max_Mustermann", self.tel)
+        self.assertEqual(self.store.find_contacts(self.tel), ["Max Mustermann"])
+
+        self.store.rename_contact("Max_Mustermann", "Moritz Mustermann")
+        self.assertEqual(self.store.find_contacts(self.tel),
+                         ["Moritz Mustermann"])
+        self.store.delete_contact("Moritz_Mustermann")
+        self.assertEqual(self.store.find_contacts(self.tel), [])
+        self.assertEqual(self.store.attribute_index.owners, {})
+
+    def test_sqlite_find_contacts(self):
+        store = SQLiteStore(os.path.join(self.tmp_dir, 'contacts.sqlite'))
+        store.add_attribute("Max_Mustermann", self.tel)
+        store.edit_attribute("Max_Mustermann", self.tel, self.email)
+        self.assertEqual(
+            store.find_contacts(Attribute("email", "max@example.org")),
+            ["Max Mustermann"])
+        self.assertEqual(store.find_contacts(self.tel), [])
+        store.close()
+
+    def test_sqlite_migration(self):
+        path = os.path.join(self.tmp_dir, 'contacts.sqlite')
+        connection = sqlite3.connect(path)
+        connection.executescript(
+            'CREATE TABLE contacts (id INTEGER PRIMARY KEY, name TEXT);'
+            'CREATE TABLE attributes (contact_id INTEGER, key TEXT, '
+            'value TEXT, UNIQUE (contact_id, key, value));'
+            'INSERT INTO contacts VALUES (1, "Max Mustermann");'
+            'INSERT INTO attributes VALUES (1, "tel", "0049 170 12345");')
+        connection.close()
+
+        store = SQLiteStore(path)
+        self.assertEqual(store.find_contacts(Attribute("tel", "+4917012345")),
+                         ["Max Mustermann"])
+        store.close()
+
+    def test_sqlite_normalized_again(self):
+        path = os.path.join(self.tmp_dir, 'contacts.sqlite')
+        SQLiteStore(path).close()
+        connection = sqlite3.connect(path)
+        connection.executescript(
+            'PRAGMA user_version = 0;'
+            'INSERT INTO contacts VALUES (1, "Max Mustermann");'
+            'INSERT INTO contacts VALUES (2, "Mia Mustermann");'
+            'INSERT INTO attributes VALUES (1, "telegram", "@max", "");'
+            'INSERT INTO attributes VALUES (2, "telegram", "@mia", "");')
+        connection.close()
+
+        store = SQLiteStore(path)
+        self.assertEqual(store.find_contacts(Attribute("telegram", "@max")),
+                         ["Max Mustermann"])
+        store.close()
+
+    def test_find_command(self):
+        core = Core(config, True)
+        UI(core, config)
+        core.rdfstore = self.store
+        self.store.add_attribute("Mia_Mustermann", self.tel)
+
+        core.ui.console.handle(['find', 'tel', '+4917012345'])
+        self.assertEqual(core.ui.get_focused_contact().name, "Mia Mustermann")
+        self.assertEqual(core.ui.console.body.text, "Mia Mustermann")
+
+        core.ui.console.handle(['find', 'tel', '1'])
+        self.assertEqual(core.ui.console.body.text, "No contact with tel=1")
+
+
+class TestParallelParser(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.copy_rdf_file()
+        store = RDFStore(self.path, config['rdf']['namespace'])
+        for name in store.get_contact_names():
+            contact_id = Contact.name_to_id(name)
+            store.add_attribute(contact_id, Attribute("email", f'{name} .'))
+            store.add_attribute(contact_id, Attribute("note", 'a "b" c'))
+
+    def test_split(self):
+        with open(self.path) as f:
+            header, chunks = split_n3(f.read(), 3)
+        self.assertTrue(header.startswith('@prefix'))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(sum(chunk.count('givenName') for chunk in chunks), 4)
+
+    def test_unsplittable(self):
+        self.assertIsNone(split_n3('_:a <http://a#b> "c" .\n', 2))
+        self.assertIsNone(split_n3('[] <http://a#b> """c\n\nd""" .\n', 2))
+
+    def create_contacts(self, count):
+        path = os.path.join(self.tmp_dir, 'many.n3')
+        shutil.copy(self.path, path)
+        store = RDFStore(path, config['rdf']['namespace'])
+        with store.transaction():
+            for i in range(count):
+                contact_id = f'Contact_{i}'
+                store.add_contact(Contact(Contact.id_to_name(contact_id)))
+                store.add_attribute(contact_id,
+                                    Attribute("email", f'email value {i}'))
+                store.add_attribute(contact_id,
+                                    Attribute("tel", f'tel value {i}'))
+        store.close()
+        return path
+
+    def test_parse_equals_serial(self):
+        path = self.create_contacts(300)
+        serial = Graph()
+        serial.parse(path, format='n3')
+        parallel = parse_n3(path, 4, min_size=0)
+        self.assertEqual(len(set(serial.subjects())), 304)
+        self.assertEqual(len(set(parallel.subjects())), 304)
+        self.assertTrue(isomorphic(serial, parallel))
+        self.assertEqual(dict(serial.namespaces())['c'],
+                         dict(parallel.namespaces())['c'])
+
+    def test_store_load_many(self):
+        path = self.create_contacts(300)
+        store = RDFStore(path, config['rdf']['namespace'],
+                         parse_workers=4, parse_min_size=0)
+        self.assertEqual(len(store.get_contact_names()), 304)
+        for i in range(300):
+            self.assertEqual(
+                sorted(store.get_attributes(f'Contact_{i}'),
+                       key=lambda attr: attr.key),
+                [Attribute("email", f'email value {i}'),
+                 Attribute("tel", f'tel value {i}')])
+
+    def test_store_load(self):
+        store = RDFStore(self.path, config['rdf']['namespace'],
+                         parse_workers=2, parse_min_size=0)
+        self.assertEqual(len(store.get_contact_names()), 4)
+        self.assertTrue(store.has_attribute(
+            "Max_Mustermann", Attribute("email", "Max Mustermann .")))
+
+
+class TestURISubjects(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.copy_rdf_file()
+        self.namespace = config['rdf']['namespace']
+        self.attr = Attribute("key1", "value1")
+        store = RDFStore(self.path, self.namespace)
+        store.add_attribute("Max_Mustermann", self.attr)
+
+    def open_store(self, **kwargs):
+        return RDFStore(self.path, self.namespace, uri_subjects=True, **kwargs)
+
+    def assertMigrated(self, store):
+        for name, s in store.subjects.items():
+            self.assertEqual(
+                s, store.get_contact_uri(Contact.name_to_id(name)))
+
+    def test_migration(self):
+        store = self.open_store()
+        self.assertMigrated(store)
+        self.assertTrue(store.has_attribute("Max_Mustermann", self.attr))
+
+        with open(self.path) as f:
+            self.assertNotIn('[]', f.read())
+        store = RDFStore(self.path, self.namespace)
+        self.assertMigrated(store)
+        self.assertEqual(store.migrate_subjects(), 0)
+        self.assertEqual(sorted(scan_rdf_names(self.path)),
+                         store.get_contact_names())
+
+    def test_direct_lookup(self):
+        store = self.open_store()
+        uri = URIRef(self.namespace + 'contact/Max_Mustermann')
+        self.assertEqual(store.get_subject("Max_Mustermann"), uri)
+        self.assertIsNone(store.get_subject("Nobody"))
+
+    def test_contact_changes(self):
+        store = self.open_store()
+        store.add_contact(Contact("Test Contact"))
+        store.rename_contact("Max_Mustermann", "Moritz Mustermann")
+        store.delete_contact("Mia_Mustermann")
+        self.assertMigrated(store)
+        self.assertTrue(store.has_attribute("Moritz_Mustermann", self.attr))
+        self.assertFalse(store.contains_contact("Max_Mustermann"))
+
+        store = RDFStore(self.path, self.namespace)
+        self.assertMigrated(store)
+        self.assertEqual(store.get_contact_names(),
+                         ["Maria Mustermann", "Martin Mustermann",
+                          "Moritz Mustermann", "Test Contact"])
+
+    def test_journal_replay(self):
+        self.open_store()
+        store = self.open_store(journal=True)
+        store.add_contact(Contact("Test Contact"))
+        store.rename_contact("Max_Mustermann", "Moritz Mustermann")
+
+        store = self.open_store(journal=True)
+        self.assertMigrated(store)
+        self.assertTrue(store.has_attribute("Moritz_Mustermann", self.attr))
+        self.assertTrue(store.contains_contact("Test_Contact"))
+
+    def test_sharded_migration(self):
+        rdf_dir = os.path.join(self.tmp_dir, 'sharded')
+        ShardedRDFStore.from_rdfstore(RDFStore(self.path, self.namespace),
+                                      rdf_dir, buckets=4)
+        store = ShardedRDFStore(rdf_dir, self.namespace, uri_subjects=True)
+        # shards are migrated when they are loaded
+        self.assertTrue(store.has_attribute("Max_Mustermann", self.attr))
+        self.assertEqual(store.get_subject("Max_Mustermann"),
+                         store.get_contact_uri("Max_Mustermann"))
+        store.load_all_shards()
+        store.save_file(rdf_dir)
+
+        store = ShardedRDFStore(rdf_dir, self.namespace)
+        store.load_all_shards()
+        self.assertMigrated(store)
+
+
+class TestDirectoryCache(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = DirectoryCache()
+        self.cache.racy_interval_ns = 0
+        self.copy_textfile_dir()
+        self.store = TextFileStore(self.textfile_dir,
+                                   config['encryption']['keyid'])
+        self.store.cache = self.cache
+
+    def touch(self, path, content=''):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def bump_mtime(self, path):
+        # changes within the timestamp granularity don't change the mtime
+        mtime_ns = os.stat(path).st_mtime_ns + 1_000_000_000
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    def test_listing_cached(self):
+        self.touch(os.path.join(self.tmp_dir, 'a'), 'abc')
+        entries = self.cache.list(self.tmp_dir)
+        self.assertEqual(entries['a'].size, 3)
+        self.assertTrue(entries['contacts'].is_dir)
+        listing = self.cache.listings[self.tmp_dir]
+        self.cache.list(self.tmp_dir)
+        self.assertIs(self.cache.listings[self.tmp_dir], listing)
+        self.assertIsNone(self.cache.list(os.path.join(self.tmp_dir, 'b')))
+
+    def test_mtime_invalidates(self):
+        self.cache.list(self.tmp_dir)
+        self.touch(os.path.join(self.tmp_dir, 'a'))
+        self.bump_mtime(self.tmp_dir)
+        self.assertIn('a', self.cache.list(self.tmp_dir))
+
+    def test_racy_listing(self):
+        self.cache.racy_interval_ns = 60 * 1_000_000_000
+        self.cache.list(self.tmp_dir)
+        listing = self.cache.listings[self.tmp_dir]
+        self.assertTrue(listing.racy)
+        self.cache.list(self.tmp_dir)
+        self.assertIsNot(self.cache.listings[self.tmp_dir], listing)
+
+    def test_update(self):
+        self.cache.list(self.tmp_dir)
+        listing = self.cache.listings[self.tmp_dir]
+        path = os.path.join(self.tmp_dir, 'a')
+        self.touch(path)
+        self.cache.update(path)
+        self.assertIn('a', self.cache.list(self.tmp_dir))
+        os.remove(path)
+        self.cache.update(path)
+        self.assertNotIn('a', self.cache.list(self.tmp_dir))
+        self.assertIs(self.cache.listings[self.tmp_dir], listing)
+
+    def test_textfile_store(self):
+        contact_id = "Max_Mustermann"
+        self.assertEqual(self.store.get_contact_names(), ["Max Mustermann"])
+        self.assertTrue(self.store.contains_contact(contact_id))
+        self.assertFalse(self.store.contains_contact("Nobody"))
+        has_notes = self.store.has_notes(contact_id)
+
+        note = Note("20000101", "content")
+        self.store.add_note(contact_id, note)
+        self.assertTrue(self.store.has_notes(contact_id))
+        self.assertTrue(self.store.has_note(contact_id, "20000101"))
+        self.store.delete_note(contact_id, "20000101")
+        self.assertFalse(self.store.has_note(contact_id, "20000101"))
+        self.assertEqual(self.store.has_notes(contact_id), has_notes)
+
+        self.store.rename_contact(contact_id, "Moritz Mustermann")
+        self.assertFalse(self.store.contains_contact(contact_id))
+        self.assertTrue(self.store.contains_contact("Moritz_Mustermann"))
+        self.assertEqual(self.store.has_notes("Moritz_Mustermann"), has_notes)
+
+    def test_external_change(self):
+        self.store.get_contact_names()
+        os.mkdir(os.path.join(self.textfile_dir, 'Test_Contact'))
+        self.bump_mtime(self.textfile_dir)
+        self.assertTrue(self.store.contains_contact("Test_Contact"))
+
+
+class TestGiftCache(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.copy_textfile_dir()
+        self.store = TextFileStore(self.textfile_dir,
+                                   config['encryption']['keyid'])
+        self.contact_id = "Max_Mustermann"
+        self.gift = Gift("Doughnuts", "with chocolate", permanent=True,
+                         occasions=[])
+
+    def test_lru(self):
+        cache = GiftCache(2)
+        cache.put('a', 1, 1, Gift("A"))
+        cache.put('b', 1, 1, Gift("B"))
+        self.assertEqual(cache.get('a', 1, 1).name, "A")
+        cache.put('c', 1, 1, Gift("C"))
+        self.assertIsNone(cache.get('b', 1, 1))
+        self.assertIsNone(cache.get('a', 2, 1))
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_copies(self):
+        cache = GiftCache()
+        gift = Gift("A", occasions=['birthday'])
+        cache.put('a', 1, 1, gift)
+        gift.occasions.append('christmas')
+        cache.get('a', 1, 1).gifted = True
+        self.assertEqual(cache.get('a', 1, 1), Gift("A", occasions=['birthday']))
+
+    def test_unchanged_files_not_parsed(self):
+        self.assertEqual(self.store.get_gifts(self.contact_id), [self.gift])
+        self.assertEqual(self.store.get_gifts(self.contact_id), [self.gift])
+        self.assertEqual(self.store.get_gift(self.contact_id, "Doughnuts"),
+                         self.gift)
+        self.assertEqual((self.store.gift_cache.hits,
+                          self.store.gift_cache.misses), (2, 1))
+
+    def test_writers_refresh(self):
+        self.store.mark_gifted(self.contact_id, "Doughnuts")
+        misses = self.store.gift_cache.misses
+        gift = self.store.get_gift(self.contact_id, "Doughnuts")
+        self.assertEqual(self.store.gift_cache.misses, misses)
+        filepath = self.store.get_gift_filepath(self.contact_id, "Doughnuts")
+        with open(filepath) as f:
+            self.assertEqual(gift, Gift.from_dump("Doughnuts", f.read()))
+        self.assertTrue(gift.gifted)
+
+    def test_external_change(self):
+        self.store.get_gifts(self.contact_id)
+        filepath = self.store.get_gift_filepath(self.contact_id, "Doughnuts")
+        with open(filepath, 'w') as f:
+            f.write('desc: with sprinkles')
+        self.assertEqual(
+            self.store.get_gift(self.contact_id, "Doughnuts").desc,
+            "with sprinkles")
+
+
+class TestGiftCodec(unittest.TestCase):
+
+    def yaml_dump(self, data):
+        return yaml.dump(data, default_flow_style=False,
+                         allow_unicode=True).strip()
+
+    def test_flat_matches_yaml(self):
+        data = {'desc': "size M, dark blue", 'gifted': True,
+                'occasions': ['birthday', 'christmas'], 'permanent': False}
+        dump = gift_codec.dump_flat(data)
+        self.assertEqual(dump, self.yaml_dump(data))
+        self.assertEqual(gift_codec.load_flat(dump), data)
+
+    def test_fallback(self):
+        for desc in ["Yes", "10", "a: b", " padded", "multi\nline", "",
+                     "x" * 100, "#hash", "ünïcode wörds"]:
+            data = {'desc': desc, 'occasions': []}
+            dump = gift_codec.dump(data)
+            self.assertEqual(dump, self.yaml_dump(data))
+            self.assertEqual(gift_codec.load(dump), data)
+            self.assertEqual(yaml.safe_load(dump), data)
+
+    def test_load_rejects_unknown(self):
+        self.assertIsNone(gift_codec.load_flat('desc: "quoted"'))
+        self.assertIsNone(gift_codec.load_flat('gifted: yes'))
+        self.assertIsNone(gift_codec.load_flat('other: value'))
+        self.assertIsNone(gift_codec.load_flat('desc: a\ndesc: b'))
+        self.assertEqual(gift_codec.load('desc: "quoted"'),
+                         {'desc': 'quoted'})
+
+    def test_gift_file(self):
+        path = os.path.join(config['path']['textfile_dir'],
+                            'Max_Mustermann/gifts/Doughnuts.yaml')
+        with open(path) as f:
+            dump = f.read()
+        gift = Gift.from_dump("Doughnuts", dump)
+        self.assertEqual(gift, Gift("Doughnuts", "with chocolate",
+                                    permanent=True, occasions=[]))
+        self.assertEqual(gift.to_dump(), dump.strip())
+
+
+class TestLazyNotes(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = TextFileStore(self.tmp_dir, config['encryption']['keyid'],
+                                   note_preview_bytes=64, note_preview_lines=3,
+                                   note_mmap_size=1024)
+        self.contact_id = "Max_Mustermann"
+        self.short = Note("20000101", "short note")
+        self.long = Note("20000102", "\n".join(
+            f"line {i} äöü" for i in range(500)))
+        self.store.add_note(self.contact_id, self.short)
+        self.store.add_note(self.contact_id, self.long)
+
+    def test_preview(self):
+        short, long = self.store.get_notes(self.contact_id)
+        self.assertIsInstance(long, LazyNote)
+        self.assertTrue(short.complete)
+        self.assertEqual(short.get_preview(), "short note")
+        self.assertFalse(long.complete)
+        self.assertFalse(long.is_loaded())
+        self.assertEqual(long.get_preview(),
+                         "line 0 äöü\nline 1 äöü\nline 2 äöü …")
+
+    def test_content_loaded_on_demand(self):
+        long = self.store.get_notes(self.contact_id)[1]
+        self.assertEqual(long.content, self.long.content)
+        self.assertTrue(long.is_loaded())
+        self.assertEqual(long.get_preview(), self.long.content)
+
+    def test_cut_multibyte_character(self):
+        preview, complete = make_preview(('ä' * 100).encode(), 63, 10)
+        self.assertFalse(complete)
+        self.assertEqual(preview, 'ä' * 31)
+
+        # the store reads note_preview_bytes + 1 bytes for the preview
+        self.store.add_note(self.contact_id,
+                            Note("20000103", 'a' + 'ä' * 100))
+        note = self.store.get_notes(self.contact_id)[2]
+        self.assertFalse(note.complete)
+        self.assertEqual(note.get_preview(), 'a' + 'ä' * 31 + ' …')
+
+    def test_make_preview(self):
+        self.assertEqual(make_preview(b' a\nb \n', 64, 3), ('a\nb', True))
+        self.assertEqual(make_preview(b'a\nb\n\n', 64, 2), ('a\nb', True))
+        self.assertEqual(make_preview(b'a\nb\nc', 64, 2), ('a\nb', False))
+        self.assertEqual(make_preview(b'abcde', 4, 2), ('abcd', False))
+
+    def test_mmap(self):
+        filepath = self.store.get_note_filepath(self.contact_id,
+                                                self.long.note_id)
+        self.assertEqual(read_content(filepath, 1024), self.long.content)
+        self.assertEqual(read_content(filepath, 10 ** 9), self.long.content)
+        open(filepath, 'w').close()
+        self.assertEqual(read_content(filepath, 0), '')
+
+
+class TestPackFile(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.copy_textfile_dir()
+        self.store = TextFileStore(self.textfile_dir,
+                                   config['encryption']['keyid'])
+        self.contact_id = "Max_Mustermann"
+        self.note = Note("20000101", "first line\nsecond line")
+        self.store.add_note(self.contact_id, self.note)
+        self.pack_path = os.path.join(self.tmp_dir, 'test.pack')
+
+    def test_append_and_reopen(self):
+        pack = PackFile(self.pack_path)
+        pack.put('notes', '20000101.txt', b'a b\nc')
+        pack.put('gifts', 'With space.yaml', b'desc: x')
+        pack.put('notes', '20000101.txt', b'new')
+        pack.delete('gifts', 'With space.yaml')
+        pack.put('gifts', 'Other.yaml', b'')
+
+        pack = PackFile(self.pack_path)
+        self.assertEqual(pack.names('notes'), ['20000101.txt'])
+        self.assertEqual(pack.names('gifts'), ['Other.yaml'])
+        self.assertEqual(pack.read('notes', '20000101.txt'), b'new')
+        self.assertEqual(pack.read('notes', '20000101.txt', 2), b'ne')
+        self.assertEqual(pack.read('gifts', 'Other.yaml'), b'')
+
+    def test_incomplete_record(self):
+        pack = PackFile(self.pack_path)
+        pack.put('notes', 'a.txt', b'complete')
+        with open(self.pack_path, 'ab') as f:
+            f.write(b'+ notes/b.txt 100\ncut off')
+
+        pack = PackFile(self.pack_path)
+        self.assertEqual(pack.names('notes'), ['a.txt'])
+        pack.put('notes', 'c.txt', b'after')
+        self.assertEqual(PackFile(self.pack_path).names('notes'),
+                         ['a.txt', 'c.txt'])
+
+    def test_compact(self):
+        pack = PackFile(self.pack_path)
+        for i in range(10):
+            pack.put('notes', 'a.txt', b'x' * 10000 + str(i).encode())
+        pack.put('notes', 'b.txt', b'b')
+        pack.compact()
+        self.assertEqual(pack.garbage, 0)
+        self.assertLess(os.path.getsize(self.pack_path), 10100)
+        self.assertEqual(pack.read('notes', 'a.txt'), b'x' * 10000 + b'9')
+        self.assertEqual(pack.read('notes', 'b.txt'), b'b')
+
+    def test_pack_contact(self):
+        gifts = self.store.get_gifts(self.contact_id)
+        self.assertEqual(self.store.pack_contact(self.contact_id),
+                         'Packed 3 files')
+        contact_dir = self.store.get_textfile_path(self.contact_id)
+        self.assertEqual(os.listdir(contact_dir), ['textfiles.pack'])
+
+        self.assertTrue(self.store.is_packed(self.contact_id))
+        self.assertEqual(self.store.get_gifts(self.contact_id), gifts)
+        self.assertEqual(self.store.get_notes(self.contact_id)[0].content,
+                         self.note.content)
+        with self.assertRaises(ValueError):
+            self.store.pack_contact(self.contact_id)
+
+    def test_store_operations_when_packed(self):
+        self.store.pack_contact(self.contact_id)
+
+        self.store.add_note(self.contact_id, Note("20000102", "second"))
+        self.store.rename_note(self.contact_id, "20000101", "20000103")
+        self.store.edit_note(self.contact_id, "20000102",
+                             Note("20000102", "edited"))
+        self.assertEqual(
+            [n.note_id for n in self.store.get_notes(self.contact_id)],
+            ["20000102", "20000103", "20240524"])
+        self.assertEqual(
+            self.store.get_note(self.contact_id, "20000102").content,
+            "edited")
+        self.store.delete_note(self.contact_id, "20000102")
+
+        self.store.mark_gifted(self.contact_id, "Doughnuts")
+        self.store.rename_gift(self.contact_id, "Doughnuts", "Cake")
+        self.assertTrue(self.store.get_gift(self.contact_id, "Cake").gifted)
+        self.assertFalse(self.store.has_gift(self.contact_id, "Doughnuts"))
+
+        contact_dir = self.store.get_textfile_path(self.contact_id)
+        self.assertEqual(os.listdir(contact_dir), ['textfiles.pack'])
+
+        # changes by another program
+        other = TextFileStore(self.textfile_dir, config['encryption']['keyid'])
+        other.add_note(self.contact_id, Note("20000104", "other"))
+        self.assertTrue(self.store.has_note(self.contact_id, "20000104"))
+
+    def test_unpack_contact(self):
+        self.store.pack_contact(self.contact_id)
+        self.store.add_note(self.contact_id, Note("20000102", "second"))
+        self.assertEqual(self.store.unpack_contact(self.contact_id),
+                         'Unpacked 4 files')
+
+        self.assertFalse(self.store.is_packed(self.contact_id))
+        notes_dir = self.store.get_textfile_path_by_type(self.contact_id,
+                                                         'notes')
+        self.assertEqual(sorted(os.listdir(notes_dir)),
+                         ['20000101.txt', '20000102.txt', '20240524.txt'])
+        with open(self.store.get_note_filepath(self.contact_id,
+                                               "20000101")) as f:
+            self.assertEqual(f.read(), self.note.content)
+        self.assertEqual(self.store.get_gift(self.contact_id, "Doughnuts"),
+                         Gift("Doughnuts", "with chocolate", permanent=True,
+                              occasions=[]))
+
+
+
+@unittest.skipUnless(shutil.which('gpg'), 'gpg is not installed')
+class TestEncryption(TempDirTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gnupg_home = tempfile.mkdtemp()
+        cls.gpg = gnupg.GPG(gnupghome=cls.gnupg_home)
+        cls.gpg.gen_key(cls.gpg.gen_key_input(
+            key_type='RSA', key_length=1024, name_email='test@example.com',
+            no_protection=True))
+        cls.keyid = cls.gpg.list_keys()[0]['keyid']
+
+    def setUp(self):
+        super().setUp()
+        self.store = TextFileStore(self.tmp_dir, self.keyid)
+        self.store.gpg = self.gpg
+        self.contact_id = "Max_Mustermann"
+        self.notes_dir = self.store.get_textfile_path_by_type(self.contact_id,
+                                                              'notes')
+
+    def test_add_encrypted_note(self):
+        self.store.add_encrypted_note(self.contact_id,
+                                      Note("20000101", "secret"))
+        self.assertEqual(os.listdir(self.notes_dir), ['20000101.txt.gpg'])
+        with open(os.path.join(self.notes_dir, '20000101.txt.gpg'), 'rb') as f:
+            self.assertNotIn(b'secret', f.read())
+
+        before = FileWatcher.get_signature(self.notes_dir, True)
+        self.assertEqual(
+            self.store.get_encrypted_note_text(self.contact_id, "20000101"),
+            "secret")
+        self.assertEqual(FileWatcher.get_signature(self.notes_dir, True),
+                         before)
+
+    def test_encrypt_decrypt(self):
+        for packed in (False, True):
+            if packed:
+                self.store.pack_contact(self.contact_id)
+            self.store.add_note(self.contact_id, Note("20000102", "plain"))
+
+            self.store.encrypt_note(self.contact_id, "20000102")
+            self.assertTrue(
+                self.store.note_is_encrypted(self.contact_id, "20000102"))
+            self.assertEqual(
+                [type(n) for n in self.store.get_notes(self.contact_id)],
+                [EncryptedNote])
+
+            self.assertEqual(
+                self.store.decrypt_note(self.contact_id, "20000102"),
+                "Note decrypted")
+            self.assertEqual(
+                self.store.get_note(self.contact_id, "20000102").content,
+                "plain")
+            self.store.delete_note(self.contact_id, "20000102")
+
+    def test_jobs(self):
+        self.store.add_note(self.contact_id, Note("20000101", "plain"))
+        job = self.store.prepare_encrypt_note(self.contact_id, "20000101")
+
+        # nothing changes until the result is applied
+        with ThreadPoolExecutor(1) as executor:
+            status = executor.submit(job.run).result()
+        self.assertFalse(
+            self.store.note_is_encrypted(self.contact_id, "20000101"))
+        self.assertEqual(job.apply(status), 'Note encrypted (ok: True)')
+        self.assertTrue(
+            self.store.note_is_encrypted(self.contact_id, "20000101"))
+
+        job = self.store.prepare_get_encrypted_note_text(self.contact_id,
+                                                         "20000101")
+        self.assertEqual(job.execute(), "plain")
+
+    def test_key_check_in_job(self):
+        self.store.add_note(self.contact_id, Note("20000101", "plain"))
+        lookups = []
+        self.store.keyring_cache = KeyringCache(
+            lambda: lookups.append(threading.current_thread()) or False,
+            self.store.keyring_cache.get_home)
+
+        job = self.store.prepare_encrypt_note(self.contact_id, "20000101")
+        self.assertEqual(lookups, [])
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(job.run)
+            self.assertRaisesRegex(ValueError, 'GPG key not found',
+                                   future.result)
+        self.assertIsNot(lookups[0], threading.current_thread())
+
+    def test_decrypt_notes(self):
+        note_ids = [f'2000010{i}' for i in range(1, 5)]
+        for note_id in note_ids:
+            self.store.add_encrypted_note(self.contact_id,
+                                          Note(note_id, f'secret {note_id}'))
+        self.store.add_note(self.contact_id, Note("20000105", "plain"))
+        os.rename(self.store.get_note_filepath(self.contact_id, "20000105"),
+                  self.store.get_note_filepath(self.contact_id, "20000105")
+                  + '.gpg')
+
+        results = []
+        pool = WorkerPool(urwid.MainLoop(urwid.SolidFill()), 2)
+        futures = self.store.decrypt_notes(
+            self.contact_id, note_ids + ["20000105"], pool.submit,
+            lambda note_id, text, error: results.append((note_id, text)))
+        for future in futures:
+            future.exception()
+        pool.deliver()
+        pool.shutdown()
+        self.assertEqual(dict(results), dict(
+            [(note_id, f'secret {note_id}') for note_id in note_ids] +
+            [("20000105", None)]))
+
+    def run_decryption(self, core):
+        while core.decryption:
+            for future in core.decryption:
+                if not future.cancelled():
+                    future.exception()
+            core.gpg_pool.deliver()
+
+    def test_show_encrypted_notes(self):
+        note_ids = [f'2000010{i}' for i in range(1, 7)]
+        for note_id in note_ids:
+            self.store.add_encrypted_note(self.contact_id,
+                                          Note(note_id, f'secret {note_id}'))
+
+        core = Core(config, True)
+        UI(core, config)
+        core.textfilestore = self.store
+        core.gpg_workers = 3
+        core.show_encrypted_notes(self.contact_id, note_ids)
+        self.run_decryption(core)
+        self.assertEqual(
+            {note.note_id: note.content
+             for note in core.memorystore.get_notes(self.contact_id)},
+            {note_id: f'secret {note_id}' for note_id in note_ids})
+        self.assertEqual(core.ui.console.body.text,
+                         "Show content of all encrypted notes")
+
+        # cancelling skips the notes not started yet
+        core.memorystore.delete_all_notes(self.contact_id)
+        core.gpg_workers = 1
+        core.gpg_pool.shutdown()
+        core.gpg_pool = None
+        core.show_encrypted_notes(self.contact_id, note_ids)
+        self.assertTrue(core.cancel_decryption())
+        self.run_decryption(core)
+        self.assertIsNone(core.decryption)
+        self.assertLess(len(core.memorystore.get_notes(self.contact_id)), 6)
+        self.assertTrue(
+            core.ui.console.body.text.startswith("Decryption cancelled"))
+        core.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.gnupg_home, ignore_errors=True)
+
+
+class TestKeyringCache(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.pubring = os.path.join(self.home, 'pubring.kbx')
+        open(self.pubring, 'w').close()
+        self.lookups = 0
+
+    def lookup(self):
+        self.lookups = self.lookups + 1
+        return True
+
+    def test_cached(self):
+        cache = KeyringCache(self.lookup, lambda: self.home)
+        self.assertTrue(cache.get())
+        self.assertTrue(cache.get())
+        self.assertEqual(self.lookups, 1)
+
+    def test_keyring_changed(self):
+        cache = KeyringCache(self.lookup, lambda: self.home)
+        cache.get()
+        mtime_ns = os.stat(self.pubring).st_mtime_ns
+        os.utime(self.pubring, ns=(mtime_ns, mtime_ns + 1000))
+        cache.get()
+        os.mkdir(os.path.join(self.home, 'private-keys-v1.d'))
+        cache.get()
+        self.assertEqual(self.lookups, 3)
+
+    def test_ttl(self):
+        cache = KeyringCache(self.lookup, lambda: self.home, ttl=0)
+        cache.get()
+        cache.get()
+        self.assertEqual(self.lookups, 2)
+
+    def test_warm(self):
+        cache = KeyringCache(self.lookup, lambda: self.home)
+        cache.warm().join()
+        cache.get()
+        self.assertEqual(self.lookups, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.home)
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(urwid.MainLoop(urwid.SolidFill()), 3)
+        self.results = []
+
+    def callback(self, name):
+        return lambda result, error: self.results.append(
+            (name, result, error))
+
+    def test_submission_order(self):
+        first_may_finish = threading.Event()
+
+        def slow():
+            first_may_finish.wait(1)
+            return 1
+
+        self.pool.submit(slow, self.callback('slow'))
+        self.pool.submit(lambda: 2, self.callback('fast'))
+        self.pool.jobs[1][0].result()
+
+        # the second job is done, but waits for the first one
+        self.pool.deliver()
+        self.assertEqual(self.results, [])
+        self.assertTrue(self.pool.has_pending())
+
+        first_may_finish.set()
+        self.pool.jobs[0][0].result()
+        self.pool.deliver()
+        self.assertEqual(self.results, [('slow', 1, None), ('fast', 2, None)])
+        self.assertFalse(self.pool.has_pending())
+
+    def test_error(self):
+        def failing():
+            raise ValueError('failed')
+
+        self.pool.submit(failing, self.callback('failing'))
+        self.pool.jobs[0][0].exception()
+        self.pool.deliver()
+        name, result, error = self.results[0]
+        self.assertIsNone(result)
+        self.assertEqual(str(error), 'failed')
+
+    def test_cancel(self):
+        first_may_finish = threading.Event()
+        pool = WorkerPool(urwid.MainLoop(urwid.SolidFill()), 1)
+        pool.submit(lambda: first_may_finish.wait(1), self.callback('first'))
+        future = pool.submit(lambda: 2, self.callback('second'))
+        self.assertTrue(future.cancel())
+        first_may_finish.set()
+        pool.jobs[0][0].result()
+        pool.deliver()
+        self.assertEqual(self.results[0], ('first', True, None))
+        name, result, error = self.results[1]
+        self.assertIsInstance(error, CancelledError)
+        pool.shutdown()
+
+    def test_find_gpg_command(self):
+        self.assertIs(Command.find('encrypt-note'), EncryptNote)
+        self.assertIs(Command.find('find'), FindContact)
+        self.assertIsNone(Command.find('unknown'))
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+
+class TestFullTextIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.copy_textfile_dir()
+        self.store = TextFileStore(self.textfile_dir,
+                                   config['encryption']['keyid'],
+                                   fulltext_cache_dir=self.cache_dir)
+        self.contact_id = "Max_Mustermann"
+
+    def test_ranking(self):
+        index = FullTextIndex(self.tmp_dir)
+        index.update('a', 1, 'red apple and green pear')
+        index.update('b', 1, 'green apple')
+        index.update('c', 1, 'apple pie with apple and cinnamon')
+        self.assertEqual([key for score, key in index.search('Apple')],
+                         ['c', 'b', 'a'])
+        self.assertEqual([key for score, key in index.search('green apple')],
+                         ['b', 'a'])
+        self.assertEqual(index.search('apple banana'), [])
+        self.assertEqual(index.search('!'), [])
+
+    def test_remove_and_rename(self):
+        index = FullTextIndex(self.tmp_dir)
+        index.update('a', 1, 'apple')
+        index.rename('a', 'b', 2)
+        self.assertEqual(index.get_stamp('b'), 2)
+        self.assertEqual([key for score, key in index.search('apple')], ['b'])
+        index.remove('b')
+        self.assertEqual(index.postings, {})
+
+    def test_persistence(self):
+        index = FullTextIndex(self.tmp_dir, self.cache_dir)
+        index.update('a', 1, 'apple')
+        index.save()
+        self.assertEqual(
+            FullTextIndex(self.tmp_dir, self.cache_dir).search('apple'),
+            index.search('apple'))
+        self.assertEqual(
+            FullTextIndex(self.textfile_dir, self.cache_dir).search('apple'),
+            [])
+
+    def test_search_notes_and_gifts(self):
+        self.assertEqual(self.store.search_notes('some note'),
+                         [(self.contact_id, 'notes', '20240524')])
+        self.assertEqual(self.store.search_notes('chocolate'),
+                         [(self.contact_id, 'gifts', 'Doughnuts')])
+        self.assertEqual(self.store.search_notes('doughnuts'),
+                         [(self.contact_id, 'gifts', 'Doughnuts')])
+
+    def test_writers_update_index(self):
+        self.store.search_notes('note')
+        self.store.add_note(self.contact_id, Note("20000101", "met at the lake"))
+        self.assertEqual(
+            self.store.fulltext_index.search('lake')[0][1],
+            'Max_Mustermann/notes/20000101.txt')
+        self.store.edit_note(self.contact_id, "20000101",
+                             Note("20000101", "met in the mountains"))
+        self.assertEqual(self.store.fulltext_index.search('lake'), [])
+        self.store.rename_note(self.contact_id, "20000101", "20000102")
+        self.store.add_gift(self.contact_id, Gift("Boots", "for the mountains"))
+        self.assertEqual(self.store.search_notes('mountains'), [
+            (self.contact_id, 'gifts', 'Boots'),
+            (self.contact_id, 'notes', '20000102')])
+        self.store.delete_note(self.contact_id, "20000102")
+        self.store.delete_gift(self.contact_id, "Boots")
+        self.assertEqual(self.store.fulltext_index.search('mountains'), [])
+
+    def test_only_changed_files_read(self):
+        self.store.search_notes('note')
+        self.store.close()
+
+        # a new store loads the index and only reads the changed file
+        note_path = self.store.get_note_filepath(self.contact_id, "20240524")
+        with open(note_path, 'w') as f:
+            f.write('changed by hand')
+        store = TextFileStore(self.textfile_dir,
+                              config['encryption']['keyid'],
+                              fulltext_cache_dir=self.cache_dir)
+        read = []
+        read_entry = store.read_entry
+        store.read_entry = lambda *args: read.append(args) or read_entry(*args)
+        self.assertEqual(store.search_notes('hand'),
+                         [(self.contact_id, 'notes', '20240524')])
+        self.assertEqual(read, [(self.contact_id, 'notes', '20240524.txt')])
+
+    def test_edited_in_place(self):
+        self.assertEqual(self.store.search_notes('note'),
+                         [(self.contact_id, 'notes', '20240524')])
+        note_path = self.store.get_note_filepath(self.contact_id, "20240524")
+        stat = os.stat(note_path)
+        with open(note_path, 'w') as f:
+            f.write('rewritten text')
+        os.utime(note_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+        self.assertEqual(self.store.search_notes('note'), [])
+        self.assertEqual(self.store.search_notes('rewritten'),
+                         [(self.contact_id, 'notes', '20240524')])
+
+    def test_packed(self):
+        self.store.pack_contact(self.contact_id)
+        self.store.add_note(self.contact_id, Note("20000101", "packed words"))
+        self.assertEqual(self.store.search_notes('packed'),
+                         [(self.contact_id, 'notes', '20000101')])
+        self.assertEqual(self.store.search_notes('chocolate'),
+                         [(self.contact_id, 'gifts', 'Doughnuts')])
+
+    def test_search_command(self):
+        core = Core(config, True)
+        UI(core, config)
+        core.textfilestore = self.store
+        self.store.add_note(self.contact_id, Note("19990101", "first note"))
+        core.update_contact_list()
+
+        # the hit is not the first note
+        core.ui.console.handle(['search-notes', 'some'])
+        self.assertEqual(core.ui.get_focused_contact().name, "Max Mustermann")
+        self.assertEqual(core.ui.get_focused_detail().note_id, "20240524")
+        self.assertEqual(core.ui.console.body.text,
+                         "1 hits: Max Mustermann (20240524)")
+
+        core.ui.console.handle(['search-notes', 'nothing'])
+        self.assertEqual(core.ui.console.body.text,
+                         'No notes found for "nothing"')
+
+
+class TestContactIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index = ContactIndex()
+        self.index.sync(RDF, [Contact("Max Mustermann"),
+                              Contact("Mia Mustermann")])
+        self.index.sync(TEXTFILE, [Contact("Max Mustermann"),
+                                   Contact("Aaron Mustermann")])
+
+    def get_names(self):
+        return [contact.name for contact in self.index.get_contacts()]
+
+    def test_merge(self):
+        self.assertEqual(self.get_names(), ["Aaron Mustermann",
+                                            "Max Mustermann",
+                                            "Mia Mustermann"])
+        self.assertEqual(self.index.get_sources("Max_Mustermann"),
+                         RDF | TEXTFILE)
+        self.assertEqual(self.index.get_sources("Aaron_Mustermann"),
+                         TEXTFILE)
+        self.assertEqual(self.index.get_position("Mia_Mustermann"), 2)
+
+    def test_snapshot_shared(self):
+        contacts = self.index.get_contacts()
+        self.assertIs(self.index.get_contacts(), contacts)
+        self.index.add(Contact("Max Mustermann"), RDF)
+        self.assertIs(self.index.get_contacts(), contacts)
+        self.index.add(Contact("Bert Mustermann"), RDF)
+        self.assertIsNot(self.index.get_contacts(), contacts)
+
+    def test_sync(self):
+        added, removed = self.index.sync(RDF, [Contact("Max Mustermann"),
+                                               Contact("Zoe Mustermann")])
+        self.assertEqual((added, removed),
+                         (["Zoe_Mustermann"], ["Mia_Mustermann"]))
+        self.assertEqual(self.get_names(), ["Aaron Mustermann",
+                                            "Max Mustermann",
+                                            "Zoe Mustermann"])
+
+        # Max is still a textfile contact
+        self.index.sync(RDF, [])
+        self.assertEqual(self.index.get_sources("Max_Mustermann"), TEXTFILE)
+        self.assertEqual(self.get_names(), ["Aaron Mustermann",
+                                            "Max Mustermann"])
+
+    def test_rename_and_remove(self):
+        self.index.rename("Max_Mustermann", "Zoe Mustermann")
+        self.assertEqual(self.get_names(), ["Aaron Mustermann",
+                                            "Mia Mustermann",
+                                            "Zoe Mustermann"])
+        self.assertEqual(self.index.get_sources("Zoe_Mustermann"),
+                         RDF | TEXTFILE)
+        self.assertTrue(self.index.remove("Zoe_Mustermann"))
+        self.assertFalse(self.index.remove("Zoe_Mustermann"))
+        self.assertNotIn("Zoe_Mustermann", self.index)
+
+    def test_google_contact(self):
+        google_contact = GoogleContact("Mia Mustermann", None, "people/1")
+        self.index.add(google_contact, GOOGLE)
+        self.assertIs(self.index.get_contact("Mia_Mustermann"),
+                      google_contact)
+        self.assertEqual(len(self.index), 3)
+
+        self.index.remove("Mia_Mustermann", GOOGLE)
+        contact = self.index.get_contact("Mia_Mustermann")
+        self.assertNotIsInstance(contact, GoogleContact)
+        self.assertEqual(self.index.get_sources("Mia_Mustermann"), RDF)
+
+    def test_core_mutations(self):
+        core = Core(config, True)
+        core.rdfstore = RDFStore(self.copy_rdf_file(),
+                                 config['rdf']['namespace'])
+        core.textfilestore = TextFileStore(self.textfile_dir,
+                                           config['encryption']['keyid'])
+        names = core.contact_handler.load_contact_names()
+
+        core.add_contact(Contact("Aaron Mustermann"))
+        core.rename_contact("Mia_Mustermann", "Zoe Mustermann")
+        core.delete_contact("Max_Mustermann")
+        expected = sorted(set(names) - {"Mia Mustermann", "Max Mustermann"} |
+                          {"Aaron Mustermann", "Zoe Mustermann"})
+        self.assertEqual(core.contact_handler.load_contact_names(), expected)
+        self.assertEqual(
+            core.contact_handler.get_index().get_sources("Aaron_Mustermann"),
+            RDF)
+
+
+class TestContactListPatch(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rdf_file = self.copy_rdf_file()
+        textfile_dir = self.copy_textfile_dir()
+
+        self.core = Core(config, True)
+        self.core.rdfstore = RDFStore(rdf_file, config['rdf']['namespace'])
+        self.core.textfilestore = TextFileStore(textfile_dir,
+                                                config['encryption']['keyid'])
+        UI(self.core, config)
+        self.core.update_contact_list()
+        self.list_view = self.core.ui.list_view
+
+    def get_names(self):
+        return [entry.contact.name for entry in self.list_view.body]
+
+    def get_entries(self):
+        return {entry.contact.name: entry for entry in self.list_view.body}
+
+    def test_add_contact(self):
+        entries = self.get_entries()
+        self.core.ui.console.handle(['add-contact', 'Mary', 'Mustermann'])
+        names = self.get_names()
+        self.assertEqual(names, sorted(list(entries) + ["Mary Mustermann"]))
+        self.assertEqual(self.core.ui.get_focused_contact().name,
+                         "Mary Mustermann")
+
+        # the other entries are kept
+        for name, entry in self.get_entries().items():
+            if name != "Mary Mustermann":
+                self.assertIs(entry, entries[name])
+
+        self.core.ui.console.handle(['add-contact', 'Mary', 'Mustermann'])
+        self.assertEqual(self.get_names(), names)
+
+    def test_rename_contact(self):
+        self.core.ui.set_focused_contact("Max_Mustermann")
+        entry = self.list_view.focus
+        self.core.ui.console.handle(['rename-contact', 'Aaron', 'Mustermann'])
+        self.assertEqual(self.get_names(), sorted(
+            set(self.core.contact_handler.load_contact_names())))
+        self.assertEqual(self.get_names()[0], "Aaron Mustermann")
+        self.assertIs(self.list_view.focus, entry)
+        self.assertEqual(entry.label, "Aaron Mustermann")
+        self.assertEqual(self.core.watched_contact_id, "Aaron_Mustermann")
+
+    def test_failed_rename_keeps_entry(self):
+        self.core.ui.set_focused_contact("Max_Mustermann")
+        names = self.get_names()
+        self.core.ui.console.handle(['rename-contact', 'Mia', 'Mustermann'])
+        self.assertEqual(self.get_names(), names)
+        self.assertEqual(self.core.ui.console.body.text,
+                         "Error: Mia Mustermann already exists.")
+
+    def test_delete_contact(self):
+        names = self.get_names()
+        pos = names.index("Max Mustermann")
+        self.core.ui.set_focused_contact("Max_Mustermann")
+        self.core.ui.console.handle(['delete-contact', 'Max', 'Mustermann'])
+        names.remove("Max Mustermann")
+        self.assertEqual(self.get_names(), names)
+        focused_contact = self.core.ui.get_focused_contact()
+        self.assertEqual(focused_contact.name, names[pos])
+        self.assertEqual(self.core.watched_contact_id,
+                         focused_contact.get_id())
+
+    def test_reload(self):
+        os.mkdir(os.path.join(self.core.textfilestore.path, 'Zoe_External'))
+        self.core.update_contact_list()
+        self.assertNotIn("Zoe External", self.get_names())
+        self.core.reload_contact_list()
+        self.assertIn("Zoe External", self.get_names())
+
+    def test_contact_dir_created(self):
+        self.core.add_contact(Contact("Zoe New"))
+        self.core.textfilestore.create_note_dir("Zoe_New")
+        self.assertEqual(
+            self.core.contact_handler.get_index().get_sources("Zoe_New"),
+            RDF | TEXTFILE)
+
+    def test_delete_last_contact(self):
+        self.list_view.set_data([Contact("Max Mustermann")])
+        self.list_view.remove_contact("Max_Mustermann")
+        self.assertFalse(self.list_view.has_contacts())
+        pos = self.list_view.insert_contact(Contact("Max Mustermann"))
+        self.assertEqual(pos, 0)
+        self.assertEqual(self.get_names(), ["Max Mustermann"])
+
+    def tearDown(self):
+        self.core.close()
+        super().tearDown()
+
+
 class TestKeybindings(unittest.TestCase):
 
     @classmethod